@@ -1,7 +1,7 @@
-from genocrowd.app import create_app
+from genocrowd.app import create_app, create_celery
 
 application = create_app(config='config/genocrowd.ini')
-# celery = create_celery(application)
+celery = create_celery(application)
 
 if __name__ == '__main__':
     application.run()
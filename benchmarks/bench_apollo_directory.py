@@ -0,0 +1,134 @@
+"""Benchmark the Apollo provisioning of a user against the size of Apollo
+
+Usage: python -m benchmarks.bench_apollo_directory [--existing 100,1000,5000] [--users 50]
+
+Start a stub Apollo server knowing --existing users, each with an organism,
+then provision --users new users: with the previous ApolloUsers.add_user
+(listing all the users and all the organisms for each user) and with the
+ApolloDirectory lookups. Print the requests, the response bytes and the
+time per provisioned user. No database is needed.
+"""
+
+import argparse
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from flask import Flask
+
+from genocrowd.libapollo.ApolloClient import ApolloClient
+from genocrowd.libapollo.ApolloDirectory import ApolloDirectory
+from genocrowd.libapollo.ApolloUsers import ApolloUsers
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each connection in a thread"""
+
+    daemon_threads = True
+
+
+class StubApollo(BaseHTTPRequestHandler):
+    """Apollo server keeping users and organisms, counting the requests and
+    the response bytes"""
+
+    protocol_version = "HTTP/1.1"
+    users = {}
+    organisms = {}
+    requests = 0
+    sent = 0
+
+    def answer(self, data):
+        if self.path == "/user/loadUsers":
+            if 'userId' in data:
+                return [self.users[data['userId']]] if data['userId'] in self.users else []
+            return list(self.users.values())
+        if self.path in ("/user/createUser", "/user/updateUser"):
+            self.users[data['email']] = {'username': data['email'], 'firstName': data['firstName'], 'lastName': data['lastName'], 'role': "USER"}
+            return self.users[data['email']]
+        if self.path == "/organism/findAllOrganisms":
+            if 'organism' in data:
+                return [self.organisms[data['organism']]] if data['organism'] in self.organisms else []
+            return list(self.organisms.values())
+        if self.path == "/organism/addOrganism":
+            self.organisms[data['commonName']] = {'id': len(self.organisms) + 1, 'commonName': data['commonName'], 'genus': "Acyrthosiphon",
+                                                  'species': "pisum", 'directory': data['directory'], 'publicMode': False}
+            return self.organisms[data['commonName']] if data.get('returnAllOrganisms') is False else list(self.organisms.values())
+        return {}
+
+    def setup(self):
+        super().setup()
+        # Headers and body are written separately: do not wait for the ack
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        body = json.dumps(self.answer(data)).encode()
+        StubApollo.requests += 1
+        StubApollo.sent += len(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def previous_add_user(wa, app, username, email, password, role="user"):
+    """Provisioning as done before the directory"""
+    users = wa.users.get_users()
+    if any(user['username'] == email for user in users):
+        wa.users.update_user(email, username, username, password)
+    else:
+        wa.users.create_user(email, username, username, password, role=role)
+    org_id = "{}_{}".format(app.apollo_org_id, email)
+    orgs = wa.organisms.get_organisms()
+    no_orgs = 'error' in orgs and orgs['error'] == 'Not authorized for any organisms'
+    if no_orgs or org_id not in [org['commonName'] for org in orgs]:
+        wa.organisms.add_organism(org_id, app.apollo_dataset_path, genus='Acyrthosiphon', species='pisum', public=False)
+        wa.wait_for_organism(org_id)
+        wa.users.update_organism_permissions(email, org_id, write=True, export=True, read=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--existing', default="100,1000,5000", help='Comma separated numbers of users already in Apollo')
+    parser.add_argument('--users', type=int, default=50, help='Number of users provisioned')
+    args = parser.parse_args()
+
+    server = Server(("127.0.0.1", 0), StubApollo)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app = Flask(__name__)
+    app.apollo_org_id = "puceron"
+    app.apollo_dataset_path = "/apollo-data-local/dataset/"
+    app.apollo = ApolloClient("http://127.0.0.1:{}".format(server.server_port), "admin@annotons", "secret", ready_timeout=5)
+
+    with app.app_context():
+        for existing in [int(number) for number in args.existing.split(',')]:
+            for name in ('previous (listings)', 'ApolloDirectory'):
+                StubApollo.users = {"student%d@genocrowd.org" % number: {'username': "student%d@genocrowd.org" % number, 'firstName': "student%d" % number,
+                                                                         'lastName': "student%d" % number, 'role': "USER"} for number in range(existing)}
+                StubApollo.organisms = {"puceron_" + email: {'id': number, 'commonName': "puceron_" + email, 'genus': "Acyrthosiphon", 'species': "pisum",
+                                                             'directory': app.apollo_dataset_path, 'publicMode': False}
+                                        for number, email in enumerate(StubApollo.users)}
+                StubApollo.requests = StubApollo.sent = 0
+                app.apollo_directory = ApolloDirectory(app.apollo)
+                start = time.perf_counter()
+                for number in range(args.users):
+                    email = "new%d@genocrowd.org" % number
+                    if name == 'ApolloDirectory':
+                        ApolloUsers().add_user("new%d" % number, email, "hash")
+                    else:
+                        previous_add_user(app.apollo, app, "new%d" % number, email, "hash")
+                elapsed = (time.perf_counter() - start) * 1000 / args.users
+                print("{:>5} users, {:<20} {:.1f} requests, {:>9.0f} B received, {:.2f} ms per user".format(
+                    existing, name, StubApollo.requests / args.users, StubApollo.sent / args.users, elapsed))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
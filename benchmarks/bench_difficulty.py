@@ -0,0 +1,115 @@
+"""Benchmark the gene difficulty engine
+
+Usage: python -m benchmarks.bench_difficulty [--genes 100000] [--chromosomes 20] [--config config/genocrowd.test.ini]
+
+Score synthetic gene columns with Difficulty.score (vectorised, all the
+FEATURES weighted), and with a per-gene Python loop computing the same
+overlaps for comparison. With --config, genes with stored features are
+inserted and Difficulty.compute is timed on the first run (all the genes
+updated) and on a second run (nothing to update), then
+Difficulty.score_genes on 1% of the genes (as after an upload). The genes collections of
+the config database are emptied before and after the run.
+"""
+
+import argparse
+import bisect
+import time
+
+from genocrowd.libgenocrowd.Difficulty import Difficulty, FEATURES
+from genocrowd.libgenocrowd.GeneRegions import GeneRegions
+
+import numpy
+
+
+def make_columns(size, chromosomes):
+    """Random gene positions and features"""
+    generator = numpy.random.default_rng(42)
+    start = generator.integers(0, 10**7, size)
+    columns = {
+        'chromosome': generator.integers(0, chromosomes, size),
+        'start': start,
+        'end': start + generator.integers(300, 30000, size),
+        'strand': generator.choice([-1, 1], size),
+        'length': generator.integers(300, 30000, size),
+        'isoforms': generator.integers(1, 6, size),
+        'exons': generator.integers(1, 20, size),
+        'intron_mean': generator.integers(0, 5000, size),
+        'intron_max': generator.integers(0, 20000, size)
+    }
+    return columns
+
+
+def loop_overlaps(columns):
+    """Overlaps with a Python loop over the genes of each chromosome"""
+    overlaps = []
+    by_chromosome = {}
+    for chromosome, start, end in zip(columns['chromosome'].tolist(), columns['start'].tolist(), columns['end'].tolist()):
+        by_chromosome.setdefault(chromosome, ([], []))
+        by_chromosome[chromosome][0].append(start)
+        by_chromosome[chromosome][1].append(end)
+    for starts, ends in by_chromosome.values():
+        starts.sort()
+        ends.sort()
+    for chromosome, start, end in zip(columns['chromosome'].tolist(), columns['start'].tolist(), columns['end'].tolist()):
+        starts, ends = by_chromosome[chromosome]
+        overlaps.append(bisect.bisect_left(starts, end) - bisect.bisect_right(ends, start) - 1)
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--genes', type=int, default=100000, help='Number of genes')
+    parser.add_argument('--chromosomes', type=int, default=20, help='Number of sequences')
+    parser.add_argument('--config', help='Genocrowd config file, to also measure Difficulty.compute (use a test database)')
+    args = parser.parse_args()
+
+    columns = make_columns(args.genes, args.chromosomes)
+    engine = Difficulty.__new__(Difficulty)
+    engine.thresholds = [0, 3333, 6666]
+    engine.weights = {name: 1 for name in FEATURES}
+
+    start = time.perf_counter()
+    vectorised = Difficulty.overlaps(columns)
+    columns['overlaps'] = vectorised
+    elapsed = time.perf_counter() - start
+    print("Overlaps, vectorised: {:.3f} s".format(elapsed))
+    start = time.perf_counter()
+    assert loop_overlaps(columns) == vectorised.tolist()
+    print("Overlaps, Python loop: {:.3f} s".format(time.perf_counter() - start))
+
+    start = time.perf_counter()
+    difficulty, level, model = engine.score(columns)
+    elapsed = time.perf_counter() - start
+    print("Score {} genes, {} features: {:.3f} s, levels {}".format(args.genes, len(FEATURES), elapsed, numpy.bincount(level).tolist()))
+
+    if args.config:
+        from genocrowd.app import create_app
+
+        app = create_app(config=args.config)
+        with app.app_context():
+            genes = app.mongo.db["genes.files"]
+            genes.drop()
+            documents = []
+            for number in range(args.genes):
+                documents.append({
+                    '_id': "gene-%d" % number,
+                    'chromosome': "chr%d" % columns['chromosome'][number],
+                    'start': int(columns['start'][number]),
+                    'end': int(columns['end'][number]),
+                    'strand': int(columns['strand'][number]),
+                    'features': {name: int(columns[name][number]) for name in Difficulty.COLUMNS}
+                })
+            genes.insert_many(documents)
+            difficulty = Difficulty(app, None)
+            for name in ('first compute', 'second compute'):
+                result = difficulty.compute()
+                print("{}: {genes} genes, {updated} updated, levels {levels}, {elapsed} s".format(name, **result))
+            GeneRegions(app, None).ensure_indexes()
+            genes.update_many({'_id': {'$in': ["gene-%d" % number for number in range(0, args.genes, 100)]}}, {'$set': {'upload': "bench"}})
+            result = difficulty.score_genes({'upload': "bench"})
+            print("upload of 1% of the genes: {genes} genes, {updated} updated, levels {levels}, {elapsed} s".format(**result))
+            genes.drop()
+
+
+if __name__ == '__main__':
+    main()
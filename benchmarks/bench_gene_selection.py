@@ -0,0 +1,84 @@
+"""Benchmark the selection of a gene to annotate
+
+Usage: python -m benchmarks.bench_gene_selection --config config/genocrowd.test.ini [--sizes 10000 100000]
+
+Compare the previous selection (load every gene, filter in Python) with the
+indexed GeneSelector. The genes collection of the config database is
+emptied before and after each run.
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.GeneSelector import GeneSelector
+
+
+def fill_genes(collection, size):
+    """Insert gene metadata documents (no GFF payload)"""
+    collection.drop()
+    genes = []
+    for number in range(size):
+        genes.append({
+            '_id': "gene-%d" % number,
+            'chromosome': "NC_%06d.1" % (number // 10000),
+            'start': (number % 10000) * 12000,
+            'end': (number % 10000) * 12000 + 8000,
+            'strand': 1,
+            'isAnnotable': random.random() > 0.1,
+            'isValidated': False,
+            'difficulty': random.randint(0, 10000),
+            'level': random.randint(0, 4),
+            'priority': random.randint(0, 2),
+            'rand': random.random(),
+            'tags': []
+        })
+        if len(genes) == 10000:
+            collection.insert_many(genes)
+            genes = []
+    if genes:
+        collection.insert_many(genes)
+
+
+def measure(function, repeat):
+    """Return the median and 95th percentile latency of a function, in ms"""
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help='Number of genes')
+    parser.add_argument('--repeat', type=int, default=100, help='Number of selections per measure')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        collection = app.mongo.db["genes.files"]
+        selector = GeneSelector(app, None)
+
+        def legacy():
+            genes = list(collection.find({}))
+            candidates = [gene for gene in genes if gene['isAnnotable'] and gene['level'] == 2]
+            return random.choices(candidates, k=1)[0]
+
+        for size in args.sizes:
+            fill_genes(collection, size)
+            selector.ensure_indexes()
+            median, p95 = measure(legacy, max(1, args.repeat // 10))
+            print("{} genes, full scan:  median {:.2f} ms, p95 {:.2f} ms".format(size, median, p95))
+            median, p95 = measure(lambda: selector.select_gene(2), args.repeat)
+            print("{} genes, indexed:    median {:.2f} ms, p95 {:.2f} ms".format(size, median, p95))
+        collection.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark the compression codecs of the gene GFF
+
+Usage: python -m benchmarks.bench_gff_compression [--copies 2000] [--gff test-data/merlin.gff]
+
+The genes of the GFF are copied (with new ids and shifted coordinates) to
+get a realistic number of genes. The dictionaries are trained on the first
+copies only, and every gene is compressed and decoded one at a time, as
+stored by GffStorage. No database is needed.
+"""
+
+import argparse
+import re
+import time
+
+from genocrowd.libgenocrowd.GffCodec import CODECS, GffCodec
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+
+def scale_genes(path, copies):
+    """Read the genes of a GFF and copy them
+
+    Returns
+    -------
+    list
+        GFF of each gene (bytes)
+    """
+    with open(path, 'rb') as handle:
+        genes = [gene['gff'] for gene in GffStream(handle)]
+    ids = re.compile(r'(ID|Parent)=([^;\n]+)')
+    payloads = []
+    for copy in range(copies):
+        shift = copy * 200000
+        for gff in genes:
+            lines = []
+            for line in gff.split('\n'):
+                columns = line.split('\t')
+                if len(columns) == 9:
+                    columns[3] = str(int(columns[3]) + shift)
+                    columns[4] = str(int(columns[4]) + shift)
+                    columns[8] = ids.sub(lambda match: "{}={}.{}".format(match.group(1), match.group(2), copy), columns[8])
+                lines.append('\t'.join(columns))
+            payloads.append('\n'.join(lines).encode())
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--gff', default='test-data/merlin.gff', help='GFF file')
+    parser.add_argument('--copies', type=int, default=2000, help='Number of copies of the genes')
+    parser.add_argument('--dictionary-size', type=int, default=16 * 1024, help='Size of the trained dictionaries')
+    args = parser.parse_args()
+
+    payloads = scale_genes(args.gff, args.copies)
+    raw = sum(len(payload) for payload in payloads)
+    training = payloads[:max(10, len(payloads) // 20)]
+    print("{} genes, {:.2f} MB, mean {:.0f} bytes per gene, dictionaries trained on {} genes".format(
+        len(payloads), raw / 10**6, raw / len(payloads), len(training)))
+
+    for name, codec in CODECS.items():
+        if not codec.available():
+            print("{:<10} skipped (zstandard not installed)".format(name))
+            continue
+        codec = GffCodec.get(name)
+        if codec.uses_dictionary:
+            codec.dictionary = codec.train(training, args.dictionary_size)
+
+        start = time.perf_counter()
+        compressed = [codec.compress(payload) for payload in payloads]
+        encode = time.perf_counter() - start
+        start = time.perf_counter()
+        for data in compressed:
+            codec.decompress(data)
+        decode = time.perf_counter() - start
+
+        stored = sum(len(data) for data in compressed)
+        print("{:<10} {:.2f} MB ({:.1f}% saved) | encode {:.1f} us/gene | decode {:.1f} us/gene".format(
+            name, stored / 10**6, 100 * (1 - stored / raw), encode / len(payloads) * 10**6, decode / len(payloads) * 10**6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Benchmark the GFF ingestion pipeline
+
+Usage: python -m benchmarks.bench_gff_ingest [--genes 50000] [--config config/genocrowd.test.ini]
+
+Without --config, only the parsing is measured. With --config, the genes are
+also written in the database of this config (the genes collection is emptied
+before and after the run).
+"""
+
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+from benchmarks.synthetic import write_gff
+
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+
+def peak_rss():
+    """Peak resident set size of the process, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--genes', type=int, default=50000, help='Number of genes in the synthetic GFF')
+    parser.add_argument('--config', help='Genocrowd config file, to also measure the database writes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_gff(os.path.join(tmp, 'synthetic.gff'), args.genes)
+        print("Synthetic GFF: {} genes, {:.1f} MB".format(args.genes, os.path.getsize(path) / 10**6))
+
+        start = time.perf_counter()
+        with open(path, 'rb') as handle:
+            count = sum(1 for gene in GffStream(handle))
+        elapsed = time.perf_counter() - start
+        print("Parse only: {:.0f} genes/s ({:.2f} s), peak RSS {:.0f} MB".format(count / elapsed, elapsed, peak_rss()))
+
+        if args.config:
+            from genocrowd.app import create_app
+            from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+
+            app = create_app(config=args.config)
+            with app.app_context():
+                db = app.mongo.db
+                db["genes.files"].drop()
+                db["genes.chunks"].drop()
+                importer = GeneImporter(app, None)
+                start = time.perf_counter()
+                with open(path, 'rb') as handle:
+                    counts = importer.import_gff(handle)
+                elapsed = time.perf_counter() - start
+                print("Parse and store (batch of {}): {:.0f} genes/s ({:.2f} s), peak RSS {:.0f} MB".format(importer.batch_size, counts['stored'] / elapsed, elapsed, peak_rss()))
+                db["genes.files"].drop()
+                db["genes.chunks"].drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark the parallel GFF parsing
+
+Usage: python -m benchmarks.bench_gff_parallel [--genes 200000] [--chromosomes 20] [--workers 1 2 4 8] [--config config/genocrowd.test.ini]
+
+Parse a synthetic multi-chromosome GFF with GffStream.parallel_genes for
+each number of workers (1 is the single-process GffStream). With --config,
+the genes are also stored by a GeneImporter (the genes collections of the
+config database are emptied before and after each run).
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_gff
+
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+
+def parse(path, workers):
+    """Parse a file, return the number of genes"""
+    if workers == 1:
+        with open(path, 'rb') as handle:
+            return sum(1 for gene in GffStream(handle))
+    return sum(1 for gene in GffStream.parallel_genes(path, workers, GeneImporter.RANGE_SIZE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--genes', type=int, default=200000, help='Number of genes in the synthetic GFF')
+    parser.add_argument('--chromosomes', type=int, default=20, help='Number of sequences')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='Numbers of worker processes')
+    parser.add_argument('--config', help='Genocrowd config file, to also measure the database writes')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_gff(os.path.join(tmp, 'synthetic.gff'), args.genes, args.chromosomes)
+        print("Synthetic GFF: {} genes on {} sequences, {:.1f} MB, {} CPUs".format(
+            args.genes, args.chromosomes, os.path.getsize(path) / 10**6, os.cpu_count()))
+
+        reference = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            count = parse(path, workers)
+            elapsed = time.perf_counter() - start
+            reference = reference or elapsed
+            print("Parse, {} workers: {:.0f} genes/s ({:.2f} s, speedup {:.1f}x)".format(workers, count / elapsed, elapsed, reference / elapsed))
+
+        if args.config:
+            from genocrowd.app import create_app
+
+            app = create_app(config=args.config)
+            with app.app_context():
+                db = app.mongo.db
+                for workers in args.workers:
+                    db["genes.files"].drop()
+                    db["genes.chunks"].drop()
+                    importer = GeneImporter(app, None)
+                    importer.workers = workers
+                    start = time.perf_counter()
+                    counts = importer.import_path(path)
+                    elapsed = time.perf_counter() - start
+                    print("Parse and store, {} workers: {:.0f} genes/s ({:.2f} s)".format(workers, counts['stored'] / elapsed, elapsed))
+                db["genes.files"].drop()
+                db["genes.chunks"].drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark the storage backends of the gene GFF
+
+Usage: python -m benchmarks.bench_gff_storage --config config/genocrowd.test.ini [--genes 5000]
+
+Write then read the GFF of synthetic genes one at a time, as done when an
+answer is saved and when a gene is loaded in Apollo, with:
+
+- the GridFS API (previous implementation)
+- GffStorage, gridfs backend
+- GffStorage, inline backend, without compression, with zlib and with zstd
+  (if the zstandard package is installed)
+
+The bench_gff collections of the config database are emptied before and
+after each run.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+
+from benchmarks.bench_gene_selection import measure
+from benchmarks.synthetic import write_gff
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd import GffStorage as gff_storage
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+import gridfs
+
+
+def collection_size(db, name):
+    """Size of the documents of a collection, in MB"""
+    return db.command('collstats', name).get('size', 0) / 10**6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--genes', type=int, default=5000, help='Number of genes')
+    parser.add_argument('--reads', type=int, default=2000, help='Number of reads per backend')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_gff(os.path.join(tmp, 'synthetic.gff'), args.genes)
+        with open(path, 'rb') as handle:
+            genes = [(gene['_id'], gene['gff']) for gene in GffStream(handle)]
+    print("{} genes, mean GFF size {:.1f} kB".format(len(genes), sum(len(gff) for _id, gff in genes) / len(genes) / 1000))
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        db = app.mongo.db
+        ids = [_id for _id, gff in genes]
+
+        fs = gridfs.GridFS(db, collection="bench_gff")
+        storage = GffStorage(app, None, "bench_gff")
+        variants = [('GridFS API', None, None), ('gridfs', 'gridfs', 'none'), ('inline', 'inline', 'none'), ('inline zlib', 'inline', 'zlib')]
+        if gff_storage.zstandard is not None:
+            variants.append(('inline zstd', 'inline', 'zstd'))
+
+        for name, backend, compression in variants:
+            db["bench_gff.files"].drop()
+            db["bench_gff.chunks"].drop()
+            storage.ensure_indexes()
+            storage.backend = backend
+            storage.compression = compression
+            pending = iter(genes)
+
+            if backend is None:
+                def write():
+                    _id, gff = next(pending)
+                    fs.put(gff.encode(), _id=_id)
+
+                def read():
+                    return fs.get(random.choice(ids)).read().decode()
+            else:
+                def write():
+                    _id, gff = next(pending)
+                    storage.put({'_id': _id}, gff)
+
+                def read():
+                    return storage.get(random.choice(ids))
+
+            write_median, write_p95 = measure(write, len(genes))
+            read_median, read_p95 = measure(read, args.reads)
+            size = collection_size(db, "bench_gff.files") + collection_size(db, "bench_gff.chunks")
+            print("{:<12} write: median {:.3f} ms, p95 {:.3f} ms | read: median {:.3f} ms, p95 {:.3f} ms | {:.1f} MB".format(
+                name, write_median, write_p95, read_median, read_p95, size))
+
+        db["bench_gff.files"].drop()
+        db["bench_gff.chunks"].drop()
+
+
+if __name__ == '__main__':
+    main()
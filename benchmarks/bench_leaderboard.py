@@ -0,0 +1,91 @@
+"""Benchmark the leaderboard (/api/data/gettopannotation)
+
+Usage: python -m benchmarks.bench_leaderboard --config config/genocrowd.test.ini [--users 10000]
+
+Compare the previous computation (load every user, sum and sort in Python)
+with the Leaderboard queries, without and with the cache. The users and
+groups collections of the config database are emptied before and after the
+run.
+"""
+
+import argparse
+import random
+
+from benchmarks.bench_gene_selection import measure
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.Leaderboard import Leaderboard
+
+
+def fill_users(db, size, nb_groups):
+    """Insert users with a group and a number of annotations"""
+    db.users.drop()
+    db.groups.drop()
+    db.groups.insert_one({'groupsAmount': nb_groups})
+    db.groups.insert_many([{'number': number + 1, 'name': "group %d" % (number + 1), 'student': []} for number in range(nb_groups)])
+    users = []
+    for number in range(size):
+        users.append({
+            'username': "user%d" % number,
+            'email': "user%d@genocrowd.org" % number,
+            'password': "$2b$12$" + "x" * 53,
+            'group': random.randint(1, nb_groups),
+            'grade': "grade",
+            'total_annotation': random.randint(0, 500),
+            'level': 0,
+            'current_annotation': None
+        })
+        if len(users) == 10000:
+            db.users.insert_many(users)
+            users = []
+    if users:
+        db.users.insert_many(users)
+
+
+def legacy(db):
+    """Previous get_top_annotation"""
+    nb = db.groups.find_one({'groupsAmount': {'$exists': True}})['groupsAmount']
+    scores = [0] * nb
+    top_users = []
+    for user in db.users.find({}):
+        if user['group'] is not None:
+            top_users.append({'username': user['username'], 'score': user['total_annotation']})
+            scores[user['group'] - 1] += user['total_annotation']
+    names = [group['name'] for group in db.groups.find({'number': {'$exists': True}})]
+    top_groups = sorted([{'name': names[i], 'score': score} for i, score in enumerate(scores)], key=lambda k: k['score'], reverse=True)
+    top_users = sorted(top_users, key=lambda k: k['score'], reverse=True)
+    return top_users[:3], top_groups[:3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--users', type=int, default=10000, help='Number of users')
+    parser.add_argument('--groups', type=int, default=20, help='Number of groups')
+    parser.add_argument('--repeat', type=int, default=50, help='Number of requests per measure')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        db = app.mongo.db
+        fill_users(db, args.users, args.groups)
+        leaderboard = Leaderboard(app, None)
+        leaderboard.ensure_indexes()
+
+        def queries():
+            return leaderboard.top_users(3), leaderboard.top_groups(3), leaderboard.get_rank("user42")
+
+        def uncached():
+            app.leaderboard_cache.invalidate()
+            return queries()
+
+        for name, function in (('full scan', lambda: legacy(db)), ('queries', uncached), ('cached', queries)):
+            median, p95 = measure(function, args.repeat)
+            print("{} users, {:<10} median {:.2f} ms, p95 {:.2f} ms".format(args.users, name, median, p95))
+
+        db.users.drop()
+        db.groups.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Benchmark a login storm (a whole class logging in at once)
+
+Usage: python -m benchmarks.bench_login_storm --config config/genocrowd.test.ini [--users 200] [--rounds 12] [--workers 2] [--queue-size 64]
+
+Create users, then log all of them in at the same time from one thread
+each: with the previous pipeline (up to four find_one per login, bcrypt in
+the request thread) and with LocalAuth.authenticate_user (one $or query,
+bcrypt in the bounded pool of PasswordHasher). Print the wall time, the
+logins per second, the latency percentiles, the number of logins refused
+because the pool was full and the number of user queries per login. The
+bench users are removed at the end.
+"""
+
+import argparse
+import threading
+import time
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.PasswordHasher import PasswordHasher, PasswordHasherBusy
+
+
+class CountingCollection(object):
+    """Collection counting the queries"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        def counted(*args, **kwargs):
+            self.queries += 1
+            return method(*args, **kwargs)
+        return counted
+
+
+def previous_authenticate(local_auth, data):
+    """Login as it was done before the pool: username then email lookups,
+    bcrypt in the calling thread"""
+    login = data['login']
+    if local_auth.is_username_in_db(login):
+        response = local_auth.users.find_one({'username': login}, projection=LocalAuth.PROJECTIONS['login'])
+    elif local_auth.is_email_in_db(login):
+        response = local_auth.users.find_one({'email': login}, projection=LocalAuth.PROJECTIONS['login'])
+    else:
+        return {'error': True}
+    return {'error': not local_auth.app.bcrypt.check_password_hash(response.pop('password'), data['password'])}
+
+
+def make_users(app, number, password_hash):
+    """Insert the bench users, all with the same password"""
+    users = app.mongo.db["users"]
+    users.delete_many({'username': {'$regex': "^bench_login_"}})
+    users.insert_many([{
+        'username': "bench_login_%d" % index,
+        'email': "bench_login_%d@genocrowd.org" % index,
+        'password': password_hash,
+        'isAdmin': False,
+        'isExternal': False,
+        'blocked': False,
+        'grade': "L3",
+        'group': None,
+        'level': 0
+    } for index in range(number)])
+
+
+def storm(app, number, authenticate):
+    """Log the users in from one thread each, return the wall time (s),
+    the sorted latencies (ms), the number of refused logins and the number
+    of user queries"""
+    local_auth = LocalAuth(app, None)
+    users = local_auth.users = CountingCollection(local_auth.users)
+    latencies = []
+    refused = []
+    barrier = threading.Barrier(number + 1)
+
+    def login(index):
+        # Half of the class logs in with its email
+        identifier = "bench_login_%d" % index if index % 2 else "bench_login_%d@genocrowd.org" % index
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            assert not authenticate(local_auth, {'login': identifier, 'password': "bench_login"})['error']
+        except PasswordHasherBusy:
+            refused.append(index)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=login, args=(index,)) for index in range(number)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, sorted(latencies), len(refused), users.queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--users', type=int, default=200, help='Number of users logging in at once')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--workers', type=int, default=2, help='Number of hashing threads')
+    parser.add_argument('--queue-size', type=int, default=64, help='Number of hashes waiting for a thread')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        app.password_hasher = PasswordHasher(app.bcrypt, args.rounds, workers=args.workers, queue_size=args.queue_size)
+        make_users(app, args.users, app.bcrypt.generate_password_hash("bench_login", args.rounds).decode('utf-8'))
+        for name, authenticate in (('previous (inline, find_one)', previous_authenticate),
+                                   ('pool, $or query', lambda local_auth, data: local_auth.authenticate_user(data))):
+            elapsed, latencies, refused, queries = storm(app, args.users, authenticate)
+            print("{:<28} {:.2f} s, {:.1f} logins/s, p50 {:.0f} ms, p95 {:.0f} ms, max {:.0f} ms, {} refused, {:.1f} queries/login".format(
+                name, elapsed, (args.users - refused) / elapsed, latencies[len(latencies) // 2],
+                latencies[int(len(latencies) * 0.95)], latencies[-1], refused, queries / args.users))
+        app.mongo.db["users"].delete_many({'username': {'$regex': "^bench_login_"}})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Benchmark the region queries on genes
+
+Usage: python -m benchmarks.bench_regions --config config/genocrowd.test.ini [--genes 100000] [--chromosomes 20] [--queries 1000]
+
+Insert genes.files documents laid out like the synthetic GFF (one 8 kb gene
+every 12 kb, with some long genes), then time random 100 kb region queries
+and overlap lookups of a gene: with the bin index of GeneRegions, and with a
+collection scan on the positions. The genes collections of the config
+database are emptied before and after the run.
+"""
+
+import argparse
+import random
+import time
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.GeneRegions import GeneRegions, region_bin
+
+
+def fill_genes(genes, size, chromosomes):
+    """Insert the gene documents, return the length of a chromosome"""
+    rand = random.Random(42)
+    per_chromosome = max(1, size // chromosomes)
+    documents = []
+    for number in range(size):
+        start = (number % per_chromosome) * 12000 + rand.randint(0, 1000)
+        end = start + (rand.randint(100000, 2000000) if number % 500 == 0 else 8000)
+        documents.append({
+            '_id': "gene-%d" % number,
+            'chromosome': "NC_%06d.1" % (number // per_chromosome),
+            'start': start,
+            'end': end,
+            'bin': region_bin(start, end)
+        })
+        if len(documents) == 10000:
+            genes.insert_many(documents)
+            documents = []
+    if documents:
+        genes.insert_many(documents)
+    return per_chromosome * 12000
+
+
+def timed(function, queries):
+    """Mean duration of a function over queries, in ms, and the number of
+    found genes"""
+    found = 0
+    start = time.perf_counter()
+    for query in queries:
+        found += function(*query)
+    return (time.perf_counter() - start) * 1000 / len(queries), found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--genes', type=int, default=100000, help='Number of genes')
+    parser.add_argument('--chromosomes', type=int, default=20, help='Number of sequences')
+    parser.add_argument('--queries', type=int, default=1000, help='Number of queries of each kind')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        genes = app.mongo.db["genes.files"]
+        genes.drop()
+        length = fill_genes(genes, args.genes, args.chromosomes)
+        regions = GeneRegions(app, None)
+        regions.ensure_indexes()
+
+        rand = random.Random(1)
+        queries = []
+        for number in range(args.queries):
+            start = rand.randrange(length)
+            queries.append(("NC_%06d.1" % rand.randrange(args.chromosomes), start, start + 100000))
+
+        def binned(chromosome, start, end):
+            return len(list(regions.region(chromosome, start, end)))
+
+        def scan(chromosome, start, end):
+            query = {'chromosome': chromosome, 'start': {'$lt': end}, 'end': {'$gt': start}}
+            return len(list(genes.find(query, projection={'_id': 1}).hint([('$natural', 1)])))
+
+        scan_queries = queries[:max(1, args.queries // 20)]
+        assert sum(binned(*query) for query in scan_queries) == sum(scan(*query) for query in scan_queries)
+        for name, function, selection in (('bin index', binned, queries), ('collection scan', scan, scan_queries)):
+            elapsed, found = timed(function, selection)
+            print("Region 100 kb, {:<15} {:.3f} ms/query ({:.1f} genes/query)".format(name, elapsed, found / len(selection)))
+
+        gene_ids = [("gene-%d" % rand.randrange(args.genes),) for number in range(args.queries)]
+        elapsed, found = timed(lambda gene_id: len(regions.overlaps(gene_id)[1]), gene_ids)
+        print("Overlaps of a gene, bin index: {:.3f} ms/query ({:.1f} genes/query)".format(elapsed, found / len(gene_ids)))
+        genes.drop()
+
+
+if __name__ == '__main__':
+    main()
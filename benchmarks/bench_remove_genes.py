@@ -0,0 +1,72 @@
+"""Benchmark the removal of genes (/api/data/removeallgenes)
+
+Usage: python -m benchmarks.bench_remove_genes --config config/genocrowd.test.ini [--genes 30000]
+
+Compare the previous removal (one delete on genes.files and one on
+genes.chunks per gene) with the bulk deletes of GffStorage.delete_many, for
+all the genes and for one chromosome. The genes collections of the config
+database are emptied before and after each run.
+"""
+
+import argparse
+import time
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+
+
+def fill_genes(storage, size, large_every):
+    """Insert genes, one out of large_every with its GFF in chunks"""
+    storage.files.drop()
+    storage.chunks.drop()
+    storage.ensure_indexes()
+    documents = []
+    chunks = []
+    for number in range(size):
+        document = {'_id': "gene-%d" % number, 'chromosome': "chr%d" % (number % 10)}
+        payload = b"x" * (storage.inline_max_size + 1 if number % large_every == 0 else 2000)
+        chunks += storage.pack(document, payload)
+        documents.append(document)
+        if len(documents) == 10000:
+            storage.files.insert_many(documents)
+            storage.insert_chunks(chunks)
+            documents = []
+            chunks = []
+    if documents:
+        storage.files.insert_many(documents)
+        storage.insert_chunks(chunks)
+
+
+def legacy(storage, query):
+    """Previous removal, one gene at a time"""
+    removed = 0
+    for gene in list(storage.files.find(query, projection={'_id': 1})):
+        storage.delete(gene['_id'])
+        removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--genes', type=int, default=30000, help='Number of genes')
+    parser.add_argument('--large-every', type=int, default=100, help='One gene out of N is stored in chunks')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        storage = GffStorage(app, None, "genes")
+        for scope, query in (('all', {}), ('chromosome', {'chromosome': "chr0"})):
+            for name, function in (('per gene', lambda: legacy(storage, query)),
+                                   ('delete_many', lambda: storage.delete_many(query)[0])):
+                fill_genes(storage, args.genes, args.large_every)
+                start = time.perf_counter()
+                removed = function()
+                elapsed = time.perf_counter() - start
+                print("{} genes, {:<10} {:<12} {} removed in {:.3f} s".format(args.genes, scope, name, removed, elapsed))
+        storage.files.drop()
+        storage.chunks.drop()
+
+
+if __name__ == '__main__':
+    main()
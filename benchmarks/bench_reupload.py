@@ -0,0 +1,62 @@
+"""Benchmark the incremental re-upload of a dataset
+
+Usage: python -m benchmarks.bench_reupload --config config/genocrowd.test.ini [--genes 50000] [--changed 1]
+
+Import a synthetic GFF, then import it again unchanged, and with a
+percentage of its genes changed (new product names). The genes collections
+of the config database are emptied before and after the run.
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+from benchmarks.synthetic import write_gff
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+
+
+def write_release(path, new_path, every):
+    """Copy a synthetic GFF, changing one gene out of every"""
+    gene = re.compile(r'gene=LOC(\d+);')
+    with open(path) as gff, open(new_path, 'w') as new_gff:
+        for line in gff:
+            match = gene.search(line)
+            if match and int(match.group(1)) % every == 0:
+                line = line.replace("product=uncharacterized", "product=putative")
+            new_gff.write(line)
+    return new_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--genes', type=int, default=50000, help='Number of genes in the synthetic GFF')
+    parser.add_argument('--changed', type=float, default=1, help='Percentage of changed genes in the new release')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context(), tempfile.TemporaryDirectory() as tmp:
+        db = app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        path = write_gff(os.path.join(tmp, 'release1.gff'), args.genes)
+        new_path = write_release(path, os.path.join(tmp, 'release2.gff'), max(1, int(100 / args.changed)))
+
+        for name, release in (('first import', path), ('same release', path), ('new release', new_path)):
+            importer = GeneImporter(app, None)
+            start = time.perf_counter()
+            with open(release, 'rb') as handle:
+                counts = importer.import_gff(handle, dataset="synthetic", retire=True)
+            elapsed = time.perf_counter() - start
+            print("{:<13} {:.2f} s: {added} added, {changed} changed, {unchanged} unchanged, {retired} retired".format(name, elapsed, **counts))
+
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+
+
+if __name__ == '__main__':
+    main()
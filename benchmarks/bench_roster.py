@@ -0,0 +1,73 @@
+"""Benchmark the import of a class roster
+
+Usage: python -m benchmarks.bench_roster --config config/genocrowd.test.ini [--users 300] [--rounds 12] [--workers 2] [--apollo-latency 0.5]
+
+Create the users of a roster one by one as /api/auth/signup does
+(LocalAuth.add_user_to_database: hash, insert, re-read, Apollo), then with
+Roster (hashes on the bcrypt pool, one insert_many, Apollo provisioning
+apollo_provision_workers at a time). Apollo is replaced by a sleep of
+--apollo-latency seconds per user, the time ApolloUsers.add_user takes
+against a real server. Print the time to create the users and to provision
+them. The bench users are removed at the end.
+"""
+
+import argparse
+import time
+
+from genocrowd.app import create_app
+from genocrowd.libapollo.ApolloUsers import ApolloUsers
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.PasswordHasher import PasswordHasher
+from genocrowd.libgenocrowd.Roster import Roster
+
+
+def make_rows(number):
+    """Rows of a roster"""
+    return [{
+        'username': "bench_roster_%d" % index,
+        'email': "bench_roster_%d@genocrowd.org" % index,
+        'password': "bench_roster_%d" % index,
+        'grade': "L3"
+    } for index in range(number)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--users', type=int, default=300, help='Number of students in the roster')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost factor')
+    parser.add_argument('--workers', type=int, default=2, help='Number of hashing threads')
+    parser.add_argument('--apollo-latency', type=float, default=0.5, help='Duration of the creation of an Apollo user and organism, in seconds')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    ApolloUsers.add_user = lambda self, *arguments, **kwargs: time.sleep(args.apollo_latency)
+    with app.app_context():
+        app.password_hasher = PasswordHasher(app.bcrypt, args.rounds, workers=args.workers)
+        users = app.mongo.db["users"]
+        rows = make_rows(args.users)
+
+        users.delete_many({'username': {'$regex': "^bench_roster_"}})
+        local_auth = LocalAuth(app, None)
+        start = time.perf_counter()
+        for row in rows:
+            local_auth.add_user_to_database(row['username'], row['email'], row['password'], row['grade'])
+        elapsed = time.perf_counter() - start
+        print("{:<28} {:.1f} s ({} users, Apollo included)".format('one by one (signup)', elapsed, args.users))
+
+        users.delete_many({'username': {'$regex': "^bench_roster_"}})
+        roster = Roster(app, None)
+        start = time.perf_counter()
+        statuses = roster.import_users(rows)
+        created = time.perf_counter() - start
+        user_ids = [status['_id'] for status in statuses if status['status'] == 'created']
+        start = time.perf_counter()
+        roster.provision(user_ids)
+        provisioned = time.perf_counter() - start
+        print("{:<28} {:.1f} s ({} users created in {:.1f} s, Apollo in {:.1f} s)".format(
+            'roster', created + provisioned, len(user_ids), created, provisioned))
+        users.delete_many({'username': {'$regex': "^bench_roster_"}})
+
+
+if __name__ == '__main__':
+    main()
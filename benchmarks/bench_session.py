@@ -0,0 +1,106 @@
+"""Benchmark the size and cost of the login sessions
+
+Usage: python -m benchmarks.bench_session --config config/genocrowd.test.ini [--requests 2000]
+
+Log a user in and call /api/auth/check, with the previous cookie sessions
+(the whole user document, with its password hash and current annotation,
+signed in the cookie) and with SessionStore (session id in the cookie, user
+loaded from MongoDB, with and without the per-process cache). Print the
+bytes of the Cookie request header and of the Set-Cookie header of the
+login response, and the time per request. The bench user is removed at
+the end.
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from flask import request
+from flask.sessions import SecureCookieSessionInterface
+
+from genocrowd.app import create_app
+
+
+def make_user(app):
+    """Insert a user as created at signup, annotating a gene"""
+    users = app.mongo.db["users"]
+    users.delete_many({'username': "bench_session"})
+    user_id = users.insert_one({
+        'username': "bench_session",
+        'email': "bench_session@genocrowd.org",
+        'password': app.bcrypt.generate_password_hash("bench_session").decode('utf-8'),
+        'created': datetime.utcnow(),
+        'isAdmin': False,
+        'isExternal': False,
+        'blocked': False,
+        'current_annotation': {
+            '_id': "gene-LOC100000", 'uploadDate': datetime.utcnow(), 'chromosome': "NC_042493.1",
+            'start': 8300000, 'end': 8308000, 'strand': -1, 'isAnnotable': True, 'isValidated': False,
+            'difficulty': 4200, 'level': 1, 'priority': 0, 'redundancy': 1, 'available': 0, 'done': 0,
+            'annotators': ["bench_session"], 'tags': [], 'dataset': "GCF_000002035.6", 'upload': None,
+            'hash': "0" * 40, 'features': {'length': 8000, 'isoforms': 2, 'exons': 7, 'intron_mean': 640, 'intron_max': 1900}
+        },
+        'next_annotation': None,
+        'grade': "L3",
+        'group': 4,
+        'total_annotation': 27,
+        'level': 1
+    }).inserted_id
+    user = users.find_one({'_id': user_id})
+    user['_id'] = str(user_id)
+    return user
+
+
+def measure(app, user, number):
+    """Log in and call /api/auth/check, return the sizes (bytes) of the
+    Cookie header and of the Set-Cookie header of the login, and the time
+    per request (ms)"""
+    # Response of the login
+    with app.test_request_context():
+        session = app.session_interface.open_session(app, request)
+        session['user'] = user
+        response = app.response_class()
+        app.session_interface.save_session(app, session, response)
+    set_cookie = response.headers['Set-Cookie']
+    response_bytes = len("Set-Cookie: " + set_cookie)
+    value = set_cookie.split(';')[0].split('=', 1)[1]
+    request_bytes = len("Cookie: {}={}".format(app.session_cookie_name, value))
+
+    client = app.test_client()
+    client.set_cookie('localhost', app.session_cookie_name, value)
+    assert client.post('/api/auth/check').json['username'] == user['username']
+
+    start = time.perf_counter()
+    for number_request in range(number):
+        client.post('/api/auth/check')
+    elapsed = (time.perf_counter() - start) * 1000 / number
+
+    with client.session_transaction() as session:
+        session.pop('user', None)
+    return request_bytes, response_bytes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--requests', type=int, default=2000, help='Number of requests of each kind')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        user = make_user(app)
+        store = app.session_interface
+        ttl = store.cache.ttl
+        for name, interface, cache_ttl in (('cookie session (user document)', SecureCookieSessionInterface(), ttl),
+                                           ('SessionStore, no user cache', store, 0),
+                                           ('SessionStore, user cache', store, ttl)):
+            app.session_interface = interface
+            store.cache.ttl = cache_ttl
+            request_bytes, response_bytes, elapsed = measure(app, user, args.requests)
+            print("{:<32} Cookie {:>5} B, Set-Cookie {:>4} B, {:.3f} ms/request".format(name, request_bytes, response_bytes, elapsed))
+        app.session_interface = store
+        app.mongo.db["users"].delete_many({'username': "bench_session"})
+
+
+if __name__ == '__main__':
+    main()
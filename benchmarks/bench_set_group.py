@@ -0,0 +1,79 @@
+"""Benchmark the assignment of students to groups (LocalAuth.set_group)
+
+Usage: python -m benchmarks.bench_set_group --config config/genocrowd.test.ini [--students 500 5000]
+
+Compare the previous implementation (two updates per student, whole user
+documents pushed in the groups) with the bulk_write one. The users and
+groups collections of the config database are emptied before and after
+each run.
+"""
+
+import argparse
+import random
+import time
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+
+from pymongo import ReturnDocument
+
+
+def fill(db, size, nb_groups, nb_grades):
+    """Insert students and empty groups"""
+    db.users.drop()
+    db.groups.drop()
+    db.groups.insert_one({'groupsAmount': nb_groups})
+    db.groups.insert_many([{'number': number + 1, 'name': "", 'student': []} for number in range(nb_groups)])
+    db.users.insert_many([{
+        'username': "user%d" % number,
+        'email': "user%d@genocrowd.org" % number,
+        'password': "$2b$12$" + "x" * 53,
+        'grade': "grade%d" % (number % nb_grades),
+        'group': None,
+        'total_annotation': 0,
+        'level': 0,
+        'current_annotation': None
+    } for number in range(size)])
+
+
+def legacy(db, max_group):
+    """Previous set_group"""
+    group_number = 1
+    for grade in db.users.distinct("grade"):
+        users = list(db.users.find({'grade': grade}))
+        random.shuffle(users)
+        for user in users:
+            if group_number > max_group:
+                group_number = 1
+            db.users.find_one_and_update({'_id': user['_id']}, {'$set': {'group': group_number}}, return_document=ReturnDocument.AFTER)
+            user['_id'] = str(user['_id'])
+            db.groups.update_one({'number': group_number}, {'$push': {'student': user}})
+            group_number += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--students', type=int, nargs='+', default=[500, 5000], help='Number of students')
+    parser.add_argument('--groups', type=int, default=10, help='Number of groups')
+    parser.add_argument('--grades', type=int, default=4, help='Number of grades')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        db = app.mongo.db
+        for size in args.students:
+            for name, function in (('per student', lambda: legacy(db, args.groups)),
+                                   ('bulk_write', lambda: LocalAuth(app, None).set_group({'groupsAmount': args.groups}))):
+                fill(db, size, args.groups, args.grades)
+                start = time.perf_counter()
+                function()
+                elapsed = time.perf_counter() - start
+                groups_size = db.command('collstats', 'groups')['size'] / 1000
+                print("{} students, {:<12} {:.3f} s, groups collection {:.0f} kB".format(size, name, elapsed, groups_size))
+        db.users.drop()
+        db.groups.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark the user queries with and without projections
+
+Usage: python -m benchmarks.bench_user_queries --config config/genocrowd.test.ini [--users 10000]
+
+Compare the previous queries (whole user documents: password hash, current
+annotation and prefetched gene GFF) with the LocalAuth projections, for the
+admin listing, the leaderboard and the login. Sizes are the BSON size of
+the documents sent by MongoDB. The users collection of the config database
+is emptied before and after the run.
+"""
+
+import argparse
+import datetime
+
+from benchmarks.bench_gene_selection import measure
+
+import bson
+
+from genocrowd.app import create_app
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+
+
+def fill_users(db, size, gff_size):
+    """Insert users with an annotation in progress and a prefetched gene"""
+    db.users.drop()
+    users = []
+    for number in range(size):
+        users.append({
+            'username': "user%d" % number,
+            'email': "user%d@genocrowd.org" % number,
+            'password': "$2b$12$" + "x" * 53,
+            'grade': "grade%d" % (number % 4),
+            'group': number % 20 + 1,
+            'role': "user",
+            'isAdmin': False,
+            'isExternal': False,
+            'blocked': False,
+            'created': datetime.datetime.now(),
+            'total_annotation': number % 500,
+            'level': 0,
+            'current_annotation': "gene-%d" % number,
+            'next_annotation': {'_id': "gene-%d" % (number + 1), 'state': "loaded", 'gff': "x" * gff_size}
+        })
+        if len(users) == 10000:
+            db.users.insert_many(users)
+            users = []
+    if users:
+        db.users.insert_many(users)
+    db.users.create_index('username')
+
+
+def transferred(documents):
+    """BSON size of documents, in kB"""
+    return sum(len(bson.BSON.encode(document)) for document in documents) / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', required=True, help='Genocrowd config file (use a test database)')
+    parser.add_argument('--users', type=int, default=10000, help='Number of users')
+    parser.add_argument('--gff-size', type=int, default=2000, help='Size of the prefetched GFF of each user')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of queries per measure')
+    args = parser.parse_args()
+
+    app = create_app(config=args.config)
+    with app.app_context():
+        db = app.mongo.db
+        fill_users(db, args.users, args.gff_size)
+        auth = LocalAuth(app, None)
+
+        cases = (
+            ('admin list', lambda: list(db.users.find({})), lambda: list(auth.find_users('admin'))),
+            ('leaderboard', lambda: list(db.users.find({})), lambda: list(auth.find_users('leaderboard'))),
+            ('login', lambda: [db.users.find_one({'username': "user42"})],
+             lambda: [db.users.find_one({'username': "user42"}, projection=LocalAuth.PROJECTIONS['login'])]),
+        )
+        for name, full, projected in cases:
+            for variant, function in (('full', full), ('projection', projected)):
+                size = transferred(function())
+                median, p95 = measure(function, args.repeat)
+                print("{} users, {:<12} {:<11} {:>9.1f} kB, median {:.2f} ms, p95 {:.2f} ms".format(
+                    args.users, name, variant, size, median, p95))
+
+        db.users.drop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""Synthetic data used by the benchmarks"""
+
+import random
+
+
+def write_gff(path, nb_genes, nb_chromosomes=1, seed=42):
+    """Write a synthetic GFF3 file
+
+    Each gene has one to three mRNAs made of one to ten exons, with their CDS,
+    and the same kind of attributes as NCBI annotations.
+
+    Parameters
+    ----------
+    path : str
+        Output file
+    nb_genes : int
+        Number of genes
+    nb_chromosomes : int, optional
+        Number of sequences the genes are spread on
+    seed : int, optional
+        Random seed
+
+    Returns
+    -------
+    str
+        Output file
+    """
+    rand = random.Random(seed)
+    per_chromosome = max(1, nb_genes // nb_chromosomes)
+    with open(path, 'w') as gff:
+        gff.write("##gff-version 3\n")
+        for number in range(nb_genes):
+            chromosome = "NC_%06d.1" % (number // per_chromosome)
+            position = (number % per_chromosome) * 12000 + rand.randint(1, 1000)
+            strand = rand.choice('+-')
+            gene_id = "gene-LOC%d" % number
+            gene_end = position + 8000
+            gff.write("%s\tGnomon\tgene\t%d\t%d\t.\t%s\t.\tDbxref=GeneID:%d;ID=%s;Name=LOC%d;gbkey=Gene;gene=LOC%d;gene_biotype=protein_coding\n" % (chromosome, position, gene_end, strand, number, gene_id, number, number))
+            for isoform in range(rand.randint(1, 3)):
+                mrna_id = "rna-XM_%d.%d" % (number, isoform + 1)
+                gff.write("%s\tGnomon\tmRNA\t%d\t%d\t.\t%s\t.\tDbxref=GeneID:%d;ID=%s;Parent=%s;gbkey=mRNA;gene=LOC%d;product=uncharacterized protein LOC%d;transcript_id=XM_%d.%d\n" % (chromosome, position, gene_end, strand, number, mrna_id, gene_id, number, number, number, isoform + 1))
+                nb_exons = rand.randint(1, 10)
+                size = 8000 // nb_exons
+                for exon in range(nb_exons):
+                    start = position + exon * size
+                    end = start + size // 2
+                    for kind in ("exon", "CDS"):
+                        gff.write("%s\tGnomon\t%s\t%d\t%d\t.\t%s\t%s\tDbxref=GeneID:%d;ID=%s-%s-%d;Parent=%s;gbkey=%s;gene=LOC%d;product=uncharacterized protein LOC%d\n" % (chromosome, kind, start, end, strand, "." if kind == "exon" else "0", number, kind.lower(), mrna_id, exon + 1, mrna_id, "mRNA" if kind == "exon" else "CDS", number, number))
+    return path
@@ -2,11 +2,13 @@
 import sys
 import traceback
 
-from flask import (Blueprint, current_app, jsonify, request, session)
+from flask import (Blueprint, Response, current_app, json, jsonify, request, session, stream_with_context)
 
 from genocrowd.api.auth.login import admin_required
 from genocrowd.libgenocrowd.Data import Data
+from genocrowd.libgenocrowd.JobManager import JobManager
 from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.Roster import Roster
 
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/')
@@ -27,6 +29,7 @@ def get_users():
     try:
         local_auth = LocalAuth(current_app, session)
         all_users = local_auth.get_all_users()
+        first = next(all_users, None)
     except Exception as e:
         traceback.print_exc(file=sys.stdout)
         return jsonify({
@@ -35,11 +38,16 @@ def get_users():
             'errorMessage': str(e)
         }), 500
 
-    return jsonify({
-        'users': all_users,
-        'error': False,
-        'errorMessage': ''
-    })
+    def generate():
+        """Send the users as they are read from the database"""
+        yield '{"users": ['
+        if first is not None:
+            yield json.dumps(first)
+            for user in all_users:
+                yield ',' + json.dumps(user)
+        yield '], "error": false, "errorMessage": ""}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 
 @admin_bp.route('/api/admin/setadmin', methods=['POST'])
@@ -103,10 +111,112 @@ def set_blocked():
 @admin_bp.route('/api/admin/setgroup', methods=['POST'])
 @admin_required
 def set_group():
-    local_auth = LocalAuth(current_app, session)
-    data = request.get_json()
-    result = local_auth.set_group(data)
-    return result
+    """Assign a group to each student, in a background job
+
+    Parameters
+    ----------
+    groupsAmount : int
+        Number of groups, at least 1
+
+    Returns
+    -------
+    json
+        job: the regrouping job, its result (gradeList) is available at
+        /api/jobs/<job id>
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        groups_amount = int(data.get('groupsAmount'))
+    except (TypeError, ValueError):
+        groups_amount = 0
+    if groups_amount < 1:
+        return jsonify({
+            'job': None,
+            'error': True,
+            'errorMessage': 'groupsAmount must be a number of groups, at least 1'
+        }), 400
+
+    job_manager = JobManager(current_app, session)
+    job = job_manager.submit(job_manager.create('set_group', {'groupsAmount': groups_amount}))
+    return jsonify({
+        'job': job,
+        'error': job['status'] == 'failure',
+        'errorMessage': job['errors']
+    })
+
+
+@admin_bp.route('/api/admin/importusers', methods=['POST'])
+@admin_required
+def import_users():
+    """Create the users of a class roster, then their Apollo users and
+    organisms in a background job
+
+    Parameters
+    ----------
+    file : file, optional
+        CSV (username, email, password, grade and role columns) or JSON
+        roster (form data)
+    users : list, optional
+        The roster rows, in a JSON body
+
+    Returns
+    -------
+    json
+        rows: status of each row (created or rejected, with the errors)
+        job: the provisioning job, progress is available at /api/jobs/<job id>
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
+    """
+    roster = Roster(current_app, session)
+    try:
+        if 'file' in request.files:
+            rows = roster.parse(request.files['file'].read().decode('utf-8'))
+        else:
+            data = request.get_json()
+            rows = data if isinstance(data, list) else (data or {}).get('users')
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ValueError("A JSON roster is a list of users")
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({
+            'rows': [],
+            'job': None,
+            'error': True,
+            'errorMessage': str(e)
+        }), 400
+
+    statuses = roster.import_users(rows)
+    user_ids = [status['_id'] for status in statuses if status['status'] == 'created']
+    job = None
+    if user_ids:
+        job_manager = JobManager(current_app, session)
+        job = job_manager.submit(job_manager.create('provision_users', {'users': user_ids}))
+    return jsonify({
+        'rows': statuses,
+        'job': job,
+        'error': False,
+        'errorMessage': ''
+    })
+
+
+@admin_bp.route('/api/admin/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """Get the latency metrics of this process
+
+    Returns
+    -------
+    json
+        metrics: count, mean, p50, p95, max and histogram of each metric
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
+    """
+    return jsonify({
+        'metrics': current_app.metrics.summary(),
+        'error': False,
+        'errorMessage': ''
+    })
 
 
 @admin_bp.route('/api/admin/getgroups', methods=['GET'])
@@ -148,15 +258,19 @@ def get_groups():
 @admin_bp.route('/api/admin/getlevel', methods=['GET'])
 @admin_required
 def get_level():
-    """Get information about levels
+    """Get the difficulty levels, with their counters of genes and of
+    available, leased and done annotation slots
 
     Returns
     -------
     json
+        levels: list of levels
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
     """
     try:
         data_instance = Data(current_app, session)
-        all_levels = data_instance.get_level()  # TODO not implemented, code lost
+        all_levels = data_instance.get_level()
     except Exception as e:
         traceback.print_exc(file=sys.stdout)
         return jsonify({
@@ -175,14 +289,29 @@ def get_level():
 @admin_bp.route('/api/admin/savelevel', methods=['POST'])
 @admin_required
 def save_level():
-    """
+    """Replace the difficulty levels (name and minimum difficulty of each
+    level), and move the genes to their new level
+
+    Returns
+    -------
+    json
+        levels: the new levels
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
     """
     data = request.get_json()
     dataInstance = Data(current_app, session)
-    result = dataInstance.save_level(data)  # TODO not implemented, code lost
+    try:
+        levels = dataInstance.save_level(data)
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'levels': [],
+            'error': True,
+            'errorMessage': str(e)
+        }), 400
 
-    return {
-        'truc': result,
+    return jsonify({
+        'levels': levels,
         'error': False,
-        'errorMessage': "",
-    }
+        'errorMessage': ''
+    })
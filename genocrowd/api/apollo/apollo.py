@@ -1,15 +1,13 @@
-import time
 from io import StringIO
 
-from apollo import ApolloInstance
-
 from flask import Blueprint, session
 from flask import current_app as ca
 
 from genocrowd.libgenocrowd.Data import Data
-from genocrowd.libgenocrowd.Utils import Utils
-
-import gridfs
+from genocrowd.libgenocrowd.GeneCheckout import GeneCheckout
+from genocrowd.libgenocrowd.GeneLease import GeneLease
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.JobManager import JobManager
 
 apollo_bp = Blueprint('apollo', __name__, url_prefix='/')
 
@@ -23,45 +21,19 @@ def annotation_start():
     json
         url: url for the apollo window, centered on the gene position
         attributes: chromosome on which the gene is
+        apolloWait: time waited for Apollo to show the gene, in seconds
     """
 
-    DataInstance = Data(ca, session)
-    current_gene = DataInstance.get_current_annotation(session["user"]["username"])
-
-    if not current_gene:
-        all_positions = DataInstance.get_all_positions()
-        level = DataInstance.get_user_level(session["user"]["username"])
-        restrict_positions = DataInstance.select_genes(level, all_positions)
-
-        # FIXME error if no gene in db
-        selected_item = Utils.get_random_items(1, restrict_positions)[0]
-        ca.logger.info("Selected gene: {}".format(selected_item))
-
-        db = ca.mongo.db
-        fs = gridfs.GridFS(db, collection="genes")  # FIXME not sure we really need gridfs (small chunks of gff)
-        gff_file = fs.get(selected_item["_id"])
-
-        gff_str = StringIO()
-        gff_str.write(gff_file.read().decode())
-
-        gff_str.seek(0)
-
-        ca.logger.info("Loading gff: {}".format(gff_str.read()))
-
-        gff_str.seek(0)
-
-        apollo = ApolloInstance(ca.apollo_url, ca.apollo_admin_email, ca.apollo_admin_password)
-        apollo.annotations.load_gff3("%s_%s" % (ca.apollo_org_id, session["user"]["email"]), gff_str)
-
-        time.sleep(1)
-
-        url = "%s/annotator/loadLink?loc=%s:%s..%s&organism=%s_%s" % (ca.apollo_url_ext, selected_item["chromosome"], selected_item["start"], selected_item["end"], ca.apollo_org_id, session["user"]["email"])
-        DataInstance.update_current_annotation(session["user"]["username"], selected_item)
-    else:
-        selected_item = DataInstance.get_current_annotation(session["user"]["username"])
-        url = "%s/annotator/loadLink?loc=%s:%s..%s&organism=%s_%s" % (ca.apollo_url_ext, selected_item["chromosome"], selected_item["start"], selected_item["end"], ca.apollo_org_id, session["user"]["email"])
-
-    return {'url': url}
+    checkout = GeneCheckout(ca, session)
+    gene, waited = checkout.checkout(session["user"])
+    if not gene:
+        return {
+            'error': True,
+            'errorMessage': 'No gene available for your level',
+            'url': None
+        }
+    url = checkout.url(session["user"]["email"], gene)
+    return {'url': url, 'apolloWait': waited}
 
 
 @apollo_bp.route('api/apollo/save', methods=["POST"])
@@ -70,14 +42,20 @@ def annotation_end():
     DataInstance = Data(ca, session)
     current_gene = DataInstance.get_current_annotation(session["user"]["username"])
 
-    apollo = ApolloInstance(ca.apollo_url, ca.apollo_admin_email, ca.apollo_admin_password)
+    apollo = ca.apollo
     features = apollo.annotations.get_features(organism="%s_%s" % (ca.apollo_org_id, session["user"]["email"]), sequence=current_gene["chromosome"])["features"]
 
     gff_file = apollo.annotations.get_gff3(features[0]["uniquename"], "%s_%s" % (ca.apollo_org_id, session["user"]["email"]))
 
     DataInstance.store_answers_from_user(session["user"]["username"], gff_file)
+    GeneLease(ca, session).complete(current_gene["_id"], session["user"]["username"])
     apollo.organisms.delete_features("%s_%s" % (ca.apollo_org_id, session["user"]["email"]))
 
+    checkout = GeneCheckout(ca, session)
+    if checkout.prefetch(session["user"]) and checkout.mode == 'load':
+        manager = JobManager(ca, session)
+        manager.submit(manager.create('load_gene', {'user': {'username': session["user"]["username"], 'email': session["user"]["email"]}}))
+
     return {
         'error': False,
         'errorMessage': 'no error'
@@ -94,6 +72,7 @@ def validation():
         url: url for the apollo window, centered on the gene position
         attributes: chromosome on which the gene is
         gene_id : current gene id
+        apolloWait: time waited for Apollo to show the gene, in seconds
     """
 
     DataInstance = Data(ca, session)
@@ -103,12 +82,9 @@ def validation():
     selected_item = all_positions[0]
     ca.logger.info("Selected gene: {}".format(selected_item))
 
-    db = ca.mongo.db
-    fs = gridfs.GridFS(db, collection="answers")  # FIXME not sure we really need gridfs (small chunks of gff)
-    gff_file = fs.get(selected_item["_id"])
-
+    gff = GffStorage(ca, session, "answers").get(selected_item["_id"])
     gff_str = StringIO()
-    gff_str.write(gff_file.read().decode())
+    gff_str.write(gff)
 
     gff_str.seek(0)
 
@@ -116,14 +92,17 @@ def validation():
 
     gff_str.seek(0)
 
-    apollo = ApolloInstance(ca.apollo_url, ca.apollo_admin_email, ca.apollo_admin_password)
-    apollo.organisms.delete_features("%s_%s" % (ca.apollo_org_id, session["user"]["email"]))
-    apollo.annotations.load_gff3("%s_%s" % (ca.apollo_org_id, session["user"]["email"]), gff_str)
-
-    time.sleep(1)
+    apollo = ca.apollo
+    organism = "%s_%s" % (ca.apollo_org_id, session["user"]["email"])
+    apollo.organisms.delete_features(organism)
+    apollo.annotations.load_gff3(organism, gff_str)
+    ready, waited = apollo.wait_for_features(organism, selected_item["chromosome"], apollo.feature_names(gff) or [selected_item["_id"]])
+    if not ready:
+        ca.logger.warning("Answer {} still not visible in Apollo after {:.1f}s".format(selected_item["_id"], waited))
 
     url = "%s/annotator/loadLink?loc=%s:%s..%s&organism=%s_%s" % (ca.apollo_url_ext, selected_item["chromosome"], selected_item["start"], selected_item["end"], ca.apollo_org_id, session["user"]["email"])
     DataInstance.update_current_annotation(session["user"]["username"], selected_item)
     return {
         'url': url,
-        'gene_id': selected_item["_id"]}
+        'gene_id': selected_item["_id"],
+        'apolloWait': waited}
@@ -4,11 +4,9 @@ from functools import wraps
 from flask import Blueprint, jsonify, make_response, request, session
 from flask import current_app as ca
 
-from flask_pymongo import BSONObjectIdConverter
-
 from genocrowd.libgenocrowd.LocalAuth import LocalAuth
-
-from werkzeug.routing import BaseConverter
+from genocrowd.libgenocrowd.PasswordHasher import PasswordHasherBusy
+from genocrowd.libgenocrowd.RateLimiter import RateLimiter
 
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/')
@@ -52,7 +50,10 @@ def signup():
     local_auth.check_inputs(data)
     if not local_auth.get_error():
         # FIXME is it safe to pass role? where does it come from?
-        new_user = local_auth.add_user_to_database(data['username'], data['email'], data['password'], data['grade'], data['role'])
+        try:
+            new_user = local_auth.add_user_to_database(data['username'], data['email'], data['password'], data['grade'], data['role'])
+        except PasswordHasherBusy as e:
+            return jsonify({'error': True, 'errorMessage': [str(e)], 'user': {}}), 503
         new_user['_id'] = str(new_user['_id'])
         session['user'] = new_user
 
@@ -67,14 +68,29 @@ def signup():
 def login():
     """Allows a user to log in on Genocrowd
 
+    Attempts are limited per IP address and per account (429 with a
+    Retry-After header), and refused when the bcrypt pool is full (503).
+
     Returns
     -------
 
     user info in json format
     """
     data = request.get_json()
+    retry_after = RateLimiter(ca, session).check_login(request.remote_addr, data['login'])
+    if retry_after:
+        response = jsonify({
+            'error': True,
+            'errorMessage': ["Too many login attempts, please retry in {} seconds".format(retry_after)],
+            'user': {}})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+
     local_auth = LocalAuth(ca, session)
-    result = local_auth.authenticate_user(data)
+    try:
+        result = local_auth.authenticate_user(data)
+    except PasswordHasherBusy as e:
+        return jsonify({'error': True, 'errorMessage': [str(e)], 'user': {}}), 503
     if result["user"] != {}:
         if result["user"]['blocked']:
             result = {
@@ -150,7 +166,10 @@ def update_password():
 
     online_user = session['user']
     local_auth = LocalAuth(ca, session)
-    result = local_auth.update_password(data, online_user)
+    try:
+        result = local_auth.update_password(data, online_user)
+    except PasswordHasherBusy as e:
+        return jsonify({'error': True, 'error_message': str(e), 'user': online_user}), 503
     if '_id' in result['user']:
         result['user']['_id'] = str(result['user']['_id'])
         session['user'] = result['user']
@@ -178,9 +197,7 @@ def delete_account():
         user : empty dictionnary
         logged: False
     """
-    users = ca.mongo.db.users
-    bson = BSONObjectIdConverter(BaseConverter)
-    users.find_one_and_delete({'_id': bson.to_python(session['user']['_id'])})
+    LocalAuth(ca, session).delete_user(session['user']['_id'])
     session.pop('user', None)
     ca.logger.debug(session)
 
@@ -1,69 +1,168 @@
-import tempfile
-from io import StringIO
-
-from BCBio import GFF
-
-from flask import Blueprint, request, session
+from flask import Blueprint, Response, json, jsonify, request, session, stream_with_context
 from flask import current_app as ca
 
 from genocrowd.api.auth.login import admin_required, login_required
 from genocrowd.libgenocrowd.Data import Data
+from genocrowd.libgenocrowd.GeneRegions import GeneRegions, parse_region
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.JobManager import JobManager
+from genocrowd.libgenocrowd.Leaderboard import Leaderboard
+from genocrowd.libgenocrowd.Listing import Listing
 from genocrowd.libgenocrowd.LocalAuth import LocalAuth
 
-import gridfs
-
 
 data_bp = Blueprint('data', __name__, url_prefix='/')
 
 
+def ndjson_response(documents, filename):
+    """Stream documents as newline-delimited JSON
+
+    Parameters
+    ----------
+    documents : iterable
+        JSON serializable documents
+    filename : str
+        Name of the downloaded file
+
+    Returns
+    -------
+    Response
+        Streamed response
+    """
+    def generate():
+        for document in documents:
+            yield json.dumps(document) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': 'attachment; filename={}'.format(filename)})
+
+
+def gff_response(documents, storage, filename):
+    """Stream the GFF of documents as a single GFF3 file
+
+    Parameters
+    ----------
+    documents : iterable
+        Documents, with their GffStorage.PAYLOAD fields
+    storage : GffStorage
+        Storage of the documents
+    filename : str
+        Name of the downloaded file
+
+    Returns
+    -------
+    Response
+        Streamed response
+    """
+    def generate():
+        yield '##gff-version 3\n'
+        for document in documents:
+            lines = [line for line in storage.read(document).decode().splitlines() if line and not line.startswith('##gff-version')]
+            yield '# {}\n{}\n'.format(document['_id'], '\n'.join(lines))
+
+    return Response(stream_with_context(generate()), mimetype='text/plain',
+                    headers={'Content-Disposition': 'attachment; filename={}'.format(filename)})
+
+
 @data_bp.route('/api/data/uploadgenes', methods=["POST"])
 @admin_required
 def gene_from_apollo():
-    """ Receives the GFF file from the client:
+    """ Receives the GFF file from the client and starts a background job:
         - Splits the genes in separate GFF files
         - Add a priority to each genes
         - Calculates the difficulty of each genes
-        - Saves them in the database
+        - Saves them in the database by batches, skipping the genes of the
+          dataset that did not change
+        - Optionally retires the genes of the dataset missing from the file
+
+    Parameters
+    ----------
+    file : file
+        The GFF3 file (form data)
+    priority : int, optional
+        Priority of the genes
+    dataset : str, optional
+        Dataset of the genes, the file name by default
+    retire : bool, optional
+        Retire the genes of the dataset that are not in the file
+
     Returns
     -------
 
     json
         error
         errorMessage
+        job : the upload job, progress is available at /api/jobs/<job id>
     """
-    db = ca.mongo.db
-    fs = gridfs.GridFS(db, collection="genes")
-    priority = request.form['priority']
+    priority = int(request.form.get('priority', 0))
+    dataset = request.form.get('dataset') or None
+    retire = request.form.get('retire', 'false').lower() in ('true', '1', 'on')
     file = request.files['file']
-    with tempfile.NamedTemporaryFile(mode='w+') as full_gff:
-        file.save(full_gff.name)
-        result = {
-            'error': False,
-            'errorMessage': "",
-        }
-        count = 1
-        for rec in GFF.parse(full_gff):
-            gene_list = rec.features
-            for gene in gene_list:
-                # TODO change difficulty calculation
-                nb_features = len(gene.sub_features)
-                difficulty = (gene.location.end - gene.location.start) - nb_features * 10
-                rec.annotations = {}
-                rec.seq = ""
-                rec.features = [gene]
-                gff_out = StringIO()
-                GFF.write([rec], gff_out)
-                fs.put(gff_out.getvalue().encode(), _id=gene.id, chromosome=rec.id, start=gene.location.start, end=gene.location.end, strand=gene.location.strand, isAnnotable=True, isValidated=False, difficulty=difficulty, priority=priority, tags=[])
-                count += 1
-
-    # FIXME refresh gene list in UI
-    return result
+    job_manager = JobManager(ca, session)
+    job = job_manager.submit(job_manager.save_upload(file, priority, dataset, retire))
+
+    return {
+        'error': job['status'] == 'failure',
+        'errorMessage': job['errors'],
+        'job': job
+    }
+
+
+@data_bp.route('api/data/getbatches', methods=["GET"])
+@admin_required
+def get_batches():
+    """ Gets a page of uploads, most recent first
+
+    Parameters
+    ----------
+    dataset : str, optional
+        Filter (query string)
+    limit : int, optional
+        Number of uploads per page
+    cursor : str, optional
+        next of the previous page
+
+    Returns
+    -------
+
+    json
+        error : Boolean
+        errorMessage : str
+        batches : List, with the counts of added, changed, unchanged and
+            retired genes of the finished uploads
+        next : cursor of the next page, null on the last page
+    """
+    try:
+        page = Listing(ca, session, 'batches').page(dict(request.args.items(), order=request.args.get('order', 'desc')))
+    except ValueError as e:
+        return jsonify({'error': True, 'errorMessage': str(e)}), 400
+    return {
+        'error': False,
+        'errorMessage': "",
+        'batches': page['documents'],
+        'next': page['next']
+    }
 
 
 @data_bp.route('api/data/getgenes', methods=["GET"])
 @admin_required
 def admin_get_genes():
-    """ Gets all the genes in the database to display them in the admin tab
+    """ Gets a page of genes to display them in the admin tab
+
+    Parameters
+    ----------
+    chromosome, annotable, validated, priority, minDifficulty, maxDifficulty : optional
+        Filters (query string)
+    sort : str, optional
+        position (default), id, difficulty or priority
+    order : str, optional
+        asc (default) or desc
+    limit : int, optional
+        Number of genes per page
+    cursor : str, optional
+        next of the previous page
+    format : str, optional
+        ndjson to export all the matching genes, one JSON per line
 
     Returns
     -------
@@ -72,24 +171,141 @@ def admin_get_genes():
         error : Boolean
         errorMessage : str
         genes : List
+        next : cursor of the next page, null on the last page
     """
-    dataInstance = Data(ca, session)
-    gene_list = dataInstance.get_all_positions()
+    listing = Listing(ca, session, 'genes')
+    try:
+        if request.args.get('format') == 'ndjson':
+            return ndjson_response(listing.export(request.args), 'genes.ndjson')
+        page = listing.page(request.args)
+    except ValueError as e:
+        return jsonify({'error': True, 'errorMessage': str(e)}), 400
     result = {'error': False,
               'errorMessage': "",
-              'genes': gene_list
+              'genes': page['documents'],
+              'next': page['next']
               }
     return result
 
 
+@data_bp.route('api/data/getregion', methods=["GET"])
+@admin_required
+def get_region():
+    """ Gets the genes overlapping a genomic region
+
+    Parameters
+    ----------
+    region : str
+        chromosome:start-end, 1-based inclusive positions with optional k or
+        M suffixes (NC_042493.1:8.3M-8.4M), or a whole chromosome
+    limit : int, optional
+        Maximum number of genes
+    format : str, optional
+        ndjson to export all the genes of the region, one JSON per line
+
+    Returns
+    -------
+
+    json
+        error : Boolean
+        errorMessage : str
+        genes : List, by position
+        truncated : True if the region has more than limit genes
+    """
+    regions = GeneRegions(ca, session)
+    try:
+        chromosome, start, end = parse_region(request.args.get('region', ''))
+        if not chromosome:
+            raise ValueError("A region is required")
+        if request.args.get('format') == 'ndjson':
+            return ndjson_response(regions.region(chromosome, start, end), 'region.ndjson')
+        limit = min(max(int(request.args.get('limit', Listing(ca, session, 'genes').page_size)), 1), Listing.MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({'error': True, 'errorMessage': str(e)}), 400
+    genes = list(regions.region(chromosome, start, end, limit=limit + 1))
+    return {
+        'error': False,
+        'errorMessage': "",
+        'genes': genes[:limit],
+        'truncated': len(genes) > limit
+    }
+
+
+@data_bp.route('api/data/getoverlaps', methods=["GET"])
+@admin_required
+def get_overlaps():
+    """ Gets the genes overlapping a gene, on any strand
+
+    Parameters
+    ----------
+    gene : str
+        The gene id
+
+    Returns
+    -------
+
+    json
+        error : Boolean
+        errorMessage : str
+        gene : the gene
+        overlaps : List of the other genes overlapping it, by position
+    """
+    gene, overlaps = GeneRegions(ca, session).overlaps(request.args.get('gene', ''), limit=Listing.MAX_LIMIT)
+    if not gene:
+        return jsonify({'error': True, 'errorMessage': "Unknown gene"}), 404
+    return {
+        'error': False,
+        'errorMessage': "",
+        'gene': gene,
+        'overlaps': overlaps
+    }
+
+
 @data_bp.route('api/data/getallanswers', methods=['GET'])
+@admin_required
 def get_all_answers():
-    dataInstance = Data(ca, session)
-    answers = dataInstance.get_all_answers()
+    """ Gets a page of answers to display them in the validation tab
+
+    Parameters
+    ----------
+    gene, annotator, validated, since, until : optional
+        Filters (query string), dates are YYYY-MM-DD or
+        YYYY-MM-DDTHH:MM:SS (UTC)
+    sort : str, optional
+        date (default), id, gene or annotator
+    order : str, optional
+        asc (default) or desc
+    limit : int, optional
+        Number of answers per page
+    cursor : str, optional
+        next of the previous page
+    format : str, optional
+        ndjson to export all the matching answers, one JSON per line, or
+        gff to export their annotations in a single GFF3 file
+
+    Returns
+    -------
+
+    json
+        error : Boolean
+        errorMessage : str
+        answer : List
+        next : cursor of the next page, null on the last page
+    """
+    listing = Listing(ca, session, 'answers')
+    try:
+        if request.args.get('format') == 'ndjson':
+            return ndjson_response(listing.export(request.args), 'answers.ndjson')
+        if request.args.get('format') == 'gff':
+            return gff_response(listing.export(request.args, payload=True), GffStorage(ca, session, "answers"), 'answers.gff3')
+        page = listing.page(request.args)
+    except ValueError as e:
+        return jsonify({'error': True, 'errorMessage': str(e)}), 400
     result = {
         'error': False,
         'errorMessage': "",
-        'answer': answers
+        'answer': page['documents'],
+        'next': page['next']
     }
     return result
 
@@ -158,40 +374,95 @@ def remove_gene_from_db():
         errorMessage : str
     """
     data = request.get_json()
-    db = ca.mongo.db
-    fs = gridfs.GridFS(db, collection="genes")
-    fs.delete(data["_id"])
+    GffStorage(ca, session, "genes").delete(data["_id"])
     result = {'error': False,
               'errorMessage': ""
               }
     return result
 
 
-@data_bp.route('api/data/removeallgenes', methods=["GET"])
+@data_bp.route('api/data/removeallgenes', methods=["POST"])
 @admin_required
 def remove_all_genes_from_db():
-    """Remove all genes from de db
+    """Remove the genes from de db with bulk deletes, in a background job
+    when there are more than remove_genes_sync_max of them
+
+    Parameters
+    ----------
+    chromosome, upload, dataset, priority, annotable, validated, minDifficulty, maxDifficulty : optional
+        Filters (json body or query string)
+    all : bool, optional
+        Must be true to remove all the genes, without filter
 
     Return
     ------
     json
         error : Boolean
         errorMessage: str
+        count : number of matching genes
+        result : removed, chunks, leases and elapsed, null when a job was
+            started
+        job : the removal job, null when the genes were removed directly
     """
-    dataInstance = Data(ca, session)
-    gene_list = dataInstance.get_all_positions()
+    params = request.get_json(silent=True)
+    if params is None:
+        params = request.args
+    if not hasattr(params, 'items'):
+        return jsonify({'error': True, 'errorMessage': "Filters must be an object"}), 400
+    known = Listing.LISTINGS['genes']['filters']
+    unknown = sorted(key for key in params.keys() if key not in known and key != 'all')
+    if unknown:
+        return jsonify({'error': True, 'errorMessage': "Unknown filters: {}".format(", ".join(unknown))}), 400
+    filters = {key: str(value) for key, value in params.items() if key in known}
+    empty = sorted(key for key, value in filters.items() if not value.strip())
+    if empty:
+        return jsonify({'error': True, 'errorMessage': "Empty filters: {}".format(", ".join(empty))}), 400
+    if not filters and str(params.get('all', '')).lower() not in ('true', '1'):
+        return jsonify({'error': True, 'errorMessage': "No filter: set all to true to remove all the genes"}), 400
+
+    data_instance = Data(ca, session)
+    try:
+        count = data_instance.count_genes(filters)
+    except ValueError as e:
+        return jsonify({'error': True, 'errorMessage': str(e)}), 400
+
+    result = None
+    job = None
+    if count <= ca.iniconfig.getint('genocrowd', 'remove_genes_sync_max', fallback=10000):
+        result = data_instance.remove_genes(filters)
+    else:
+        job_manager = JobManager(ca, session)
+        job = job_manager.submit(job_manager.create('remove_genes', {'filters': filters}))
+
+    return {
+        'error': job is not None and job['status'] == 'failure',
+        'errorMessage': job['errors'] if job else "",
+        'count': count,
+        'result': result,
+        'job': job
+    }
 
-    db = ca.mongo.db
-    fs = gridfs.GridFS(db, collection="genes")
 
-    for element in gene_list:
-        fs.delete(element['_id'])
+@data_bp.route('api/data/computedifficulty', methods=["GET"])
+@admin_required
+def compute_difficulty():
+    """Compute the difficulty and the level of all the genes, in a
+    background job
 
-    result = {
-        'error': False,
-        'errorMessage': "",
+    Return
+    ------
+    json
+        error : Boolean
+        errorMessage: str
+        job : the job, its result has the number of genes per level
+    """
+    job_manager = JobManager(ca, session)
+    job = job_manager.submit(job_manager.create('compute_difficulty'))
+    return {
+        'error': job['status'] == 'failure',
+        'errorMessage': job['errors'],
+        'job': job
     }
-    return result
 
 
 @data_bp.route('api/data/getanswersamount', methods=["GET"])
@@ -286,8 +557,25 @@ def update_group_name():
 @data_bp.route('/api/data/gettopannotation', methods=['GET'])
 @login_required
 def get_top_annotation():
+    """Get the leaderboard
+
+    Parameters
+    ----------
+    top : int, optional
+        Number of users and groups (query string, default 3)
+
+    Returns
+    -------
+    json
+        top_users, top_groups, me (rank of the logged user), error,
+        errorMessage
+    """
+    try:
+        number = min(max(int(request.args.get('top', 3)), 1), Leaderboard.MAX_TOP)
+    except ValueError:
+        return jsonify({'error': True, 'errorMessage': 'top must be an integer'}), 400
     dataInstance = Data(ca, session)
-    result = dataInstance.get_top_annotation()
+    result = dataInstance.get_top_annotation(session['user']['username'], number)
     return result
 
 
@@ -0,0 +1,84 @@
+"""Background jobs routes"""
+from flask import (Blueprint, current_app, jsonify, session)
+
+from genocrowd.api.auth.login import admin_required
+from genocrowd.libgenocrowd.JobManager import JobManager
+
+
+jobs_bp = Blueprint('jobs', __name__, url_prefix='/')
+
+
+@jobs_bp.route('/api/jobs', methods=['GET'])
+@admin_required
+def get_jobs():
+    """Get the last jobs
+
+    Returns
+    -------
+    json
+        jobs: list of jobs, most recent first
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
+    """
+    job_manager = JobManager(current_app, session)
+    return jsonify({
+        'jobs': job_manager.get_jobs(),
+        'error': False,
+        'errorMessage': ''
+    })
+
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+@admin_required
+def get_job(job_id):
+    """Get the status and progress of a job
+
+    Returns
+    -------
+    json
+        job: status, progress (genes parsed, genes stored, errors...), result
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
+    """
+    job_manager = JobManager(current_app, session)
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({
+            'job': {},
+            'error': True,
+            'errorMessage': 'Unknown job'
+        }), 404
+
+    return jsonify({
+        'job': job,
+        'error': False,
+        'errorMessage': ''
+    })
+
+
+@jobs_bp.route('/api/jobs/<job_id>/resume', methods=['POST'])
+@admin_required
+def resume_job(job_id):
+    """Resume a failed or interrupted job from its checkpoint
+
+    Returns
+    -------
+    json
+        job: the resumed job
+        error: True if error, else False
+        errorMessage: the error message of error, else an empty string
+    """
+    job_manager = JobManager(current_app, session)
+    job = job_manager.resume(job_id)
+    if not job:
+        return jsonify({
+            'job': {},
+            'error': True,
+            'errorMessage': 'Unknown, running or already finished job'
+        })
+
+    return jsonify({
+        'job': job,
+        'error': False,
+        'errorMessage': ''
+    })
@@ -8,7 +8,7 @@ BLUEPRINTS : Tuple
 
 import configparser
 
-# from celery import Celery
+from celery import Celery
 
 from flask import Flask
 
@@ -25,13 +25,30 @@ from genocrowd.api.admin.admin import admin_bp
 from genocrowd.api.apollo.apollo import apollo_bp
 from genocrowd.api.auth.login import auth_bp
 from genocrowd.api.data.data import data_bp
+from genocrowd.api.jobs.jobs import jobs_bp
 from genocrowd.api.start import start_bp
 from genocrowd.api.view import view_bp
+from genocrowd.commands import compute_difficulty, migrate_storage, train_gff_dictionary
+from genocrowd.libapollo.ApolloClient import ApolloClient
+from genocrowd.libapollo.ApolloDirectory import ApolloDirectory
+from genocrowd.libgenocrowd.Cache import TTLCache
 from genocrowd.libgenocrowd.Data import Data
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GeneLease import GeneLease
+from genocrowd.libgenocrowd.GeneRegions import GeneRegions
+from genocrowd.libgenocrowd.GeneSelector import GeneSelector
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Leaderboard import Leaderboard
+from genocrowd.libgenocrowd.Levels import Levels
+from genocrowd.libgenocrowd.Listing import Listing
 from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.Metrics import Metrics
+from genocrowd.libgenocrowd.PasswordHasher import PasswordHasher
+from genocrowd.libgenocrowd.RateLimiter import RateLimiter
+from genocrowd.libgenocrowd.SessionStore import SessionStore
 
 
-# from kombu import Exchange, Queue
+from kombu import Exchange, Queue
 
 from pkg_resources import get_distribution
 
@@ -40,7 +57,7 @@ from sentry_sdk.integrations.celery import CeleryIntegration
 from sentry_sdk.integrations.flask import FlaskIntegration
 
 
-__all__ = ('create_app')
+__all__ = ('create_app', 'create_celery')
 
 BLUEPRINTS = (
     start_bp,
@@ -49,6 +66,7 @@ BLUEPRINTS = (
     admin_bp,
     data_bp,
     apollo_bp,
+    jobs_bp,
 )
 
 
@@ -103,7 +121,14 @@ def create_app(config='config/genocrowd.ini', app_name='genocrowd', blueprints=N
         if not mongo_dbname:
             raise Exception("Missing mongo_dbname in config file")
         app.mongo = PyMongo(app)
+        app.config['BCRYPT_LOG_ROUNDS'] = app.iniconfig.getint('genocrowd', 'bcrypt_rounds', fallback=12)
         app.bcrypt = Bcrypt(app)
+        app.password_hasher = PasswordHasher(
+            app.bcrypt,
+            rounds=app.config['BCRYPT_LOG_ROUNDS'],
+            workers=app.iniconfig.getint('genocrowd', 'bcrypt_workers', fallback=2),
+            queue_size=app.iniconfig.getint('genocrowd', 'bcrypt_queue_size', fallback=64)
+        )
         users = app.mongo.db.users
         app.mongo.db.genes
         app.mongo.db.answers
@@ -126,6 +151,21 @@ def create_app(config='config/genocrowd.ini', app_name='genocrowd', blueprints=N
         if app.apollo_url_ext.endswith("/"):
             app.apollo_url_ext = app.apollo_url_ext[:-1]
 
+        app.metrics = Metrics()
+        app.leaderboard_cache = TTLCache(app.iniconfig.getint('genocrowd', 'leaderboard_cache_ttl', fallback=30))
+        app.user_cache = TTLCache(app.iniconfig.getint('genocrowd', 'user_cache_ttl', fallback=30))
+        app.session_interface = SessionStore(app)
+        app.apollo = ApolloClient(
+            app.apollo_url,
+            app.apollo_admin_email,
+            app.apollo_admin_password,
+            max_connections=app.iniconfig.getint('genocrowd', 'apollo_max_connections', fallback=10),
+            timeout=app.iniconfig.getfloat('genocrowd', 'apollo_timeout', fallback=30),
+            ready_timeout=app.iniconfig.getfloat('genocrowd', 'apollo_ready_timeout', fallback=10),
+            timings=app.metrics
+        )
+        app.apollo_directory = ApolloDirectory(app.apollo, ttl=app.iniconfig.getint('genocrowd', 'apollo_directory_ttl', fallback=300))
+
         configure_logging(app)
 
         if users.find_one() is None:
@@ -144,6 +184,25 @@ def create_app(config='config/genocrowd.ini', app_name='genocrowd', blueprints=N
             data = Data(app, None)
             data.initiate_groups()
 
+        GeneSelector(app, None).ensure_indexes()
+        GeneLease(app, None).ensure_indexes()
+        Levels(app, None).ensure_defaults()
+        GffStorage(app, None, "genes").ensure_indexes()
+        GffStorage(app, None, "answers").ensure_indexes()
+        Leaderboard(app, None).ensure_indexes()
+        Listing(app, None, 'genes').ensure_indexes()
+        Listing(app, None, 'answers').ensure_indexes()
+        Listing(app, None, 'batches').ensure_indexes()
+        GeneImporter(app, None).ensure_indexes()
+        GeneRegions(app, None).ensure_indexes()
+        app.session_interface.ensure_indexes()
+        LocalAuth(app, None).ensure_indexes()
+        RateLimiter(app, None).ensure_indexes()
+
+        app.cli.add_command(migrate_storage)
+        app.cli.add_command(train_gff_dictionary)
+        app.cli.add_command(compute_difficulty)
+
     if proxy_path:
         ReverseProxyPrefixFix(app)
     return app
@@ -158,38 +217,39 @@ def configure_logging(app):
     app.logger.setLevel(logging.INFO)
 
 
-# def create_celery(app):
-#     """Create the celery object
+def create_celery(app):
+    """Create the celery object
 
-#     Parameters
-#     ----------
-#     app : Flask
-#         Genocrowd Flask application
+    Parameters
+    ----------
+    app : Flask
+        Genocrowd Flask application
 
-#     Returns
-#     -------
-#     Celery
-#         Celery object
-#     """
-#     celery = Celery(app.import_name, backend=app.iniconfig.get(
-#         "celery", "result_backend"), broker=app.iniconfig.get("celery", "broker_url"))
-#     # celery.conf.update(app.config)
-#     task_base = celery.Task
+    Returns
+    -------
+    Celery
+        Celery object
+    """
+    celery = Celery(app.import_name, backend=app.iniconfig.get(
+        "celery", "result_backend"), broker=app.iniconfig.get("celery", "broker_url"))
+    # celery.conf.update(app.config)
+    celery.conf.task_always_eager = app.iniconfig.getboolean("celery", "always_eager", fallback=False)
+    task_base = celery.Task
 
-#     default_exchange = Exchange('default', type='direct')
+    default_exchange = Exchange('default', type='direct')
 
-#     celery.conf.task_queues = (
-#         Queue('default', default_exchange, routing_key='default'),
-#     )
-#     celery.conf.task_default_queue = 'default'
+    celery.conf.task_queues = (
+        Queue('default', default_exchange, routing_key='default'),
+    )
+    celery.conf.task_default_queue = 'default'
 
-#     class ContextTask(task_base):
-#         abstract = True
+    class ContextTask(task_base):
+        abstract = True
 
-#         def __call__(self, *args, **kwargs):
-#             with app.app_context():
-#                 return task_base.__call__(self, *args, **kwargs)
-#     celery.Task = ContextTask
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return task_base.__call__(self, *args, **kwargs)
+    celery.Task = ContextTask
 
-#     app.celery = celery
-#     return celery
+    app.celery = celery
+    return celery
@@ -0,0 +1,46 @@
+"""Genocrowd maintenance commands, run with: flask <command>"""
+
+import click
+
+from flask import current_app as ca
+from flask.cli import with_appcontext
+
+from genocrowd.libgenocrowd.Difficulty import Difficulty
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+
+
+@click.command('migrate-storage')
+@click.option('--batch-size', default=1000, help='Number of documents rewritten per batch')
+@with_appcontext
+def migrate_storage(batch_size):
+    """Rewrite the gene and answer GFF with the configured gff_storage and
+    gff_compression"""
+    for prefix in ('genes', 'answers'):
+        storage = GffStorage(ca, None, prefix)
+        storage.ensure_indexes()
+        migrated = storage.migrate(batch_size=batch_size, callback=lambda count: click.echo("{}: {} documents migrated...".format(prefix, count)))
+        click.echo("{}: {} documents migrated to {} storage ({} compression)".format(prefix, migrated, storage.backend, storage.compression))
+
+
+@click.command('train-gff-dictionary')
+@click.option('--samples', default=1000, help='Number of genes sampled')
+@with_appcontext
+def train_gff_dictionary(samples):
+    """Train a new dictionary for the configured gff_compression, from the
+    stored genes (run migrate-storage to recompress the existing GFF)"""
+    storage = GffStorage(ca, None, "genes")
+    storage.ensure_indexes()
+    dictionary_id = storage.train_dictionary(nb_samples=samples)
+    if dictionary_id is None:
+        click.echo("No dictionary trained: {} does not use one, or there is no gene".format(storage.compression))
+    else:
+        click.echo("Trained dictionary {}".format(dictionary_id))
+
+
+@click.command('compute-difficulty')
+@with_appcontext
+def compute_difficulty():
+    """Compute the difficulty and the level of all the genes, with the
+    configured difficulty_weights and difficulty_levels"""
+    result = Difficulty(ca, None).compute()
+    click.echo("{} genes scored in {} s, {} updated, genes per level: {}".format(result['genes'], result['elapsed'], result['updated'], result['levels']))
@@ -0,0 +1,225 @@
+"""Contain the ApolloClient class"""
+
+import json
+import types
+from time import perf_counter
+
+from apollo import ApolloInstance
+
+from genocrowd.libgenocrowd.Utils import Utils
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ApolloClient(object):
+    """App-scoped Apollo client
+
+    Wrap an ApolloInstance so that every call goes through one
+    requests.Session with a keep-alive connection pool, instead of opening a
+    new connection for each request. It exposes the same sub-clients
+    (annotations, organisms, users...) as ApolloInstance, and records the
+    latency of each Apollo method in a Metrics object.
+
+    Attributes
+    ----------
+    instance : ApolloInstance
+        The wrapped instance
+    ready_timeout : float
+        Maximum time to wait for Apollo to show loaded data, in seconds
+    timings : Metrics
+        Where latencies are recorded (apollo/<client>/<method>, and
+        apollo/wait_for_<what> for the readiness polls), may be None
+    session : requests.Session
+        Pooled HTTP session
+    timeout : float
+        Timeout of each request, in seconds
+    """
+
+    CLIENTS = ('annotations', 'cannedcomments', 'cannedkeys', 'cannedvalues', 'groups', 'io', 'metrics', 'organisms', 'status', 'users', 'remote')
+
+    def __init__(self, url, username, password, max_connections=10, timeout=30, ready_timeout=10, timings=None):
+        """init
+
+        Parameters
+        ----------
+        url : str
+            Apollo url
+        username : str
+            Apollo admin email
+        password : str
+            Apollo admin password
+        max_connections : int, optional
+            Size of the connection pool (requests block when all are busy)
+        timeout : float, optional
+            Timeout of each request, in seconds
+        ready_timeout : float, optional
+            Maximum time to wait for Apollo to show loaded data, in seconds
+        timings : Metrics, optional
+            Where latencies are recorded
+        """
+        self.instance = ApolloInstance(url, username, password)
+        self.timeout = timeout
+        self.ready_timeout = ready_timeout
+        self.timings = timings
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        for name in self.CLIENTS:
+            client = getattr(self.instance, name)
+            client.post = types.MethodType(self._make_post(), client)
+            client.get = types.MethodType(self._make_get(), client)
+
+    def __getattr__(self, name):
+        return getattr(self.instance, name)
+
+    @staticmethod
+    def feature_names(gff):
+        """Names Apollo gives to the top-level features of a GFF3 (their
+        Name, or their ID)
+
+        Parameters
+        ----------
+        gff : str
+            GFF3 content
+
+        Returns
+        -------
+        set
+            IDs and Names of the features without a Parent
+        """
+        names = set()
+        for line in gff.splitlines():
+            columns = line.split('\t')
+            if line.startswith('#') or len(columns) != 9:
+                continue
+            attributes = dict(attribute.strip().partition('=')[::2] for attribute in columns[8].split(';') if '=' in attribute)
+            if 'Parent' in attributes:
+                continue
+            names.update(attributes[key].strip() for key in ('ID', 'Name') if attributes.get(key))
+        return names
+
+    def wait_for_features(self, organism, sequence, names):
+        """Wait until Apollo shows a feature on a sequence, typically after
+        annotations.load_gff3
+
+        Parameters
+        ----------
+        organism : str
+            Organism common name
+        sequence : str
+            Sequence name
+        names : iterable
+            Names (or ids) of the loaded feature, see feature_names: other
+            features of the sequence do not count
+
+        Returns
+        -------
+        tuple
+            True if the feature is visible before ready_timeout, and the
+            time waited in seconds
+        """
+        names = set(names)
+
+        def check():
+            features = self.instance.annotations.get_features(organism=organism, sequence=sequence).get('features', [])
+            return any(feature.get('name') in names or feature.get('uniquename') in names for feature in features)
+
+        return self._wait("features", check)
+
+    def wait_for_organism(self, common_name):
+        """Wait until an organism is known by Apollo, typically after
+        organisms.add_organism
+
+        Parameters
+        ----------
+        common_name : str
+            Organism common name
+
+        Returns
+        -------
+        tuple
+            True if the organism exists before ready_timeout, and the time
+            waited in seconds
+        """
+        def check():
+            organism = self.instance.organisms.show_organism(common_name)
+            return isinstance(organism, dict) and 'id' in organism
+
+        return self._wait("organism", check)
+
+    def _wait(self, what, check):
+        """Poll Apollo until check returns True, and record the wait"""
+        ready, waited = Utils.wait_until(check, self.ready_timeout)
+        if self.timings is not None:
+            self.timings.observe("apollo/wait_for_{}".format(what), waited)
+        return bool(ready), waited
+
+    def _observe(self, path, start):
+        """Record the latency of an Apollo method"""
+        if self.timings is not None:
+            self.timings.observe("apollo{}".format(path), perf_counter() - start)
+
+    def _make_post(self):
+        """Build the post method of the sub-clients (same behaviour as
+        apollo.client.Client.post, with the pooled session)"""
+        apollo_client = self
+
+        def post(self, client_method, data, post_params=None, is_json=True, files=None, autoconvert_to_json=True):
+            url = self._wa.apollo_url + self.CLIENT_BASE + client_method
+
+            if isinstance(data, dict):
+                data.update({
+                    'username': self._wa.username,
+                    'password': self._wa.password,
+                })
+            elif isinstance(data, list):
+                data.append(('username', self._wa.username))
+                data.append(('password', self._wa.password))
+            else:
+                raise Exception("You must add credentials yourself")
+
+            headers = {}
+            if autoconvert_to_json:
+                headers['Content-Type'] = 'application/json'
+                data = json.dumps(data)
+
+            start = perf_counter()
+            try:
+                resp = apollo_client.session.post(url, data=data, headers=headers, params=post_params or {},
+                                                  allow_redirects=False, files=files, timeout=apollo_client.timeout)
+            finally:
+                apollo_client._observe(self.CLIENT_BASE + client_method, start)
+
+            if resp.status_code == 200 or resp.status_code == 302:
+                if is_json:
+                    return self._scrub_data(resp.json())
+                return resp.text
+            raise Exception("Unexpected response from apollo %s: %s" % (resp.status_code, resp.text))
+
+        return post
+
+    def _make_get(self):
+        """Build the get method of the sub-clients (same behaviour as
+        apollo.client.Client.get, with the pooled session)"""
+        apollo_client = self
+
+        def get(self, client_method, get_params, is_json=True):
+            url = self._wa.apollo_url + self.CLIENT_BASE + client_method
+
+            start = perf_counter()
+            try:
+                resp = apollo_client.session.get(url, params=get_params, timeout=apollo_client.timeout)
+            finally:
+                apollo_client._observe(self.CLIENT_BASE + client_method, start)
+
+            if resp.status_code == 200:
+                if is_json:
+                    return self._scrub_data(resp.json())
+                return resp.text
+            raise Exception("Unexpected response from apollo %s: %s" % (resp.status_code, resp.text))
+
+        return get
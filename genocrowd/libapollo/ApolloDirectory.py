@@ -0,0 +1,134 @@
+"""Contain the ApolloDirectory class"""
+
+import threading
+import time
+
+
+class ApolloDirectory(object):
+    """Per-process directory of the Apollo users and organisms
+
+    Users are indexed by email (their Apollo username) and organisms by
+    common name. A missing or expired entry is fetched alone (show_user,
+    show_organism), so that checking a user costs one small request at
+    most, whatever the number of users. refresh() loads the whole listings
+    once before a bulk provisioning: until it expires, a name absent from
+    them is known not to exist. Creations made by this process are recorded
+    (add_user, add_organism), deletions forgotten (forget_user,
+    forget_organism); those of other processes are seen when the entries
+    expire.
+
+    Attributes
+    ----------
+    apollo : ApolloClient
+        App-scoped Apollo client
+    ttl : float
+        Lifetime of the entries and of the listings, in seconds
+    """
+
+    def __init__(self, apollo, ttl=300):
+        """init
+
+        Parameters
+        ----------
+        apollo : ApolloClient
+            App-scoped Apollo client
+        ttl : float, optional
+            Lifetime of the entries and of the listings, in seconds
+        """
+        self.apollo = apollo
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = {'user': {}, 'organism': {}}
+        self.listed = {'user': 0, 'organism': 0}
+
+    def refresh(self):
+        """Load all the users and organisms (two requests)"""
+        users = self.apollo.users.get_users()
+        organisms = self.apollo.organisms.get_organisms()
+        if not isinstance(organisms, list):
+            # {'error': 'Not authorized for any organisms'} when there is none
+            organisms = []
+        expires = time.monotonic() + self.ttl
+        with self.lock:
+            self.entries['user'] = {user['username']: (expires, user) for user in users if isinstance(user, dict) and 'username' in user}
+            self.entries['organism'] = {organism['commonName']: (expires, organism) for organism in organisms if isinstance(organism, dict) and 'commonName' in organism}
+            self.listed = {'user': expires, 'organism': expires}
+
+    def _get(self, kind, name, fetch):
+        """Get an entry, fetching it if it is missing or expired"""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.entries[kind].get(name)
+            if cached and cached[0] > now:
+                return cached[1]
+            if not cached and self.listed[kind] > now:
+                return None
+        value = fetch()
+        with self.lock:
+            if value is None:
+                self.entries[kind].pop(name, None)
+            else:
+                self.entries[kind][name] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def _set(self, kind, name, value):
+        with self.lock:
+            self.entries[kind][name] = (time.monotonic() + self.ttl, value)
+
+    def _forget(self, kind, name):
+        with self.lock:
+            self.entries[kind].pop(name, None)
+            # The listing does not tell anymore whether it exists
+            self.listed[kind] = 0
+
+    def user(self, email):
+        """Get an Apollo user
+
+        Parameters
+        ----------
+        email : str
+            Email of the user
+
+        Returns
+        -------
+        dict
+            The user, None if it does not exist
+        """
+        def fetch():
+            user = self.apollo.users.show_user(email)
+            return user if isinstance(user, dict) and user.get('username') == email else None
+        return self._get('user', email, fetch)
+
+    def organism(self, common_name):
+        """Get an Apollo organism
+
+        Parameters
+        ----------
+        common_name : str
+            Common name of the organism
+
+        Returns
+        -------
+        dict
+            The organism, None if it does not exist
+        """
+        def fetch():
+            organism = self.apollo.organisms.show_organism(common_name)
+            return organism if isinstance(organism, dict) and organism.get('commonName') == common_name else None
+        return self._get('organism', common_name, fetch)
+
+    def add_user(self, email, user=None):
+        """Record a user created in Apollo"""
+        self._set('user', email, user or {'username': email})
+
+    def add_organism(self, common_name, organism=None):
+        """Record an organism created in Apollo"""
+        self._set('organism', common_name, organism or {'commonName': common_name})
+
+    def forget_user(self, email):
+        """Forget a user deleted from Apollo"""
+        self._forget('user', email)
+
+    def forget_organism(self, common_name):
+        """Forget an organism deleted from Apollo"""
+        self._forget('organism', common_name)
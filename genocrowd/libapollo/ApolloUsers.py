@@ -1,7 +1,3 @@
-import time
-
-from apollo import ApolloInstance
-
 from flask import current_app as ca
 
 
@@ -9,24 +5,22 @@ class ApolloUsers(object):
     """Allows the management of the Apollo users"""
 
     def __init__(self):
-        self.wa = ApolloInstance(ca.apollo_url, ca.apollo_admin_email, ca.apollo_admin_password)
+        self.wa = ca.apollo
+        self.directory = ca.apollo_directory
 
     def add_user(self, username, email, password, role="user"):
         """ Add a user to Apollo and creates a copy of the studied genome for him
 
+        The user and its organism are looked up in the Apollo directory of
+        the app (one request at most each), not in the whole listings.
+
         Returns
         -------
 
         json
             user: dict
         """
-        users = self.wa.users.get_users()
-        user = {}
-        for u in users:
-            if u['username'] == email:
-                user = u
-
-        if len(user) == 1:
+        if self.directory.user(email):
             # Update name, regen password if the user ran it again
             ca.logger.info("Updating existing Apollo user %s" % username)
             returnData = self.wa.users.update_user(
@@ -35,23 +29,23 @@ class ApolloUsers(object):
             ca.logger.info("Creating new Apollo user %s" % username)
             returnData = self.wa.users.create_user(
                 email, username, username, password, role=role)
+            self.directory.add_user(email)
 
         org_id = "{}_{}".format(ca.apollo_org_id, email)
 
-        orgs = self.wa.organisms.get_organisms()
-        ca.logger.info("Got this org list from apollo: %s" % orgs)
-        no_orgs = 'error' in orgs and orgs['error'] == 'Not authorized for any organisms'
-        if not no_orgs:
-            orgs_ids = [org['id'] for org in orgs]
-        if no_orgs or org_id not in orgs_ids:
+        if not self.directory.organism(org_id):
             ca.logger.info("Creating new Apollo organism: %s" % org_id)
-            self.wa.organisms.add_organism(
+            organism = self.wa.organisms.add_organism(
                 org_id,
                 ca.apollo_dataset_path,
                 genus='Acyrthosiphon',
                 species='pisum',
-                public=False)
-            time.sleep(2)
+                public=False,
+                suppress_output=True)
+            ready, waited = self.wa.wait_for_organism(org_id)
+            if not ready:
+                ca.logger.warning("Apollo organism %s still not visible after %.1fs" % (org_id, waited))
+            self.directory.add_organism(org_id, organism if isinstance(organism, dict) and organism.get('commonName') == org_id else None)
             self.wa.users.update_organism_permissions(
                 email,
                 org_id,
@@ -60,3 +54,33 @@ class ApolloUsers(object):
                 read=True,
             )
         return returnData
+
+    def delete_user(self, email):
+        """ Delete a user and its copy of the studied genome from Apollo
+
+        The user and its organism are forgotten by the Apollo directory of
+        the app, even if Apollo fails to delete them (they are looked up
+        again the next time they are needed).
+
+        Returns
+        -------
+
+        bool
+            True if both were deleted (or did not exist)
+        """
+        org_id = "{}_{}".format(ca.apollo_org_id, email)
+        try:
+            organism = self.directory.organism(org_id)
+            if organism:
+                ca.logger.info("Deleting Apollo organism: %s" % org_id)
+                self.wa.organisms.delete_organism(organism.get('id', org_id), suppress_output=True)
+            if self.directory.user(email):
+                ca.logger.info("Deleting Apollo user %s" % email)
+                self.wa.users.delete_user(email)
+        except Exception as e:
+            ca.logger.warning("Could not delete the Apollo user %s: %s" % (email, e))
+            return False
+        finally:
+            self.directory.forget_organism(org_id)
+            self.directory.forget_user(email)
+        return True
@@ -0,0 +1,100 @@
+"""Contain the TTLCache class"""
+
+import threading
+import time
+
+
+class TTLCache(object):
+    """In-process cache of computed values, expiring after ttl seconds
+
+    When a value is missing, only one thread computes it (single-flight):
+    the other threads asking for the same key wait for its result instead
+    of running the same query. The cache is per process: with several
+    workers, invalidate only clears the values of the current one, the
+    others see the change when their values expire.
+
+    Attributes
+    ----------
+    ttl : float
+        Lifetime of the values, in seconds
+    """
+
+    def __init__(self, ttl, max_size=10000):
+        """init
+
+        Parameters
+        ----------
+        ttl : float
+            Lifetime of the values, in seconds (0 disables the cache)
+        max_size : int, optional
+            Maximum number of values, the cache is cleared when reached
+        """
+        self.ttl = ttl
+        self.max_size = max_size
+        self.values = {}
+        self.lock = threading.Lock()
+        self.loading = {}
+        self.generation = 0
+
+    def get(self, key, loader):
+        """Get a value, computing it if it is missing or expired
+
+        Parameters
+        ----------
+        key : hashable
+            Cache key
+        loader : function
+            Called without argument to compute the value
+
+        Returns
+        -------
+        The value
+        """
+        if self.ttl <= 0:
+            return loader()
+        with self.lock:
+            cached = self.values.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+            event = self.loading.get(key)
+            leader = event is None
+            if leader:
+                event = self.loading[key] = threading.Event()
+            generation = self.generation
+
+        if not leader:
+            event.wait()
+            with self.lock:
+                cached = self.values.get(key)
+            if cached:
+                return cached[1]
+            return loader()
+
+        try:
+            value = loader()
+            with self.lock:
+                # Do not cache a value computed before an invalidation
+                if generation == self.generation:
+                    if len(self.values) >= self.max_size:
+                        self.values = {}
+                    self.values[key] = (time.monotonic() + self.ttl, value)
+            return value
+        finally:
+            with self.lock:
+                del self.loading[key]
+            event.set()
+
+    def invalidate(self, key=None):
+        """Forget a value, or all of them
+
+        Parameters
+        ----------
+        key : hashable, optional
+            Cache key, all the values are forgotten if None
+        """
+        with self.lock:
+            self.generation += 1
+            if key is None:
+                self.values = {}
+            else:
+                self.values.pop(key, None)
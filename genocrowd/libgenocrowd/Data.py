@@ -1,10 +1,12 @@
-from flask import current_app as ca
+import time
+from datetime import datetime
 
-from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Leaderboard import Leaderboard
+from genocrowd.libgenocrowd.Levels import Levels
+from genocrowd.libgenocrowd.Listing import Listing
 from genocrowd.libgenocrowd.Params import Params
 
-import gridfs
-
 from pymongo import ReturnDocument
 
 
@@ -27,23 +29,17 @@ class Data(Params):
         self.groups = self.app.mongo.db["groups"]
 
     def get_user_level(self, username):
-        user = self.users.find_one({"username": username})
+        user = self.users.find_one({"username": username}, projection={'level': 1})
         return user["level"]
 
-    def get_all_positions(self):
-        return list(self.genes.find({}))
-
-    def get_all_answers(self):
-        return list(self.answers.find({}))
-
     def get_not_validated(self):
-        return list(self.answers.find({'isValidated': False}))
+        return list(self.answers.find({'isValidated': False}, projection=GffStorage.EXCLUDE))
 
     def count_all_genes(self):
         return self.genes.count_documents({})
 
     def get_current_annotation(self, username):
-        user = self.users.find_one({"username": username})
+        user = self.users.find_one({"username": username}, projection={'current_annotation': 1})
         return user["current_annotation"]
 
     def update_current_annotation(self, username, data):
@@ -71,12 +67,15 @@ class Data(Params):
             The concerned gene id
         new_status : boolean
         """
-        update_gene = self.genes.find_one_and_update({
+        previous = self.genes.find_one_and_update({
             '_id': gene}, {
                 '$set': {
                     'isAnnotable': new_status
-                }}, return_document=ReturnDocument.AFTER)
-        return update_gene['isAnnotable']
+                }}, projection={'isAnnotable': 1, 'available': 1, 'level': 1})
+        slots = previous.get('available', 0)
+        if (previous.get('isAnnotable') is True) != (new_status is True):
+            Levels(self.app, self.session).count(previous.get('level', 0), available=slots if new_status is True else -slots)
+        return new_status
 
     def set_validated(self, gene, new_status):
         """
@@ -90,12 +89,106 @@ class Data(Params):
         return updated_answer
 
     def store_answers_from_user(self, username, data):
-        db = ca.mongo.db
-        fs = gridfs.GridFS(db, collection="answers")
+        """Store the annotation of the current gene of a user
+
+        As several users can annotate the same gene, the answer id is made
+        of the gene id and the username.
+
+        Parameters
+        ----------
+        username : string
+            The annotator
+        data : string
+            The annotation, in GFF3
+        """
         gene = self.get_current_annotation(username)
-        fs.put(data.encode(), _id=gene["_id"], chromosome=gene["chromosome"], start=gene["start"], end=gene["end"], strand=gene["strand"], isAnnotable=True, isValidated=False)
+        GffStorage(self.app, self.session, "answers").put({
+            '_id': "{}_{}".format(gene["_id"], username),
+            'uploadDate': datetime.utcnow(),
+            'gene': gene["_id"],
+            'username': username,
+            'chromosome': gene["chromosome"],
+            'start': gene["start"],
+            'end': gene["end"],
+            'strand': gene["strand"],
+            'isAnnotable': True,
+            'isValidated': False
+        }, data)
+        Leaderboard(self.app, self.session).record_answer(username)
         gene = self.update_current_annotation(username, None)
 
+    def count_genes(self, filters):
+        """Count the genes matching filters
+
+        Parameters
+        ----------
+        filters : dict
+            Filters of the gene listing (chromosome, upload, priority...)
+
+        Returns
+        -------
+        int
+            Number of genes
+
+        Raises
+        ------
+        ValueError
+            When a filter is invalid
+        """
+        query, sort = Listing(self.app, self.session, 'genes').parse(filters)
+        return self.genes.count_documents(query)
+
+    def remove_genes(self, filters, batch_size=10000):
+        """Remove the genes matching filters, with their GFF, using
+        delete_many, then the leases on them and the annotations of the
+        users pointing at them
+
+        Parameters
+        ----------
+        filters : dict
+            Filters of the gene listing (chromosome, upload, priority...),
+            every gene is removed when empty
+        batch_size : int, optional
+            Number of gene ids per leases and users update
+
+        Returns
+        -------
+        dict
+            removed (number of genes), chunks (number of GFF chunks),
+            leases (number of deleted leases) and elapsed (in seconds)
+
+        Raises
+        ------
+        ValueError
+            When a filter is invalid
+        """
+        query, sort = Listing(self.app, self.session, 'genes').parse(filters)
+        leases = self.app.mongo.db["leases"]
+        start = time.perf_counter()
+        gene_ids = [gene['_id'] for gene in self.genes.find(query, projection={'_id': 1})] if query else None
+        removed, chunks = GffStorage(self.app, self.session, "genes").delete_many(query)
+
+        if gene_ids is None:
+            deleted_leases = leases.delete_many({}).deleted_count
+            self.users.update_many({'current_annotation': {'$ne': None}}, {'$set': {'current_annotation': None}})
+            self.users.update_many({'next_annotation': {'$ne': None}}, {'$set': {'next_annotation': None}})
+            # The difficulty model of the removed genes does not apply to the next ones
+            self.app.mongo.db["difficulty"].delete_many({})
+        else:
+            deleted_leases = 0
+            for index in range(0, len(gene_ids), batch_size):
+                batch = gene_ids[index:index + batch_size]
+                deleted_leases += leases.delete_many({'gene': {'$in': batch}}).deleted_count
+                self.users.update_many({'current_annotation._id': {'$in': batch}}, {'$set': {'current_annotation': None}})
+                self.users.update_many({'next_annotation._id': {'$in': batch}}, {'$set': {'next_annotation': None}})
+        Levels(self.app, self.session).recount()
+        return {
+            'removed': removed,
+            'chunks': chunks,
+            'leases': deleted_leases,
+            'elapsed': round(time.perf_counter() - start, 3)
+        }
+
     def get_number_of_answers(self):
         """get the number of annotations in the database
 
@@ -193,52 +286,29 @@ class Data(Params):
             'name': name
         }
 
-    def get_top_annotation(self):
-        """Get top annotator and top group
+    def get_top_annotation(self, username=None, number=3):
+        """Get top annotators and top groups
+
+        Parameters
+        ----------
+        username : str, optional
+            User whose rank is also returned
+        number : int, optional
+            Number of users and groups
 
         Returns
         -------
             dict
-                list of top 3 users and groups, error and error message
-
+                list of top users and groups, rank of the user, error and
+                error message
         """
-        error = False
-        error_message = []
-        top_users = []
-        top_groups = []
-        nb = self.get_number_of_groups()
-        liste_temp = [0] * nb
-        userList = LocalAuth.get_all_users(self)
-
-        for element in userList:
-            """We don't want Admin in the ranking"""
-            if element['group'] is not None:
-                dico = {}
-                dico["username"] = element['username']
-                dico["score"] = element['total_annotation']
-                top_users.append(dico)
-
-                """sums the annotations for each group"""
-                index = element['group'] - 1
-                liste_temp[index] = liste_temp[index] + element['total_annotation']
-
-        """get the group name"""
-        groups_names = self.get_groups_names()
-        for i, element in enumerate(liste_temp):
-            dico = {}
-
-            dico["name"] = groups_names['groups_names'][i]
-            dico["score"] = element
-            top_groups.append(dico)
-
-        top_groups = sorted(top_groups, key=lambda k: k['score'], reverse=True)
-        top_users = sorted(top_users, key=lambda k: k['score'], reverse=True)
-
+        leaderboard = Leaderboard(self.app, self.session)
         return {
-            'top_users': top_users[:3],
-            'top_groups': top_groups[:3],
-            'error': error,
-            'errorMessage': error_message
+            'top_users': leaderboard.top_users(number),
+            'top_groups': leaderboard.top_groups(number),
+            'me': leaderboard.get_rank(username) if username else None,
+            'error': False,
+            'errorMessage': []
         }
 
     def get_groups_names(self):
@@ -262,32 +332,35 @@ class Data(Params):
             'errorMessage': error_message
         }
 
-    def find_genes_level(self, geneList, value):
-        """Select genes according to a difficulty level
+    def get_level(self):
+        """Get the difficulty levels with their gene counters
 
         Returns
         -------
         list
             dict
-                chromosome, start, end, strand, isAnnotable, difficulty, priority, tags
+                _id, name, min (minimum difficulty), genes, available,
+                leased and done
         """
-        good_difficulty = []
-        for element in geneList:
-            if element['difficulty'] == value:
-                good_difficulty.append(element)
-        return good_difficulty
+        return Levels(self.app, self.session).get_levels()
+
+    def save_level(self, data):
+        """Replace the difficulty levels and move the genes to their new
+        level
 
-    def select_genes(self, i, geneList):
-        """Select the list of genes whose difficulty matches the user's level
+        Parameters
+        ----------
+        data : dict
+            levels: list of the levels (name and min)
 
         Returns
         -------
-            list
-                dict
-                    chromosome, start, end, strand, isAnnotable, difficulty, priority, tags
+        list
+            The new levels, with their counters
+
+        Raises
+        ------
+        ValueError
+            When the levels are invalid
         """
-        switcher = {
-            0: self.find_genes_level(geneList, 2513)
-            # TODO complete switcher
-        }
-        return switcher.get(i, "Invalid level number")
+        return Levels(self.app, self.session).save_levels(data.get('levels', []))
@@ -0,0 +1,319 @@
+"""Contain the Difficulty class"""
+
+import collections
+import time
+
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.GffStream import gene_features
+from genocrowd.libgenocrowd.Levels import Levels
+from genocrowd.libgenocrowd.Params import Params
+
+import numpy
+
+from pymongo import UpdateOne
+
+
+class Difficulty(Params):
+    """Score the difficulty of the genes and bucket them in levels
+
+    Each gene stores the features of its structure (gene_features, computed
+    by GffStream at import). The engine loads them for all the genes as
+    NumPy columns, adds the ones depending on the neighbours, and scores
+    each gene with a weighted sum of the standardised FEATURES
+    (difficulty_weights). The
+    difficulty of a gene is its percentile (0 to 10000), and its level the
+    last one whose minimum difficulty it reaches (see Levels), stored in the
+    indexed difficulty and level fields.
+
+    New features are added to FEATURES: a function of the columns (dict of
+    arrays: start, end, strand, chromosome code, overlaps and the
+    gene_features) returning one value per gene.
+
+    compute() also saves the scoring model (mean and deviation of each
+    feature, and the quantiles of the scores). The genes of an upload are
+    then scored alone against it (score_genes), their overlaps counted
+    against the genes of their chromosomes only.
+
+    Attributes
+    ----------
+    thresholds : list
+        Minimum difficulty of each level
+    weights : dict
+        Weight of each feature in the score
+    """
+
+    COLUMNS = ('length', 'isoforms', 'exons', 'intron_mean', 'intron_max')
+    DEFAULT_WEIGHTS = 'exons:1, isoforms:1, introns:1, length:1, overlaps:1'
+    # Number of intervals between the quantiles of the scores in the model
+    QUANTILES = 1000
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.genes = self.app.mongo.db["genes.files"]
+        self.models = self.app.mongo.db["difficulty"]
+        self.thresholds = Levels(self.app, self.session).thresholds()
+        self.weights = {}
+        for weight in self.settings.get('genocrowd', 'difficulty_weights', fallback=self.DEFAULT_WEIGHTS).split(','):
+            name, sep, value = weight.partition(':')
+            if name.strip() not in FEATURES:
+                raise Exception("Unknown difficulty feature: {} (one of {})".format(name.strip(), ", ".join(FEATURES)))
+            self.weights[name.strip()] = float(value or 1)
+
+    @staticmethod
+    def overlaps(columns):
+        """Number of other genes overlapping each gene, on any strand"""
+        # Positions of all the chromosomes on a single axis
+        offset = columns['chromosome'].astype(numpy.int64) << 40
+        starts = offset + columns['start']
+        ends = offset + columns['end']
+        sorted_starts = numpy.sort(starts)
+        sorted_ends = numpy.sort(ends)
+        # Genes starting before the end, minus the ones ending before the start
+        return numpy.searchsorted(sorted_starts, ends, 'left') - numpy.searchsorted(sorted_ends, starts, 'right') - 1
+
+    def load(self, query=None, batch_size=10000):
+        """Load the positions and features of genes, computing the features
+        of the genes imported without them
+
+        Parameters
+        ----------
+        query : dict, optional
+            Genes to load, all of them by default
+        batch_size : int, optional
+            Cursor batch size
+
+        Returns
+        -------
+        tuple
+            Gene ids, dict of columns and current (difficulty, level) of
+            each gene
+        """
+        ids = []
+        rows = []
+        current = []
+        chromosomes = {}
+        missing = []
+        storage = GffStorage(self.app, self.session, "genes")
+        projection = {'chromosome': 1, 'start': 1, 'end': 1, 'strand': 1, 'features': 1, 'difficulty': 1, 'level': 1}
+        for gene in self.genes.find(query or {}, projection=projection, batch_size=batch_size):
+            features = gene.get('features')
+            if features is None:
+                features = gene_features(storage.get(gene['_id']) or "")
+                missing.append(UpdateOne({'_id': gene['_id']}, {'$set': {'features': features}}))
+            ids.append(gene['_id'])
+            current.append((gene.get('difficulty'), gene.get('level')))
+            position = [chromosomes.setdefault(gene.get('chromosome'), len(chromosomes)), gene.get('start', 0), gene.get('end', 0), gene.get('strand') or 0]
+            rows.append(position + [features.get(column, 0) for column in self.COLUMNS])
+        if missing:
+            self.genes.bulk_write(missing, ordered=False)
+
+        table = numpy.array(rows, dtype=numpy.int64).reshape(len(rows), 4 + len(self.COLUMNS))
+        columns = {name: table[:, index] for index, name in enumerate(('chromosome', 'start', 'end', 'strand') + self.COLUMNS)}
+        return ids, columns, current
+
+    def standardise(self, columns, statistics=None):
+        """Weighted sum of the standardised features of each gene
+
+        Parameters
+        ----------
+        columns : dict
+            Arrays of the positions and features
+        statistics : dict, optional
+            Mean and deviation of each feature, those of the columns by
+            default
+
+        Returns
+        -------
+        tuple
+            Score array and the statistics used
+        """
+        score = numpy.zeros(len(columns['start']))
+        used = {}
+        for name, weight in self.weights.items():
+            values = FEATURES[name](self, columns).astype(numpy.float64)
+            mean, deviation = statistics[name] if statistics else (float(values.mean()), float(values.std()))
+            used[name] = [mean, deviation]
+            if weight and deviation > 0:
+                score += weight * (values - mean) / deviation
+        return score, used
+
+    def score(self, columns):
+        """Compute the difficulty and the level of each gene
+
+        Parameters
+        ----------
+        columns : dict
+            Arrays of the positions and features
+
+        Returns
+        -------
+        tuple
+            difficulty (0 to 10000) and level arrays, and the scoring model
+            (statistics of the features and quantiles of the scores)
+        """
+        size = len(columns['start'])
+        if not size:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), None
+        score, statistics = self.standardise(columns)
+        # Percentile of each gene, ties get the same one
+        sorted_score = numpy.sort(score)
+        ranks = numpy.searchsorted(sorted_score, score, 'left')
+        difficulty = ranks * 10000 // max(1, size - 1)
+        level = numpy.maximum(numpy.searchsorted(self.thresholds, difficulty, 'right') - 1, 0)
+        quantiles = sorted_score[numpy.linspace(0, size - 1, self.QUANTILES + 1).round().astype(numpy.int64)]
+        model = {'weights': self.weights, 'statistics': statistics, 'quantiles': quantiles.tolist(), 'genes': size}
+        return difficulty, level, model
+
+    def save(self, ids, current, difficulty, level, batch_size=1000):
+        """Save the difficulties and levels that changed
+
+        Returns
+        -------
+        int
+            Number of updated genes
+        """
+        requests = []
+        updated = 0
+        for gene_id, previous, gene_difficulty, gene_level in zip(ids, current, difficulty.tolist(), level.tolist()):
+            if previous == (gene_difficulty, gene_level):
+                continue
+            requests.append(UpdateOne({'_id': gene_id}, {'$set': {'difficulty': gene_difficulty, 'level': gene_level}}))
+            if len(requests) >= batch_size:
+                updated += self.genes.bulk_write(requests, ordered=False).modified_count
+                requests = []
+        if requests:
+            updated += self.genes.bulk_write(requests, ordered=False).modified_count
+        return updated
+
+    def compute(self, batch_size=1000):
+        """Score all the genes, save the difficulties and levels that
+        changed and the scoring model, and recount the genes of each level
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of genes updated per bulk_write
+
+        Returns
+        -------
+        dict
+            genes (number of scored genes), updated, levels (number of genes
+            per level) and elapsed (in seconds)
+        """
+        start = time.perf_counter()
+        ids, columns, current = self.load()
+        columns['overlaps'] = self.overlaps(columns)
+        difficulty, level, model = self.score(columns)
+        updated = self.save(ids, current, difficulty, level, batch_size)
+        if model:
+            self.models.replace_one({'_id': 'model'}, model, upsert=True)
+        Levels(self.app, self.session).recount()
+
+        return {
+            'genes': len(ids),
+            'updated': updated,
+            'levels': numpy.bincount(level, minlength=len(self.thresholds)).tolist(),
+            'elapsed': round(time.perf_counter() - start, 3)
+        }
+
+    def neighbour_overlaps(self, ids, batch_size=10000):
+        """Number of other genes overlapping some genes, on any strand
+
+        The positions of all the genes of their chromosomes are loaded with
+        one query, and counted with overlaps.
+
+        Parameters
+        ----------
+        ids : list
+            Gene ids
+        batch_size : int, optional
+            Cursor batch size
+
+        Returns
+        -------
+        array
+            Overlaps of each gene (0 for the genes without a position)
+        """
+        rows = {gene_id: None for gene_id in ids}
+        positions = []
+        chromosomes = {}
+        query = {
+            'chromosome': {'$in': self.genes.distinct('chromosome', {'_id': {'$in': ids}})},
+            'start': {'$exists': True},
+            'end': {'$exists': True}
+        }
+        for gene in self.genes.find(query, projection={'chromosome': 1, 'start': 1, 'end': 1}, batch_size=batch_size):
+            if gene['_id'] in rows:
+                rows[gene['_id']] = len(positions)
+            positions.append((chromosomes.setdefault(gene.get('chromosome'), len(chromosomes)), gene['start'], gene['end']))
+        table = numpy.array(positions, dtype=numpy.int64).reshape(len(positions), 3)
+        overlaps = self.overlaps({'chromosome': table[:, 0], 'start': table[:, 1], 'end': table[:, 2]})
+        return numpy.array([0 if rows[gene_id] is None else overlaps[rows[gene_id]] for gene_id in ids], dtype=numpy.int64)
+
+    def score_genes(self, query, batch_size=1000):
+        """Score some genes (the genes of an upload) against the model saved
+        by the last compute, and the stored level thresholds
+
+        The overlaps are counted against the genes of the same chromosomes
+        (neighbour_overlaps), and the scores written with one bulk_write.
+        The other genes keep their difficulty, even the neighbours of the
+        scored genes: compute() scores them all again. All the genes are
+        scored by compute() instead when there is no model yet, when it was
+        computed with other weights, or from fewer genes than the ones to
+        score.
+
+        Parameters
+        ----------
+        query : dict
+            Genes to score
+        batch_size : int, optional
+            Number of genes updated per bulk_write by compute
+
+        Returns
+        -------
+        dict
+            genes (number of scored genes), updated, levels (number of genes
+            per level) and elapsed (in seconds)
+        """
+        start = time.perf_counter()
+        model = self.models.find_one({'_id': 'model'})
+        if not model or model.get('weights') != self.weights or self.genes.count_documents(query) > model['genes']:
+            return self.compute(batch_size)
+
+        ids, columns, current = self.load(query)
+        columns['overlaps'] = self.neighbour_overlaps(ids)
+
+        score = self.standardise(columns, model['statistics'])[0]
+        quantiles = numpy.array(model['quantiles'])
+        difficulty = numpy.minimum(numpy.searchsorted(quantiles, score, 'left') * 10000 // max(1, len(quantiles) - 1), 10000)
+        level = numpy.maximum(numpy.searchsorted(self.thresholds, difficulty, 'right') - 1, 0).astype(numpy.int64)
+        updated = self.save(ids, current, difficulty, level, batch_size=max(1, len(ids)))
+        counts = Levels(self.app, self.session).recount()
+
+        return {
+            'genes': len(ids),
+            'updated': updated,
+            'levels': [counts.get(number, {}).get('genes', 0) for number in range(len(self.thresholds))],
+            'elapsed': round(time.perf_counter() - start, 3)
+        }
+
+
+# Features of the difficulty score, by name (see difficulty_weights)
+FEATURES = collections.OrderedDict((
+    ('exons', lambda engine, columns: columns['exons']),
+    ('isoforms', lambda engine, columns: columns['isoforms']),
+    ('introns', lambda engine, columns: numpy.log1p(columns['intron_mean'])),
+    ('intron_max', lambda engine, columns: numpy.log1p(columns['intron_max'])),
+    ('length', lambda engine, columns: numpy.log1p(columns['length'])),
+    ('overlaps', lambda engine, columns: columns['overlaps']),
+    ('minus_strand', lambda engine, columns: columns['strand'] == -1),
+))
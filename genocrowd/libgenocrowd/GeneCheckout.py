@@ -0,0 +1,232 @@
+"""Contain the GeneCheckout class"""
+
+from io import StringIO
+from time import perf_counter
+
+from genocrowd.libgenocrowd.Data import Data
+from genocrowd.libgenocrowd.GeneLease import GeneLease
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ReturnDocument
+
+
+class GeneCheckout(Params):
+    """Give genes to annotators and load them in their Apollo organism
+
+    With prefetch enabled, the next gene of a user is leased as soon as they
+    save an answer, and kept in the user next_annotation field with its GFF.
+    The prefetch mode is set per deployment:
+
+    - none: the gene is chosen and loaded when the user asks for it
+    - reserve: the next gene is leased and its GFF is read in advance
+    - load: the next gene is also loaded in Apollo by a background job
+
+    The state of next_annotation (reserved, loading or loaded) tells the
+    checkout if the gene still has to be loaded in Apollo. Each checkout
+    duration is recorded in the checkout/<source> metric, source being
+    current, prefetch or cold.
+
+    Attributes
+    ----------
+    mode : str
+        Prefetch mode, one of MODES
+    """
+
+    MODES = ('none', 'reserve', 'load')
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.users = self.app.mongo.db["users"]
+        self.mode = self.settings.get('genocrowd', 'prefetch', fallback='none')
+        if self.mode not in self.MODES:
+            self.log.warning("Unknown prefetch mode {}, prefetch disabled".format(self.mode))
+            self.mode = 'none'
+
+    def organism(self, email):
+        """Get the Apollo organism of a user"""
+        return "%s_%s" % (self.app.apollo_org_id, email)
+
+    def url(self, email, gene):
+        """Get the Apollo url centered on a gene"""
+        return "%s/annotator/loadLink?loc=%s:%s..%s&organism=%s" % (self.app.apollo_url_ext, gene["chromosome"], gene["start"], gene["end"], self.organism(email))
+
+    def checkout(self, user):
+        """Get the gene a user is annotating, or give them a new one
+
+        Parameters
+        ----------
+        user : dict
+            The annotator (username and email)
+
+        Returns
+        -------
+        tuple
+            The gene (None if no gene is available), and the time waited for
+            Apollo to show it, in seconds
+        """
+        start = perf_counter()
+        data = Data(self.app, self.session)
+        lease = GeneLease(self.app, self.session)
+        waited = 0
+
+        gene = data.get_current_annotation(user['username'])
+        source = 'current'
+        if gene:
+            lease.renew(gene['_id'], user['username'])
+        else:
+            gene, waited = self.checkout_next(user)
+            source = 'prefetch'
+            if not gene:
+                gene = lease.claim(user['username'], data.get_user_level(user['username']))
+                if not gene:
+                    return None, 0
+                waited = self.load(user['email'], gene, clear=self.mode == 'load')
+                source = 'cold'
+            self.log.info("Selected gene: {}".format(gene['_id']))
+            data.update_current_annotation(user['username'], gene)
+
+        self.app.metrics.observe("checkout/{}".format(source), perf_counter() - start)
+        return gene, waited
+
+    def checkout_next(self, user):
+        """Take the prefetched gene of a user, and load it in Apollo if the
+        background job did not
+
+        Parameters
+        ----------
+        user : dict
+            The annotator (username and email)
+
+        Returns
+        -------
+        tuple
+            The gene (None if nothing was prefetched or if its lease
+            expired), and the time waited for Apollo, in seconds
+        """
+        found = self.users.find_one_and_update(
+            {'username': user['username'], 'next_annotation': {'$ne': None}},
+            {'$set': {'next_annotation': None}},
+            projection={'next_annotation': 1})
+        if not found:
+            return None, 0
+        next_annotation = found['next_annotation']
+        gene = next_annotation['gene']
+        if not GeneLease(self.app, self.session).renew(gene['_id'], user['username']):
+            return None, 0
+
+        if next_annotation['state'] == 'loaded':
+            return gene, 0
+        if next_annotation['state'] == 'loading':
+            names = self.app.apollo.feature_names(next_annotation['gff'] or '') or [gene['_id']]
+            ready, waited = self.app.apollo.wait_for_features(self.organism(user['email']), gene['chromosome'], names)
+            return gene, waited
+        return gene, self.load(user['email'], gene, next_annotation['gff'])
+
+    def prefetch(self, user):
+        """Lease the next gene of a user, and stage its GFF
+
+        Parameters
+        ----------
+        user : dict
+            The annotator (username and email)
+
+        Returns
+        -------
+        dict
+            The next gene, None if prefetch is disabled, if the user already
+            has a next gene or if no gene is available
+        """
+        if self.mode == 'none':
+            return None
+        if self.users.count_documents({'username': user['username'], 'next_annotation': {'$ne': None}}):
+            return None
+
+        lease = GeneLease(self.app, self.session)
+        gene = lease.claim(user['username'], Data(self.app, self.session).get_user_level(user['username']))
+        if not gene:
+            return None
+        next_annotation = {
+            '_id': gene['_id'],
+            'gene': gene,
+            'gff': self.read_gff(gene['_id']),
+            'state': 'reserved'
+        }
+        result = self.users.update_one({'username': user['username'], 'next_annotation': None}, {'$set': {'next_annotation': next_annotation}})
+        if not result.modified_count:
+            lease.release(gene['_id'], user['username'])
+            return None
+        return gene
+
+    def load_next(self, user):
+        """Load the prefetched gene of a user in Apollo (run by a background
+        job in load mode)
+
+        Parameters
+        ----------
+        user : dict
+            The annotator (username and email)
+
+        Returns
+        -------
+        bool
+            False if the gene was already taken by a checkout
+        """
+        found = self.users.find_one_and_update(
+            {'username': user['username'], 'next_annotation.state': 'reserved'},
+            {'$set': {'next_annotation.state': 'loading'}},
+            projection={'next_annotation': 1},
+            return_document=ReturnDocument.AFTER)
+        if not found:
+            return False
+        next_annotation = found['next_annotation']
+        self.load(user['email'], next_annotation['gene'], next_annotation['gff'])
+        self.users.update_one(
+            {'username': user['username'], 'next_annotation._id': next_annotation['_id']},
+            {'$set': {'next_annotation.state': 'loaded'}})
+        return True
+
+    def read_gff(self, gene_id):
+        """Read the GFF of a gene"""
+        return GffStorage(self.app, self.session, "genes").get(gene_id)
+
+    def load(self, email, gene, gff=None, clear=False):
+        """Load a gene in the Apollo organism of a user and wait until it is
+        visible
+
+        Parameters
+        ----------
+        email : str
+            Email of the user
+        gene : dict
+            The gene
+        gff : str, optional
+            GFF of the gene, read from the database if not given
+        clear : bool, optional
+            Delete the features of the organism first
+
+        Returns
+        -------
+        float
+            Time waited for Apollo, in seconds
+        """
+        if gff is None:
+            gff = self.read_gff(gene['_id'])
+        organism = self.organism(email)
+        if clear:
+            self.app.apollo.organisms.delete_features(organism)
+        self.log.debug("Loading gff: {}".format(gff))
+        self.app.apollo.annotations.load_gff3(organism, StringIO(gff))
+        ready, waited = self.app.apollo.wait_for_features(organism, gene['chromosome'], self.app.apollo.feature_names(gff) or [gene['_id']])
+        if not ready:
+            self.log.warning("Gene {} still not visible in Apollo after {:.1f}s".format(gene['_id'], waited))
+        return waited
@@ -0,0 +1,349 @@
+"""Contain the GeneImporter class"""
+
+import hashlib
+import os
+import random
+from datetime import datetime
+
+from genocrowd.libgenocrowd.GeneRegions import region_bin
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.GffStream import GffStream
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+class GeneImporter(Params):
+    """Import the genes of a GFF3 file into the genes collections
+
+    Genes are written with batched insert_many calls on genes.files, with
+    their GFF stored by GffStorage (inline, or in genes.chunks when large).
+
+    Large files can be parsed by several processes (upload_workers), a
+    single writer (this object) storing the genes in the order of the file.
+
+    Each gene records the hash of its GFF, its dataset (the genes of
+    successive releases of an annotation) and the upload that wrote it.
+    Importing a file again is incremental: genes with the same hash and
+    priority are skipped without writing, changed ones are updated (keeping
+    their annotation state) and, optionally, the genes of the dataset
+    missing from the file are retired (no longer annotable).
+
+    Attributes
+    ----------
+    added : int
+        Number of new genes
+    batch_size : int
+        Number of genes written per insert_many
+    changed : int
+        Number of updated genes
+    dataset : str
+        Dataset of the imported genes
+    parsed : int
+        Number of genes read from the file
+    redundancy : int
+        Number of independent annotations wanted per gene
+    retired : int
+        Number of genes of the dataset retired
+    stored : int
+        Number of genes written in the database (added and changed)
+    unchanged : int
+        Number of genes already up to date
+    upload : str
+        Id of the upload (its job id), stored in each gene
+    workers : int
+        Number of processes parsing the files given by path
+    """
+
+    # Fields of a gene kept when it is updated by a new upload (difficulty
+    # and level are recomputed by Difficulty after the upload)
+    ANNOTATION_STATE = ('isAnnotable', 'isValidated', 'difficulty', 'level', 'rand', 'redundancy', 'available', 'done', 'annotators', 'tags')
+    # Storage fields that only some payloads have
+    OPTIONAL_STORAGE = ('gff', 'compression', 'dictionary', 'chunkSize')
+    # Size (in bytes) of the parts of a file parsed by each worker process
+    RANGE_SIZE = 8 * 1024 * 1024
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.storage = GffStorage(app, session, "genes")
+        self.batch_size = self.settings.getint('genocrowd', 'upload_batch_size', fallback=1000)
+        self.redundancy = self.settings.getint('genocrowd', 'annotation_redundancy', fallback=1)
+        self.workers = self.settings.getint('genocrowd', 'upload_workers', fallback=1) or os.cpu_count()
+        self.parsed = 0
+        self.stored = 0
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+        self.retired = 0
+        self.upload = None
+        self.dataset = None
+
+    def ensure_indexes(self):
+        """Create the dataset index"""
+        self.storage.files.create_index([('dataset', ASCENDING)])
+
+    def import_gff(self, handle, priority=0, skip=0, callback=None, upload=None, dataset=None, retire=False):
+        """Split a GFF3 file in genes and store them
+
+        Parameters
+        ----------
+        handle :
+            File-like object or iterable of GFF3 lines
+        priority, skip, callback, upload, dataset, retire :
+            See import_genes
+
+        Returns
+        -------
+        dict
+            Number of parsed, stored, added, changed, unchanged and retired
+            genes
+        """
+        return self.import_genes(GffStream(handle, errors=self.error_message), priority, skip, callback, upload, dataset, retire)
+
+    def import_path(self, path, priority=0, skip=0, callback=None, upload=None, dataset=None, retire=False):
+        """Split a GFF3 file in genes and store them, parsing it with
+        several processes when it is large enough
+
+        The file is parsed in the current process when workers is 1, or when
+        it is smaller than one range. The worker processes can be started
+        from a Celery worker (see GffStream.parallel_genes).
+
+        Parameters
+        ----------
+        path : str
+            GFF3 file
+        priority, skip, callback, upload, dataset, retire :
+            See import_genes
+
+        Returns
+        -------
+        dict
+            Number of parsed, stored, added, changed, unchanged and retired
+            genes
+        """
+        if self.workers > 1 and os.path.getsize(path) > self.RANGE_SIZE:
+            genes = GffStream.parallel_genes(path, self.workers, self.RANGE_SIZE, errors=self.error_message)
+            return self.import_genes(genes, priority, skip, callback, upload, dataset, retire)
+        with open(path, 'rb') as handle:
+            return self.import_gff(handle, priority, skip, callback, upload, dataset, retire)
+
+    def import_genes(self, genes, priority=0, skip=0, callback=None, upload=None, dataset=None, retire=False):
+        """Store genes, by batches
+
+        Parameters
+        ----------
+        genes : iterable
+            Genes yielded by GffStream
+        priority : int
+            Priority given to every gene of the file
+        skip : int, optional
+            Number of genes already imported by a previous run, to resume it
+        callback : function, optional
+            Called with the importer after each written batch
+        upload : str, optional
+            Id of the upload, to find (or remove) its genes later
+        dataset : str, optional
+            Dataset of the genes
+        retire : bool, optional
+            Retire the genes of the dataset that are not in the file
+
+        Returns
+        -------
+        dict
+            Number of parsed, stored, added, changed, unchanged and retired
+            genes
+        """
+        self.upload = upload
+        self.dataset = dataset
+        self.storage.ensure_indexes()
+        batch = []
+        seen = set()
+        for gene in genes:
+            if gene['_id'] in seen:
+                self.error_message.append("Duplicated gene ID: {}".format(gene['_id']))
+                continue
+            self.parsed += 1
+            seen.add(gene['_id'])
+            if self.parsed <= skip:
+                continue
+            batch.append(self.make_document(gene, priority))
+            if len(batch) >= self.batch_size:
+                self.insert_batch(batch)
+                batch = []
+                if callback:
+                    callback(self)
+        if batch:
+            self.insert_batch(batch)
+        if retire and dataset is not None:
+            self.retire(seen)
+
+        if self.error_message:
+            self.error = True
+
+        return {
+            'parsed': self.parsed,
+            'stored': self.stored,
+            'added': self.added,
+            'changed': self.changed,
+            'unchanged': self.unchanged,
+            'retired': self.retired
+        }
+
+    def make_document(self, gene, priority):
+        """Build the genes.files document and the payload of a gene
+
+        Parameters
+        ----------
+        gene : dict
+            Gene yielded by GffStream
+        priority : int
+            Gene priority
+
+        Returns
+        -------
+        tuple
+            genes.files document and encoded GFF
+        """
+        payload = gene['gff'].encode()
+        document = {
+            '_id': gene['_id'],
+            'uploadDate': datetime.utcnow(),
+            'chromosome': gene['chromosome'],
+            'start': gene['start'],
+            'end': gene['end'],
+            'strand': gene['strand'],
+            'bin': region_bin(gene['start'], gene['end']),
+            'isAnnotable': True,
+            'isValidated': False,
+            'features': gene['features'],
+            'difficulty': 0,
+            'level': 0,
+            'priority': priority,
+            'rand': random.random(),
+            'redundancy': self.redundancy,
+            'available': self.redundancy,
+            'done': 0,
+            'annotators': [],
+            'tags': [],
+            'upload': self.upload,
+            'dataset': self.dataset,
+            'hash': hashlib.sha1(payload).hexdigest()
+        }
+        return document, payload
+
+    def insert_batch(self, batch):
+        """Write a batch of genes, files first then chunks
+
+        The hashes and priorities of the genes already in the database are
+        read with one query: unchanged genes are skipped, changed ones are
+        updated with one bulk_write (their old chunks are removed), new ones
+        are inserted with insert_many. Genes inserted twice are reported as
+        errors, and their chunks are not written. If the storage codec uses
+        a dictionary not trained yet, it is trained on the first batch.
+
+        Parameters
+        ----------
+        batch : list
+            (document, payload) tuples
+        """
+        existing = {gene['_id']: gene for gene in self.storage.files.find(
+            {'_id': {'$in': [document['_id'] for document, payload in batch]}},
+            projection={'hash': 1, 'priority': 1, 'storage': 1, 'retired': 1})}
+        new = []
+        changed = []
+        for document, payload in batch:
+            gene = existing.get(document['_id'])
+            if gene is None:
+                new.append((document, payload))
+            elif gene.get('hash') == document['hash'] and gene.get('priority') == document['priority'] and 'retired' not in gene:
+                self.unchanged += 1
+            else:
+                changed.append((document, payload))
+        if not new and not changed:
+            return
+
+        if self.storage.needs_dictionary():
+            self.storage.train_dictionary([payload for document, payload in new + changed])
+        new = [(document, self.storage.pack(document, payload)) for document, payload in new]
+        changed = [(document, self.storage.pack(document, payload)) for document, payload in changed]
+
+        failed = set()
+        if new:
+            try:
+                self.storage.files.insert_many([document for document, chunks in new], ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details['writeErrors']:
+                    failed.add(write_error['index'])
+                    if write_error['code'] == 11000:
+                        self.error_message.append("Gene {} already in database".format(new[write_error['index']][0]['_id']))
+                    else:
+                        self.error_message.append(write_error['errmsg'])
+
+        if changed:
+            self.update_genes([document for document, chunks in changed],
+                              [gene['_id'] for gene in existing.values() if gene.get('storage') != 'inline'])
+
+        chunks = []
+        for index, (document, gene_chunks) in enumerate(new):
+            if index in failed:
+                continue
+            chunks.extend(gene_chunks)
+            self.added += 1
+        for document, gene_chunks in changed:
+            chunks.extend(gene_chunks)
+            self.changed += 1
+        self.stored = self.added + self.changed
+
+        if chunks:
+            self.storage.insert_chunks(chunks)
+
+    def update_genes(self, documents, chunked):
+        """Replace the content of genes, keeping their annotation state
+
+        A retired gene is annotable again.
+
+        Parameters
+        ----------
+        documents : list
+            New documents of the genes
+        chunked : list
+            Ids of genes whose previous payload is in chunks
+        """
+        requests = []
+        for document in documents:
+            content = {key: value for key, value in document.items() if key not in self.ANNOTATION_STATE and key != '_id'}
+            unset = {key: "" for key in self.OPTIONAL_STORAGE if key not in document}
+            unset['retired'] = ""
+            requests.append(UpdateOne({'_id': document['_id'], 'retired': {'$exists': True}}, {'$set': {'isAnnotable': True}}))
+            requests.append(UpdateOne({'_id': document['_id']}, {'$set': content, '$unset': unset}))
+        ids = set(document['_id'] for document in documents)
+        self.storage.chunks.delete_many({'files_id': {'$in': [gene_id for gene_id in chunked if gene_id in ids]}})
+        self.storage.files.bulk_write(requests, ordered=True)
+
+    def retire(self, seen, batch_size=10000):
+        """Retire the genes of the dataset that were not imported
+
+        Parameters
+        ----------
+        seen : set
+            Ids of the imported genes
+        batch_size : int, optional
+            Number of genes updated per update_many
+        """
+        retired = [gene['_id'] for gene in self.storage.files.find(
+            {'dataset': self.dataset, 'retired': {'$exists': False}}, projection={'_id': 1})
+            if gene['_id'] not in seen]
+        for start in range(0, len(retired), batch_size):
+            self.retired += self.storage.files.update_many(
+                {'_id': {'$in': retired[start:start + batch_size]}},
+                {'$set': {'isAnnotable': False, 'retired': datetime.utcnow()}}).modified_count
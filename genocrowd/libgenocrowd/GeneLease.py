@@ -0,0 +1,180 @@
+"""Contain the GeneLease class"""
+
+import time
+from datetime import datetime, timedelta
+
+from genocrowd.libgenocrowd.GeneSelector import GeneSelector
+from genocrowd.libgenocrowd.Levels import Levels
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class GeneLease(Params):
+    """Distribute genes to annotators with expiring leases
+
+    Each gene must be annotated by `redundancy` different users. The number
+    of slots still free is kept in the gene `available` counter: a claim
+    takes a slot with an atomic find_one_and_update, so two annotators can
+    never get the same slot. The claim is recorded in the leases collection
+    with an expiry date; expired leases are reaped and their slot is given
+    back to the pool. Completing an annotation deletes the lease without
+    giving the slot back. Each move of a slot is also counted on the level
+    of the gene (see Levels).
+
+    Attributes
+    ----------
+    duration : int
+        Lease duration, in seconds
+    redundancy : int
+        Default number of independent annotations per gene
+    """
+
+    # Timestamp of the last reaping in this process
+    last_reap = 0
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.genes = self.app.mongo.db["genes.files"]
+        self.leases = self.app.mongo.db["leases"]
+        self.users = self.app.mongo.db["users"]
+        self.duration = self.settings.getint('genocrowd', 'lease_duration', fallback=7200)
+        self.reap_interval = self.settings.getint('genocrowd', 'lease_reap_interval', fallback=60)
+        self.redundancy = self.settings.getint('genocrowd', 'annotation_redundancy', fallback=1)
+
+    def ensure_indexes(self):
+        """Create the leases indexes, and add the slot counters to genes
+        imported without them"""
+        self.leases.create_index([('expires', ASCENDING)])
+        self.leases.create_index([('gene', ASCENDING), ('username', ASCENDING)], unique=True)
+        self.genes.update_many({'available': {'$exists': False}}, {'$set': {
+            'redundancy': self.redundancy,
+            'available': self.redundancy,
+            'done': 0,
+            'annotators': []
+        }})
+
+    def claim(self, username, level, attempts=3):
+        """Lease a gene of a level to a user
+
+        Parameters
+        ----------
+        username : str
+            The annotator
+        level : int
+            Difficulty level
+        attempts : int, optional
+            Number of tries when the picked genes are claimed concurrently
+
+        Returns
+        -------
+        dict
+            The leased gene, None if no gene is available
+        """
+        self.reap(force=False)
+        selector = GeneSelector(self.app, self.session)
+        extra = {'available': {'$gt': 0}, 'annotators': {'$ne': username}}
+        update = {'$inc': {'available': -1}, '$push': {'annotators': username}}
+        for attempt in range(attempts):
+            gene = selector.select_gene(level, extra=extra, update=update)
+            if gene:
+                break
+        if not gene:
+            return None
+        Levels(self.app, self.session).count(gene['level'], available=-1, leased=1)
+
+        try:
+            self.leases.insert_one({
+                'gene': gene['_id'],
+                'username': username,
+                'expires': datetime.utcnow() + timedelta(seconds=self.duration)
+            })
+        except DuplicateKeyError:
+            pass
+        return gene
+
+    def renew(self, gene_id, username):
+        """Extend the lease of a user on a gene
+
+        Returns
+        -------
+        bool
+            False if the lease does not exist anymore
+        """
+        result = self.leases.update_one({'gene': gene_id, 'username': username}, {
+            '$set': {'expires': datetime.utcnow() + timedelta(seconds=self.duration)}})
+        return result.matched_count == 1
+
+    def complete(self, gene_id, username):
+        """Close the lease of a user who annotated a gene"""
+        if not self.leases.delete_one({'gene': gene_id, 'username': username}).deleted_count:
+            return
+        gene = self.genes.find_one_and_update({'_id': gene_id}, {'$inc': {'done': 1}}, projection={'level': 1})
+        if gene:
+            Levels(self.app, self.session).count(gene.get('level', 0), leased=-1, done=1)
+
+    def release(self, gene_id, username, expired_before=None):
+        """Give back the slot leased by a user on a gene
+
+        Parameters
+        ----------
+        gene_id : str
+            The gene
+        username : str
+            The annotator
+        expired_before : datetime, optional
+            Only release the lease if it expired before this date
+
+        Returns
+        -------
+        bool
+            True if a lease was released
+        """
+        query = {'gene': gene_id, 'username': username}
+        if expired_before:
+            query['expires'] = {'$lt': expired_before}
+        if not self.leases.delete_one(query).deleted_count:
+            return False
+        gene = self.genes.find_one_and_update({'_id': gene_id}, {'$inc': {'available': 1}, '$pull': {'annotators': username}},
+                                              projection={'level': 1, 'isAnnotable': 1}, return_document=ReturnDocument.AFTER)
+        if gene:
+            Levels(self.app, self.session).count(gene.get('level', 0), available=1 if gene.get('isAnnotable') is True else 0, leased=-1)
+        self.users.update_one({'username': username, 'current_annotation._id': gene_id}, {'$set': {'current_annotation': None}})
+        self.users.update_one({'username': username, 'next_annotation._id': gene_id}, {'$set': {'next_annotation': None}})
+        return True
+
+    def reap(self, force=True):
+        """Release the expired leases
+
+        Parameters
+        ----------
+        force : bool, optional
+            If False, do nothing when the last reaping of this process is
+            more recent than lease_reap_interval
+
+        Returns
+        -------
+        int
+            Number of released leases
+        """
+        if not force and time.time() - GeneLease.last_reap < self.reap_interval:
+            return 0
+        GeneLease.last_reap = time.time()
+        now = datetime.utcnow()
+        released = 0
+        for lease in self.leases.find({'expires': {'$lt': now}}):
+            if self.release(lease['gene'], lease['username'], expired_before=now):
+                released += 1
+        if released:
+            self.log.info("Released {} expired leases".format(released))
+        return released
@@ -0,0 +1,233 @@
+"""Contain the GeneRegions class"""
+
+import re
+
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, UpdateOne
+
+# UCSC binning scheme: 5 levels of bins of 128 kb, 1 Mb, 8 Mb, 64 Mb and
+# 512 Mb, and an extended scheme (6 levels) for positions over 512 Mb
+BIN_OFFSETS = (512 + 64 + 8 + 1, 64 + 8 + 1, 8 + 1, 1, 0)
+BIN_OFFSETS_EXTENDED = (4096 + 512 + 64 + 8 + 1, 512 + 64 + 8 + 1, 64 + 8 + 1, 8 + 1, 1, 0)
+BIN_FIRST_SHIFT = 17
+BIN_NEXT_SHIFT = 3
+BIN_EXTENDED_OFFSET = 4681
+BIN_STANDARD_MAX = 1 << 29
+
+
+def _scheme(end):
+    """Offsets and first offset of the scheme used for an interval"""
+    if end > BIN_STANDARD_MAX:
+        return BIN_OFFSETS_EXTENDED, BIN_EXTENDED_OFFSET
+    return BIN_OFFSETS, 0
+
+
+def region_bin(start, end):
+    """Smallest bin containing an interval
+
+    Parameters
+    ----------
+    start, end : int
+        Interval, 0-based half-open
+
+    Returns
+    -------
+    int
+        UCSC bin number
+    """
+    offsets, extended = _scheme(end)
+    start_bin = start >> BIN_FIRST_SHIFT
+    end_bin = max(start, end - 1) >> BIN_FIRST_SHIFT
+    for offset in offsets:
+        if start_bin == end_bin:
+            return extended + offset + start_bin
+        start_bin >>= BIN_NEXT_SHIFT
+        end_bin >>= BIN_NEXT_SHIFT
+    raise ValueError("Interval {}-{} out of range".format(start, end))
+
+
+def overlapping_bins(start, end):
+    """Bins that can hold an interval overlapping a region
+
+    Parameters
+    ----------
+    start, end : int
+        Region, 0-based half-open
+
+    Returns
+    -------
+    list
+        UCSC bin numbers, of both schemes (a gene ending after 512 Mb has an
+        extended bin, even if it starts before the region)
+    """
+    bins = []
+    schemes = [(BIN_OFFSETS_EXTENDED, BIN_EXTENDED_OFFSET)]
+    if start < BIN_STANDARD_MAX:
+        schemes.insert(0, (BIN_OFFSETS, 0))
+    for offsets, extended in schemes:
+        start_bin = start >> BIN_FIRST_SHIFT
+        end_bin = max(start, end - 1) >> BIN_FIRST_SHIFT
+        for offset in offsets:
+            bins.extend(range(extended + offset + start_bin, extended + offset + end_bin + 1))
+            start_bin >>= BIN_NEXT_SHIFT
+            end_bin >>= BIN_NEXT_SHIFT
+    return bins
+
+
+def parse_region(region):
+    """Parse a region as written in genome browsers
+
+    Parameters
+    ----------
+    region : str
+        chromosome, chromosome:start-end or chromosome:start; positions are
+        1-based and inclusive, with optional thousands separators and k or M
+        suffixes (NC_042493.1:8.3M-8.4M)
+
+    Returns
+    -------
+    tuple
+        chromosome, start and end (0-based half-open, end None for the
+        whole chromosome)
+
+    Raises
+    ------
+    ValueError
+        When the region is invalid
+    """
+    def position(text):
+        match = re.fullmatch(r'(\d+(?:\.\d+)?)([kKmM]?)', text.replace(',', '').strip())
+        if not match:
+            raise ValueError("Invalid position: {}".format(text))
+        multiplier = {'': 1, 'k': 10**3, 'm': 10**6}[match.group(2).lower()]
+        return int(round(float(match.group(1)) * multiplier))
+
+    chromosome, separator, interval = region.strip().rpartition(':')
+    if not separator or not re.fullmatch(r'[\d.,kKmM]+(-[\d.,kKmM]+)?', interval.strip()):
+        return region.strip(), 0, None
+    start, separator, end = interval.partition('-')
+    start = max(position(start) - 1, 0)
+    end = position(end) if separator else start + 1
+    if not chromosome or end <= start:
+        raise ValueError("Invalid region: {}".format(region))
+    return chromosome, start, end
+
+
+class GeneRegions(Params):
+    """Find genes by genomic region
+
+    Each gene has the UCSC bin number of its interval (bin, set at import).
+    A gene overlapping a region is in one of the few bins overlapping the
+    region, so region and overlap queries are a lookup on the (chromosome,
+    bin, start) index followed by an exact test on the positions, instead
+    of a scan of the chromosome.
+    """
+
+    INDEX = [('chromosome', ASCENDING), ('bin', ASCENDING), ('start', ASCENDING)]
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.genes = self.app.mongo.db["genes.files"]
+
+    def ensure_indexes(self, batch_size=1000):
+        """Create the region index, and bin the genes with positions imported
+        without a bin
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of genes updated per bulk_write
+        """
+        self.genes.create_index(self.INDEX, name='region')
+        requests = []
+        for gene in self.genes.find({'bin': {'$exists': False}, 'start': {'$exists': True}, 'end': {'$exists': True}}, projection={'start': 1, 'end': 1}):
+            requests.append(UpdateOne({'_id': gene['_id']}, {'$set': {'bin': region_bin(gene['start'], gene['end'])}}))
+            if len(requests) >= batch_size:
+                self.genes.bulk_write(requests, ordered=False)
+                requests = []
+        if requests:
+            self.genes.bulk_write(requests, ordered=False)
+
+    @staticmethod
+    def query(chromosome, start, end=None):
+        """Query matching the genes overlapping a region
+
+        Parameters
+        ----------
+        chromosome : str
+            Sequence name
+        start, end : int
+            Region, 0-based half-open, end None for the whole chromosome
+
+        Returns
+        -------
+        dict
+            MongoDB query
+        """
+        if end is None:
+            return {'chromosome': chromosome}
+        return {
+            'chromosome': chromosome,
+            'bin': {'$in': overlapping_bins(start, end)},
+            'start': {'$lt': end},
+            'end': {'$gt': start}
+        }
+
+    def region(self, chromosome, start, end=None, limit=0):
+        """Get the genes overlapping a region
+
+        Parameters
+        ----------
+        chromosome : str
+            Sequence name
+        start, end : int
+            Region, 0-based half-open, end None for the whole chromosome
+        limit : int, optional
+            Maximum number of genes (0 for all)
+
+        Returns
+        -------
+        Cursor
+            Genes (without their GFF), by position
+        """
+        return self.genes.find(self.query(chromosome, start, end), projection=GffStorage.EXCLUDE,
+                               sort=[('start', ASCENDING), ('_id', ASCENDING)], limit=limit)
+
+    def overlaps(self, gene_id, limit=0):
+        """Get the genes overlapping a gene, on any strand
+
+        Parameters
+        ----------
+        gene_id : str
+            The gene
+        limit : int, optional
+            Maximum number of genes (0 for all)
+
+        Returns
+        -------
+        tuple
+            The gene and the list of the other genes overlapping it, gene is
+            None if it does not exist, the list is empty if the gene has no
+            position
+        """
+        gene = self.genes.find_one({'_id': gene_id}, projection=GffStorage.EXCLUDE)
+        if not gene:
+            return None, []
+        if any(gene.get(field) is None for field in ('chromosome', 'start', 'end')):
+            return gene, []
+        query = self.query(gene['chromosome'], gene['start'], gene['end'])
+        query['_id'] = {'$ne': gene_id}
+        overlapping = self.genes.find(query, projection=GffStorage.EXCLUDE,
+                                      sort=[('start', ASCENDING), ('_id', ASCENDING)], limit=limit)
+        return gene, list(overlapping)
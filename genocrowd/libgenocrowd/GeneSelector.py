@@ -0,0 +1,94 @@
+"""Contain the GeneSelector class"""
+
+import random
+
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+
+
+class GeneSelector(Params):
+    """Pick a gene to annotate with indexed queries
+
+    Each gene has a level (its difficulty bucket) and a random key (rand)
+    drawn at import. Selecting a gene is two index lookups on
+    (isAnnotable, level, priority, rand): one for the best available
+    priority, one for the first gene after a random point of the key space.
+    The genes collection is never loaded in memory.
+    """
+
+    INDEX = [('isAnnotable', ASCENDING), ('level', ASCENDING), ('priority', DESCENDING), ('rand', ASCENDING)]
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.genes = self.app.mongo.db["genes.files"]
+
+    def ensure_indexes(self, batch_size=1000):
+        """Create the selection index, and give a level and a random key to
+        genes imported without them
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of genes updated per bulk_write
+        """
+        self.genes.create_index(self.INDEX, name='selection')
+        self.genes.update_many({'level': {'$exists': False}}, {'$set': {'level': 0}})
+
+        requests = []
+        for gene in self.genes.find({'rand': {'$exists': False}}, projection={'_id': 1}):
+            requests.append(UpdateOne({'_id': gene['_id']}, {'$set': {'rand': random.random()}}))
+            if len(requests) >= batch_size:
+                self.genes.bulk_write(requests, ordered=False)
+                requests = []
+        if requests:
+            self.genes.bulk_write(requests, ordered=False)
+
+    def select_gene(self, level, extra=None, update=None):
+        """Pick a random annotable gene of a level, among the ones with the
+        highest priority
+
+        Parameters
+        ----------
+        level : int
+            Difficulty level
+        extra : dict, optional
+            Additional filters
+        update : dict, optional
+            Update applied atomically to the picked gene
+
+        Returns
+        -------
+        dict
+            The gene (genes.files document without its GFF, after the
+            update), None if no gene is available
+        """
+        match = {'isAnnotable': True, 'level': level}
+        if extra:
+            match.update(extra)
+        best = self.genes.find_one(match, projection={'priority': 1}, sort=[('priority', DESCENDING)])
+        if not best:
+            return None
+        match['priority'] = best['priority']
+
+        pivot = random.random()
+        gene = self._pick(dict(match, rand={'$gte': pivot}), ASCENDING, update)
+        if not gene:
+            gene = self._pick(dict(match, rand={'$lt': pivot}), DESCENDING, update)
+        return gene
+
+    def _pick(self, match, direction, update):
+        """Get (and update) the first gene matching in the rand order"""
+        if update is None:
+            return self.genes.find_one(match, projection=GffStorage.EXCLUDE, sort=[('rand', direction)])
+        return self.genes.find_one_and_update(match, update, projection=GffStorage.EXCLUDE, sort=[('rand', direction)], return_document=ReturnDocument.AFTER)
@@ -0,0 +1,213 @@
+"""Contain the GffCodec classes"""
+
+import collections
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GffCodec(object):
+    """Compression codec of GFF payloads, without compression
+
+    Codecs are registered by name in CODECS. The ones using a dictionary
+    compress better the small payloads of single genes: the dictionary holds
+    the text repeated on every line (source, types, attribute keys and
+    values), trained once from a sample of genes and shared by all the
+    payloads.
+
+    Attributes
+    ----------
+    dictionary : bytes
+        Dictionary, for the codecs using one
+    """
+
+    name = 'none'
+    # Codec used when the dictionary of a codec is not trained yet
+    fallback = 'none'
+    uses_dictionary = False
+
+    def __init__(self, dictionary=None):
+        """init
+
+        Parameters
+        ----------
+        dictionary : bytes, optional
+            Dictionary, for the codecs using one
+        """
+        self.dictionary = dictionary
+
+    @staticmethod
+    def get(name, dictionary=None):
+        """Get a codec by name
+
+        Parameters
+        ----------
+        name : str
+            One of the CODECS keys
+        dictionary : bytes, optional
+            Dictionary, for the codecs using one
+
+        Returns
+        -------
+        GffCodec
+            The codec
+        """
+        if name not in CODECS:
+            raise Exception("Unknown GFF codec: {}".format(name))
+        codec = CODECS[name]
+        if not codec.available():
+            raise Exception("GFF codec {} needs the zstandard package".format(name))
+        return codec(dictionary)
+
+    @staticmethod
+    def available():
+        """Check that the codec dependencies are installed"""
+        return True
+
+    def compress(self, payload):
+        """Compress a payload
+
+        Parameters
+        ----------
+        payload : bytes
+            Data
+
+        Returns
+        -------
+        bytes
+            Compressed data
+        """
+        return payload
+
+    def decompress(self, data):
+        """Decompress data compressed by compress"""
+        return bytes(data)
+
+    def train(self, samples, size):
+        """Build a dictionary from GFF samples
+
+        Parameters
+        ----------
+        samples : list
+            Payloads (bytes)
+        size : int
+            Maximum size of the dictionary, in bytes
+
+        Returns
+        -------
+        bytes
+            The dictionary
+        """
+        return self.common_fragments(samples, size)
+
+    @staticmethod
+    def common_fragments(samples, size):
+        """Build a raw dictionary with the most repeated fragments of GFF
+        lines: the source and type columns, and each attribute
+
+        Fragments are sorted by increasing score (occurrences x length), as
+        deflate and zstd reach the end of the dictionary with shorter
+        distances.
+        """
+        counts = collections.Counter()
+        for sample in samples:
+            for line in sample.split(b'\n'):
+                if not line or line.startswith(b'#'):
+                    counts[line + b'\n'] += 1
+                    continue
+                columns = line.split(b'\t')
+                if len(columns) != 9:
+                    continue
+                counts[b'\t'.join(columns[1:3]) + b'\t'] += 1
+                counts[b'\t'.join(columns[5:8]) + b'\t'] += 1
+                for attribute in columns[8].split(b';'):
+                    counts[attribute + b';'] += 1
+
+        fragments = []
+        total = 0
+        for fragment, count in sorted(counts.items(), key=lambda item: item[1] * len(item[0]), reverse=True):
+            if count < 2:
+                break
+            if total + len(fragment) > size:
+                continue
+            fragments.append(fragment)
+            total += len(fragment)
+        return b''.join(reversed(fragments))
+
+
+class ZlibCodec(GffCodec):
+    """zlib (deflate) compression"""
+
+    name = 'zlib'
+    fallback = 'zlib'
+
+    def compress(self, payload):
+        compressor = zlib.compressobj(level=9, zdict=self.dictionary) if self.dictionary else zlib.compressobj(level=9)
+        return compressor.compress(payload) + compressor.flush()
+
+    def decompress(self, data):
+        decompressor = zlib.decompressobj(zdict=self.dictionary) if self.dictionary else zlib.decompressobj()
+        return decompressor.decompress(bytes(data)) + decompressor.flush()
+
+
+class ZlibDictCodec(ZlibCodec):
+    """zlib compression with a preset dictionary (the 32kB deflate window)"""
+
+    name = 'zlib-dict'
+    uses_dictionary = True
+
+    def train(self, samples, size):
+        return self.common_fragments(samples, min(size, 32 * 1024))
+
+
+class ZstdCodec(GffCodec):
+    """zstd compression"""
+
+    name = 'zstd'
+    fallback = 'zstd'
+
+    @staticmethod
+    def available():
+        return zstandard is not None
+
+    def __init__(self, dictionary=None):
+        GffCodec.__init__(self, dictionary)
+        self.compressor = None
+        self.decompressor = None
+
+    def zstd_dictionary(self):
+        """Get the dictionary as a ZstdCompressionDict"""
+        if not self.dictionary:
+            return None
+        return zstandard.ZstdCompressionDict(self.dictionary)
+
+    def compress(self, payload):
+        # Compressors are not thread-safe: one per codec instance
+        if self.compressor is None:
+            self.compressor = zstandard.ZstdCompressor(level=9, dict_data=self.zstd_dictionary())
+        return self.compressor.compress(payload)
+
+    def decompress(self, data):
+        if self.decompressor is None:
+            self.decompressor = zstandard.ZstdDecompressor(dict_data=self.zstd_dictionary())
+        return self.decompressor.decompress(bytes(data))
+
+
+class ZstdDictCodec(ZstdCodec):
+    """zstd compression with a trained dictionary"""
+
+    name = 'zstd-dict'
+    uses_dictionary = True
+
+    def train(self, samples, size):
+        try:
+            return zstandard.train_dictionary(size, samples).as_bytes()
+        except zstandard.ZstdError:
+            # Not enough samples to train, use the raw fragments
+            return self.common_fragments(samples, size)
+
+
+CODECS = collections.OrderedDict((codec.name, codec) for codec in (GffCodec, ZlibCodec, ZlibDictCodec, ZstdCodec, ZstdDictCodec))
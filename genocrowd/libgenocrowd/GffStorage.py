@@ -0,0 +1,369 @@
+"""Contain the GffStorage class"""
+
+import time
+import uuid
+from datetime import datetime
+
+from bson.binary import Binary
+
+from genocrowd.libgenocrowd.GffCodec import CODECS, GffCodec
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+class GffStorage(Params):
+    """Store the GFF payloads of genes and answers
+
+    Each gene (or answer) is a document of the <prefix>.files collection.
+    Two backends are available for its GFF:
+
+    - inline: the GFF is stored in the gff field of the document, optionally
+      compressed with one of the GffCodec codecs. One lookup reads the gene
+      and its GFF.
+    - gridfs: the GFF is split in <prefix>.chunks documents, with the GridFS
+      layout. Used for payloads above inline_max_size (and when gridfs is
+      the configured backend). Documents without a storage field were
+      written by GridFS and are read this way.
+
+    The codecs using a dictionary (zlib-dict, zstd-dict) share the last one
+    trained for them, stored in the gff_dictionaries collection. Each payload
+    records its codec and dictionary, so older payloads are still decoded
+    after a new training. Until a dictionary is trained, payloads are
+    compressed without one.
+
+    Attributes
+    ----------
+    backend : str
+        Backend of the new payloads, one of BACKENDS
+    compression : str
+        Codec of the inline payloads, one of the GffCodec CODECS
+    dictionary_size : int
+        Size of the trained dictionaries, in bytes
+    inline_max_size : int
+        Larger payloads are stored in GridFS chunks, in bytes
+    """
+
+    BACKENDS = ('inline', 'gridfs')
+    CHUNK_SIZE = 255 * 1024
+    # Time (in seconds) after which the current dictionary is looked up again
+    DICTIONARY_REFRESH = 60
+
+    # Dictionaries of this process, by id, and current one by codec
+    dictionary_cache = {}
+    current_dictionaries = {}
+
+    # Fields holding the payload, to exclude when listing documents
+    EXCLUDE = {'gff': 0}
+    # Fields needed to read the payload
+    PAYLOAD = {'storage': 1, 'compression': 1, 'dictionary': 1, 'gff': 1}
+
+    def __init__(self, app, session, prefix="genes"):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        prefix : str, optional
+            genes or answers
+        """
+        Params.__init__(self, app, session)
+        self.files = self.app.mongo.db["{}.files".format(prefix)]
+        self.chunks = self.app.mongo.db["{}.chunks".format(prefix)]
+        self.dictionaries = self.app.mongo.db["gff_dictionaries"]
+        self.backend = self.settings.get('genocrowd', 'gff_storage', fallback='inline')
+        self.compression = self.settings.get('genocrowd', 'gff_compression', fallback='zlib')
+        self.inline_max_size = self.settings.getint('genocrowd', 'gff_inline_max_size', fallback=1024 * 1024)
+        self.dictionary_size = self.settings.getint('genocrowd', 'gff_dictionary_size', fallback=16 * 1024)
+        if self.backend not in self.BACKENDS:
+            raise Exception("Unknown gff_storage: {}".format(self.backend))
+        GffCodec.get(self.compression)
+
+    def ensure_indexes(self):
+        """Create the chunks and dictionaries indexes"""
+        self.chunks.create_index([('files_id', ASCENDING), ('n', ASCENDING)], unique=True)
+        self.dictionaries.create_index([('codec', ASCENDING), ('created', DESCENDING)])
+
+    def needs_dictionary(self):
+        """Check if the configured codec uses a dictionary not trained yet"""
+        return CODECS[self.compression].uses_dictionary and self.current_dictionary() is None
+
+    def current_dictionary(self):
+        """Get the last dictionary trained for the configured codec
+
+        Returns
+        -------
+        dict
+            _id and data of the dictionary, None if there is none
+        """
+        cached = self.current_dictionaries.get(self.compression)
+        if cached and time.time() - cached[0] < self.DICTIONARY_REFRESH:
+            return cached[1]
+        dictionary = self.dictionaries.find_one({'codec': self.compression}, sort=[('created', DESCENDING)])
+        if dictionary:
+            dictionary['data'] = bytes(dictionary['data'])
+            self.dictionary_cache[dictionary['_id']] = dictionary['data']
+        self.current_dictionaries[self.compression] = (time.time(), dictionary)
+        return dictionary
+
+    def get_dictionary(self, dictionary_id):
+        """Get a dictionary by id (cached, dictionaries never change)"""
+        if dictionary_id not in self.dictionary_cache:
+            dictionary = self.dictionaries.find_one({'_id': dictionary_id})
+            if not dictionary:
+                raise Exception("Unknown GFF dictionary: {}".format(dictionary_id))
+            self.dictionary_cache[dictionary_id] = bytes(dictionary['data'])
+        return self.dictionary_cache[dictionary_id]
+
+    def train_dictionary(self, samples=None, nb_samples=1000):
+        """Train a dictionary for the configured codec, used by the payloads
+        written from now on
+
+        Parameters
+        ----------
+        samples : list, optional
+            Payloads (bytes) to train on, a random sample of the stored genes
+            if not given
+        nb_samples : int, optional
+            Number of genes sampled
+
+        Returns
+        -------
+        str
+            Id of the dictionary, None if the codec does not use one or if
+            there is no sample
+        """
+        codec = GffCodec.get(self.compression)
+        if not codec.uses_dictionary:
+            return None
+        if samples is None:
+            documents = self.app.mongo.db["genes.files"].aggregate([
+                {'$sample': {'size': nb_samples}},
+                {'$project': {'storage': 1, 'compression': 1, 'dictionary': 1, 'gff': 1}}
+            ])
+            payloads = [GffStorage(self.app, self.session, "genes").read(document) for document in documents]
+        else:
+            payloads = samples
+        if not payloads:
+            return None
+
+        data = codec.train(payloads, self.dictionary_size)
+        dictionary = {
+            '_id': uuid.uuid4().hex,
+            'codec': self.compression,
+            'data': Binary(data),
+            'size': len(data),
+            'samples': len(payloads),
+            'created': datetime.utcnow()
+        }
+        self.dictionaries.insert_one(dictionary)
+        self.current_dictionaries.pop(self.compression, None)
+        self.log.info("Trained a {} dictionary of {} bytes on {} genes".format(self.compression, len(data), len(payloads)))
+        return dictionary['_id']
+
+    def pack(self, document, payload):
+        """Add a payload to a document
+
+        Parameters
+        ----------
+        document : dict
+            The files document, updated with the storage fields
+        payload : bytes
+            The GFF
+
+        Returns
+        -------
+        list
+            Chunks to insert, empty when the payload is inline
+        """
+        document['length'] = len(payload)
+        if self.backend == 'inline' and len(payload) <= self.inline_max_size:
+            codec = CODECS[self.compression]
+            dictionary = self.current_dictionary() if codec.uses_dictionary else None
+            if dictionary:
+                document['dictionary'] = dictionary['_id']
+                codec = codec(dictionary['data'])
+            else:
+                codec = GffCodec.get(codec.fallback)
+            document['storage'] = 'inline'
+            document['compression'] = codec.name
+            document['gff'] = Binary(codec.compress(payload))
+            return []
+
+        document['storage'] = 'gridfs'
+        document['chunkSize'] = self.CHUNK_SIZE
+        return [{
+            'files_id': document['_id'],
+            'n': n,
+            'data': payload[offset:offset + self.CHUNK_SIZE]
+        } for n, offset in enumerate(range(0, len(payload), self.CHUNK_SIZE))]
+
+    def put(self, document, gff):
+        """Store a document and its GFF
+
+        Parameters
+        ----------
+        document : dict
+            The files document (with its _id)
+        gff : str
+            The GFF
+        """
+        chunks = self.pack(document, gff.encode())
+        self.files.insert_one(document)
+        if chunks:
+            self.insert_chunks(chunks)
+
+    def insert_chunks(self, chunks):
+        """Insert GridFS chunks, ignoring the ones already written by an
+        interrupted run"""
+        try:
+            self.chunks.insert_many(chunks, ordered=False)
+        except BulkWriteError as e:
+            if any(write_error['code'] != 11000 for write_error in e.details['writeErrors']):
+                raise
+
+    def get(self, file_id):
+        """Get the GFF of a document
+
+        Parameters
+        ----------
+        file_id : str
+            Document id
+
+        Returns
+        -------
+        str
+            The GFF, None if the document does not exist
+        """
+        document = self.files.find_one({'_id': file_id}, projection=self.PAYLOAD)
+        if not document:
+            return None
+        return self.read(document).decode()
+
+    def read(self, document):
+        """Read the payload of a document (with its PAYLOAD fields)
+
+        Returns
+        -------
+        bytes
+            The payload
+        """
+        if document.get('storage') == 'inline':
+            dictionary = self.get_dictionary(document['dictionary']) if document.get('dictionary') else None
+            return GffCodec.get(document.get('compression', 'none'), dictionary).decompress(document['gff'])
+        return b''.join(chunk['data'] for chunk in self.chunks.find({'files_id': document['_id']}, sort=[('n', ASCENDING)]))
+
+    def delete(self, file_id):
+        """Delete a document and its chunks"""
+        self.files.delete_one({'_id': file_id})
+        self.chunks.delete_many({'files_id': file_id})
+
+    def delete_many(self, query, batch_size=10000):
+        """Delete the documents matching a query, and their chunks
+
+        Inline documents have no chunks: only the ids of the others are
+        read, to delete their chunks by batches after the documents.
+
+        Parameters
+        ----------
+        query : dict
+            Filter, {} deletes everything
+        batch_size : int, optional
+            Number of documents whose chunks are deleted per delete_many
+
+        Returns
+        -------
+        tuple
+            Number of deleted documents and chunks
+        """
+        if not query:
+            return self.files.delete_many({}).deleted_count, self.chunks.delete_many({}).deleted_count
+
+        chunked = [document['_id'] for document in self.files.find(
+            {'$and': [query, {'storage': {'$ne': 'inline'}}]}, projection={'_id': 1})]
+        deleted = self.files.delete_many(query).deleted_count
+        deleted_chunks = 0
+        for start in range(0, len(chunked), batch_size):
+            deleted_chunks += self.chunks.delete_many({'files_id': {'$in': chunked[start:start + batch_size]}}).deleted_count
+        return deleted, deleted_chunks
+
+    def migrate(self, batch_size=1000, callback=None):
+        """Rewrite the payloads stored with another backend, codec or
+        dictionary than the configured ones
+
+        Chunks are written before the documents are updated, and deleted
+        after, so an interrupted migration can be run again.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            Number of documents updated per bulk_write
+        callback : function, optional
+            Called with the number of migrated documents after each batch
+
+        Returns
+        -------
+        int
+            Number of migrated documents
+        """
+        if self.backend == 'inline':
+            dictionary = self.current_dictionary() if CODECS[self.compression].uses_dictionary else None
+            compression = self.compression if dictionary else CODECS[self.compression].fallback
+            query = {'$or': [
+                {'storage': {'$ne': 'inline'}, 'length': {'$lte': self.inline_max_size}},
+                {'storage': 'inline', 'compression': {'$ne': compression}}
+            ]}
+            if dictionary:
+                query['$or'].append({'storage': 'inline', 'dictionary': {'$ne': dictionary['_id']}})
+        else:
+            query = {'storage': {'$ne': 'gridfs'}}
+
+        migrated = 0
+        batch = []
+        cursor = self.files.find(query, projection=self.PAYLOAD, batch_size=batch_size)
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                migrated += self.migrate_batch(batch)
+                batch = []
+                if callback:
+                    callback(migrated)
+        if batch:
+            migrated += self.migrate_batch(batch)
+            if callback:
+                callback(migrated)
+        return migrated
+
+    def migrate_batch(self, batch):
+        """Rewrite a batch of documents with the configured backend"""
+        chunks = []
+        updates = []
+        to_gridfs = []
+        to_inline = []
+        for document in batch:
+            packed = {'_id': document['_id']}
+            chunks.extend(self.pack(packed, self.read(document)))
+            packed.pop('_id')
+            if packed['storage'] == 'inline':
+                unset = {'chunkSize': ''}
+                if 'dictionary' not in packed:
+                    unset['dictionary'] = ''
+                if document.get('storage') != 'inline':
+                    to_inline.append(document['_id'])
+            else:
+                unset = {'gff': '', 'compression': '', 'dictionary': ''}
+                to_gridfs.append(document['_id'])
+            updates.append(UpdateOne({'_id': document['_id']}, {'$set': packed, '$unset': unset}))
+
+        if to_gridfs:
+            self.chunks.delete_many({'files_id': {'$in': to_gridfs}})
+        if chunks:
+            self.insert_chunks(chunks)
+        self.files.bulk_write(updates, ordered=False)
+        if to_inline:
+            self.chunks.delete_many({'files_id': {'$in': to_inline}})
+        return len(updates)
@@ -0,0 +1,308 @@
+"""Contain the GffStream class"""
+
+import collections
+import os
+
+from billiard import Pool
+
+
+class GffStream(object):
+    """Line-oriented GFF3 reader
+
+    Group the features of a GFF3 file by top-level gene without building
+    Biopython SeqRecords. Only one gene is kept in memory at a time, so the
+    children of a gene are expected to follow it (which is what Apollo,
+    NCBI and most annotation pipelines produce).
+
+    Attributes
+    ----------
+    errors : list
+        Error messages collected while reading
+    handle :
+        Iterable of GFF3 lines (text or bytes)
+    """
+
+    HEADER = "##gff-version 3\n"
+
+    def __init__(self, handle, errors=None):
+        """init
+
+        Parameters
+        ----------
+        handle :
+            File-like object or iterable of lines
+        errors : list, optional
+            List where error messages are appended
+        """
+        self.handle = handle
+        self.errors = [] if errors is None else errors
+
+    def __iter__(self):
+        return self.genes()
+
+    @staticmethod
+    def parse_attributes(column):
+        """Get the ID and the first Parent of a feature
+
+        Parameters
+        ----------
+        column : str
+            9th column of a GFF3 line
+
+        Returns
+        -------
+        tuple
+            ID and Parent, None if missing
+        """
+        feature_id = None
+        parent = None
+        for attribute in column.split(';'):
+            key, sep, value = attribute.partition('=')
+            if not sep:
+                continue
+            key = key.strip()
+            if key == 'ID':
+                feature_id = value.strip()
+            elif key == 'Parent':
+                parent = value.split(',')[0].strip()
+        return feature_id, parent
+
+    @staticmethod
+    def to_strand(column):
+        """Convert a GFF3 strand to the Biopython convention"""
+        if column == '+':
+            return 1
+        if column == '-':
+            return -1
+        return None
+
+    def genes(self):
+        """Iterate over the genes of the file
+
+        Yields
+        ------
+        dict
+            _id, chromosome, start (0-based), end, strand, nb_features
+            (number of direct children), gff (standalone GFF3 text) and
+            features (see gene_features)
+        """
+        current = None
+        owners = {}
+        seen = set()
+
+        for line in self.handle:
+            if isinstance(line, bytes):
+                line = line.decode('utf-8', 'replace')
+            if not line.strip():
+                continue
+            if line.startswith('#'):
+                if line.startswith('##FASTA'):
+                    break
+                if line.startswith('###') and current:
+                    yield self._finish(current)
+                    current = None
+                    owners = {}
+                continue
+
+            columns = line.rstrip('\r\n').split('\t')
+            if len(columns) != 9:
+                self.errors.append("Malformed line: {}".format(line.strip()[:80]))
+                continue
+
+            feature_id, parent = self.parse_attributes(columns[8])
+
+            if parent is None:
+                if current:
+                    yield self._finish(current)
+                current = None
+                owners = {}
+                if feature_id is None:
+                    self.errors.append("Top-level {} feature without ID on {}".format(columns[2], columns[0]))
+                    continue
+                if feature_id in seen:
+                    self.errors.append("Duplicated gene ID: {}".format(feature_id))
+                    continue
+                seen.add(feature_id)
+                current = {
+                    '_id': feature_id,
+                    'chromosome': columns[0],
+                    'start': int(columns[3]) - 1,
+                    'end': int(columns[4]),
+                    'strand': self.to_strand(columns[6]),
+                    'nb_features': 0,
+                    'lines': [line if line.endswith('\n') else line + '\n'],
+                }
+                owners[feature_id] = feature_id
+                continue
+
+            if current is None or parent not in owners:
+                self.errors.append("Feature {} has an unknown or misplaced parent: {}".format(feature_id or columns[2], parent))
+                continue
+
+            if parent == current['_id']:
+                current['nb_features'] += 1
+            if feature_id:
+                owners[feature_id] = current['_id']
+            current['lines'].append(line if line.endswith('\n') else line + '\n')
+
+        if current:
+            yield self._finish(current)
+
+    def _finish(self, gene):
+        """Turn the buffered lines of a gene into a standalone GFF3, and
+        describe its structure (in the worker processes of parallel_genes)"""
+        gene['gff'] = self.HEADER + ''.join(gene.pop('lines'))
+        gene['features'] = gene_features(gene['gff'])
+        return gene
+
+    @staticmethod
+    def is_top_level(line):
+        """Check if a line is a feature without parent (the start of a gene)"""
+        columns = line.split(b'\t')
+        return len(columns) == 9 and not line.startswith(b'#') and b'Parent=' not in columns[8]
+
+    @classmethod
+    def split(cls, path, range_size):
+        """Split a GFF3 file in byte ranges starting on top-level features,
+        so that each range holds whole genes
+
+        Parameters
+        ----------
+        path : str
+            GFF3 file
+        range_size : int
+            Approximate size of the ranges, in bytes
+
+        Returns
+        -------
+        list
+            (start, end) offsets
+        """
+        total = os.path.getsize(path)
+        offsets = [0]
+        with open(path, 'rb') as handle:
+            position = range_size
+            while position < total:
+                handle.seek(position)
+                handle.readline()
+                line_start = handle.tell()
+                line = handle.readline()
+                while line and not line.startswith(b'##FASTA') and not cls.is_top_level(line):
+                    line_start = handle.tell()
+                    line = handle.readline()
+                if not line or line.startswith(b'##FASTA'):
+                    break
+                offsets.append(line_start)
+                position = line_start + range_size
+        offsets.append(total)
+        return list(zip(offsets[:-1], offsets[1:]))
+
+    @classmethod
+    def parallel_genes(cls, path, workers, range_size=8 * 1024 * 1024, errors=None):
+        """Iterate over the genes of a GFF3 file, parsed by worker processes
+
+        The file is split in ranges of whole genes (see split), parsed by a
+        pool of processes. Genes are yielded in the order of the file, and
+        only a few ranges per worker are parsed ahead, so memory does not
+        depend on the file size. Duplicated IDs are only detected inside
+        each range.
+
+        The pool is a billiard one (the multiprocessing fork of Celery):
+        unlike multiprocessing, it can start processes from a daemonic
+        process, such as a child of the Celery prefork pool running the
+        upload jobs.
+
+        Parameters
+        ----------
+        path : str
+            GFF3 file
+        workers : int
+            Number of processes
+        range_size : int, optional
+            Approximate size of the ranges, in bytes
+        errors : list, optional
+            List where error messages are appended
+
+        Yields
+        ------
+        dict
+            Genes, as yielded by genes
+        """
+        errors = [] if errors is None else errors
+        ranges = iter(cls.split(path, range_size))
+        pool = Pool(processes=workers)
+        try:
+            pending = collections.deque()
+            for start, end in ranges:
+                pending.append(pool.apply_async(parse_range, (path, start, end)))
+                if len(pending) >= workers * 2:
+                    break
+            while pending:
+                genes, range_errors = pending.popleft().get()
+                for start, end in ranges:
+                    pending.append(pool.apply_async(parse_range, (path, start, end)))
+                    break
+                errors.extend(range_errors)
+                for gene in genes:
+                    yield gene
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def parse_range(path, start, end):
+    """Parse the genes of a byte range of a GFF3 file (in a worker process)
+
+    Returns
+    -------
+    tuple
+        Genes and error messages
+    """
+    with open(path, 'rb') as handle:
+        handle.seek(start)
+        data = handle.read(end - start)
+    stream = GffStream(data.splitlines(True))
+    return list(stream), stream.errors
+
+
+def gene_features(gff):
+    """Describe the structure of a gene
+
+    Parameters
+    ----------
+    gff : str
+        Standalone GFF3 of the gene (as made by GffStream)
+
+    Returns
+    -------
+    dict
+        length, isoforms (transcripts with exons), exons (of the largest
+        transcript), intron_mean and intron_max (in bases)
+    """
+    length = 0
+    gene_id = None
+    exons = collections.defaultdict(list)
+    for line in gff.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        columns = line.split('\t')
+        if len(columns) != 9:
+            continue
+        feature_id, parent = GffStream.parse_attributes(columns[8])
+        if parent is None:
+            gene_id = feature_id
+            length = int(columns[4]) - int(columns[3]) + 1
+        elif columns[2] == 'exon':
+            exons[parent].append((int(columns[3]), int(columns[4])))
+
+    introns = []
+    for transcript in exons.values():
+        transcript.sort()
+        introns.extend(max(0, start - previous_end - 1) for (previous_start, previous_end), (start, end) in zip(transcript, transcript[1:]))
+    return {
+        'length': length,
+        'isoforms': len([transcript for transcript in exons if transcript != gene_id]) or (1 if exons else 0),
+        'exons': max([len(transcript) for transcript in exons.values()] or [0]),
+        'intron_mean': int(sum(introns) / len(introns)) if introns else 0,
+        'intron_max': max(introns or [0])
+    }
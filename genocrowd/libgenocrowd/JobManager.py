@@ -0,0 +1,317 @@
+"""Contain the JobManager class"""
+
+import os
+import sys
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from genocrowd.libgenocrowd.Data import Data
+from genocrowd.libgenocrowd.Difficulty import Difficulty
+from genocrowd.libgenocrowd.GeneCheckout import GeneCheckout
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.Params import Params
+from genocrowd.libgenocrowd.Roster import Roster
+
+from pymongo import DESCENDING, ReturnDocument
+
+
+class JobManager(Params):
+    """Manage the background jobs
+
+    Jobs are stored in the jobs collection with their status, progress and
+    a checkpoint used to resume them. They run in a Celery worker, or in the
+    current process if always_eager is set in the celery section of the
+    config (used by the tests, no Redis needed).
+
+    A job can be resumed when it failed, or when it is still queued or
+    running but was not updated for job_stale_after seconds (its message or
+    its worker was lost).
+
+    Attributes
+    ----------
+    jobs : Collection
+        jobs collection
+    stale_after : int
+        Time without update after which a queued or running job is
+        interrupted, in seconds
+    """
+
+    HANDLERS = {
+        'upload_genes': 'run_upload_genes',
+        'remove_genes': 'run_remove_genes',
+        'set_group': 'run_set_group',
+        'load_gene': 'run_load_gene',
+        'compute_difficulty': 'run_compute_difficulty',
+        'provision_users': 'run_provision_users',
+    }
+
+    # Number of error messages kept in a job document
+    MAX_ERRORS = 100
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.jobs = self.app.mongo.db["jobs"]
+        self.batches = self.app.mongo.db["batches"]
+        self.upload_path = self.settings.get('genocrowd', 'upload_path', fallback='/tmp/genocrowd/uploads')
+        self.stale_after = self.settings.getint('genocrowd', 'job_stale_after', fallback=1800)
+
+    def create(self, job_type, params=None):
+        """Create a new queued job
+
+        Parameters
+        ----------
+        job_type : str
+            One of the HANDLERS keys
+        params : dict, optional
+            Job parameters
+
+        Returns
+        -------
+        dict
+            The job
+        """
+        now = datetime.utcnow()
+        job = {
+            '_id': uuid.uuid4().hex,
+            'type': job_type,
+            'params': params or {},
+            'status': 'queued',
+            'progress': {},
+            'checkpoint': {},
+            'errors': [],
+            'result': None,
+            'user': self.session['user']['username'] if self.session and 'user' in self.session else None,
+            'created': now,
+            'updated': now
+        }
+        self.jobs.insert_one(job)
+        return job
+
+    def save_upload(self, file, priority, dataset=None, retire=False):
+        """Save an uploaded GFF and create the job importing it, and its
+        batch (the batches document describing the upload, with the same id)
+
+        Parameters
+        ----------
+        file : FileStorage
+            The uploaded file
+        priority : int
+            Priority of the genes
+        dataset : str, optional
+            Dataset of the genes, the file name by default
+        retire : bool, optional
+            Retire the genes of the dataset that are not in the file
+
+        Returns
+        -------
+        dict
+            The job
+        """
+        os.makedirs(self.upload_path, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.upload_path, "{}.gff".format(job_id))
+        file.save(path)
+        job = self.create('upload_genes', {
+            'path': path,
+            'filename': file.filename,
+            'priority': priority,
+            'dataset': dataset or file.filename,
+            'retire': retire
+        })
+        self.batches.insert_one({
+            '_id': job['_id'],
+            'filename': file.filename,
+            'dataset': dataset or file.filename,
+            'priority': priority,
+            'retire': retire,
+            'user': job['user'],
+            'created': job['created'],
+            'finished': None,
+            'counts': {}
+        })
+        return job
+
+    def submit(self, job):
+        """Run a job in a Celery worker, or right now if always_eager is set
+
+        Parameters
+        ----------
+        job : dict
+            The job
+
+        Returns
+        -------
+        dict
+            The job, up to date
+        """
+        if self.settings.getboolean('celery', 'always_eager', fallback=False):
+            self.run(job['_id'])
+        else:
+            self.app.celery.send_task('run_job', (job['_id'], ))
+        return self.get(job['_id'])
+
+    def get(self, job_id):
+        """Get a job
+
+        Parameters
+        ----------
+        job_id : str
+            Job id
+
+        Returns
+        -------
+        dict
+            The job, None if it does not exist
+        """
+        return self.jobs.find_one({'_id': job_id})
+
+    def get_jobs(self, limit=50):
+        """Get the last jobs
+
+        Parameters
+        ----------
+        limit : int, optional
+            Maximum number of jobs
+
+        Returns
+        -------
+        list
+            Jobs, most recent first
+        """
+        return list(self.jobs.find({}, sort=[('created', DESCENDING)], limit=limit))
+
+    def update(self, job_id, **fields):
+        """Update some fields of a job"""
+        fields['updated'] = datetime.utcnow()
+        self.jobs.update_one({'_id': job_id}, {'$set': fields})
+
+    def resume(self, job_id):
+        """Re-submit a failed or interrupted job, starting from its checkpoint
+
+        The job is queued again with one find_one_and_update, so that it is
+        only resumed once, and never while it is still queued or running.
+
+        Parameters
+        ----------
+        job_id : str
+            Job id
+
+        Returns
+        -------
+        dict
+            The job, None if it can't be resumed
+        """
+        now = datetime.utcnow()
+        job = self.jobs.find_one_and_update({'_id': job_id, '$or': [
+            {'status': 'failure'},
+            {'status': {'$in': ['queued', 'running']}, 'updated': {'$lt': now - timedelta(seconds=self.stale_after)}}
+        ]}, {'$set': {'status': 'queued', 'updated': now}}, return_document=ReturnDocument.AFTER)
+        if not job:
+            return None
+        return self.submit(job)
+
+    def run(self, job_id):
+        """Run a job (called by the worker)
+
+        Parameters
+        ----------
+        job_id : str
+            Job id
+        """
+        job = self.get(job_id)
+        if not job:
+            self.log.error("Unknown job {}".format(job_id))
+            return
+        self.update(job_id, status='running')
+        try:
+            result = getattr(self, self.HANDLERS[job['type']])(job)
+        except Exception as e:
+            traceback.print_exc(file=sys.stdout)
+            self.jobs.update_one({'_id': job_id}, {
+                '$set': {'status': 'failure', 'updated': datetime.utcnow()},
+                '$push': {'errors': {'$each': [str(e)], '$slice': -self.MAX_ERRORS}}})
+            return
+        self.update(job_id, status='success', result=result)
+
+    def run_upload_genes(self, job):
+        """Import an uploaded GFF, checkpointing after each batch, then score
+        its genes (a resumed job skips the import once it is done)"""
+        params = job['params']
+        skip = job['checkpoint'].get('genes', 0)
+        importer = GeneImporter(self.app, self.session)
+        # Counts of a previous run of the job
+        previous = {key: job['progress'].get(key, 0) for key in ('stored', 'added', 'changed', 'unchanged')}
+
+        def counts(importer):
+            return {key: previous[key] + getattr(importer, key) for key in previous}
+
+        def checkpoint(importer):
+            progress = {'parsed': importer.parsed, 'errors': len(importer.error_message)}
+            progress.update(counts(importer))
+            self.update(job['_id'], progress=progress, checkpoint={'genes': importer.parsed}, errors=importer.error_message[:self.MAX_ERRORS])
+
+        if job['checkpoint'].get('imported'):
+            # Resumed after the import: only the scoring is left
+            result = {'parsed': job['checkpoint']['genes'], 'retired': job['checkpoint'].get('retired', 0)}
+            result.update(previous)
+        else:
+            importer.import_path(params['path'], params['priority'], skip=skip, callback=checkpoint, upload=job['_id'],
+                                 dataset=params.get('dataset'), retire=params.get('retire', False))
+            checkpoint(importer)
+            self.update(job['_id'], checkpoint={'genes': importer.parsed, 'retired': importer.retired, 'imported': True})
+            result = {'parsed': importer.parsed, 'retired': importer.retired}
+            result.update(counts(importer))
+        result['levels'] = Difficulty(self.app, self.session).score_genes({'upload': job['_id']})['levels']
+        self.batches.update_one({'_id': job['_id']}, {'$set': {'finished': datetime.utcnow(), 'counts': result}})
+        # Kept until the job succeeds, so that it can be resumed
+        os.remove(params['path'])
+        return result
+
+    def run_remove_genes(self, job):
+        """Remove the genes matching the filters of the job"""
+        return Data(self.app, self.session).remove_genes(job['params'].get('filters', {}))
+
+    def run_compute_difficulty(self, job):
+        """Compute the difficulty and the level of all the genes"""
+        return Difficulty(self.app, self.session).compute()
+
+    def run_set_group(self, job):
+        """Assign a group to each student"""
+        local_auth = LocalAuth(self.app, self.session)
+        result = local_auth.set_group(job['params'])
+        return {'gradeList': result['gradeList']}
+
+    def run_load_gene(self, job):
+        """Load the prefetched gene of a user in Apollo"""
+        loaded = GeneCheckout(self.app, self.session).load_next(job['params']['user'])
+        return {'loaded': loaded}
+
+    def run_provision_users(self, job):
+        """Create the Apollo users and organisms of imported users, failing
+        if some of them could not be created (resuming retries them)"""
+        progress = {'done': 0, 'failed': 0}
+        errors = []
+
+        def callback(status):
+            progress[status['status']] += 1
+            if status['status'] == 'failed':
+                errors.append("{}: {}".format(status['username'], status['error']))
+            self.update(job['_id'], progress=progress, errors=errors[-self.MAX_ERRORS:])
+
+        statuses = Roster(self.app, self.session).provision(job['params']['users'], callback)
+        result = dict(progress, rows=statuses)
+        if progress['failed']:
+            self.update(job['_id'], result=result)
+            raise Exception("{} users could not be created in Apollo".format(progress['failed']))
+        return result
@@ -0,0 +1,116 @@
+"""Contain the Leaderboard class"""
+
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import DESCENDING
+
+
+class Leaderboard(Params):
+    """Rank the annotators and the groups by number of annotations
+
+    Each user has a total_annotation counter, incremented with $inc when an
+    answer is saved. Rankings are computed by MongoDB (indexed sort for the
+    users, $group for the groups) and kept in the app leaderboard cache,
+    invalidated when this process saves an answer. Admins (users without a
+    group) are not ranked.
+    """
+
+    # Largest top-N that can be asked
+    MAX_TOP = 100
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.users = self.app.mongo.db["users"]
+        self.groups = self.app.mongo.db["groups"]
+        self.cache = self.app.leaderboard_cache
+
+    def ensure_indexes(self):
+        """Create the ranking index"""
+        self.users.create_index([('total_annotation', DESCENDING)])
+
+    def record_answer(self, username):
+        """Count a new annotation of a user"""
+        self.users.update_one({'username': username}, {'$inc': {'total_annotation': 1}})
+        self.cache.invalidate()
+
+    def top_users(self, number=3):
+        """Get the best annotators
+
+        Parameters
+        ----------
+        number : int, optional
+            Number of users
+
+        Returns
+        -------
+        list
+            username and score of each user, best first
+        """
+        def load():
+            cursor = self.users.find(
+                {'group': {'$ne': None}},
+                projection=LocalAuth.PROJECTIONS['leaderboard'],
+                sort=[('total_annotation', DESCENDING)],
+                limit=number)
+            return [{'username': user['username'], 'score': user.get('total_annotation', 0)} for user in cursor]
+
+        return self.cache.get(('users', number), load)
+
+    def top_groups(self, number=3):
+        """Get the best groups
+
+        Parameters
+        ----------
+        number : int, optional
+            Number of groups
+
+        Returns
+        -------
+        list
+            name, number and score (sum of the annotations of its users) of
+            each group, best first
+        """
+        def load():
+            scores = {result['_id']: result['score'] for result in self.users.aggregate([
+                {'$match': {'group': {'$ne': None}}},
+                {'$group': {'_id': '$group', 'score': {'$sum': '$total_annotation'}}}
+            ])}
+            groups = [{
+                'name': group['name'],
+                'number': group['number'],
+                'score': scores.get(group['number'], 0)
+            } for group in self.groups.find({'number': {'$exists': True}}, projection={'_id': 0, 'name': 1, 'number': 1}, sort=[('number', 1)])]
+            return sorted(groups, key=lambda group: group['score'], reverse=True)[:number]
+
+        return self.cache.get(('groups', number), load)
+
+    def get_rank(self, username):
+        """Get the rank of a user
+
+        Parameters
+        ----------
+        username : str
+            The user
+
+        Returns
+        -------
+        dict
+            username, score and rank (1 for the best, users with the same
+            score have the same rank), None if the user is not ranked
+        """
+        user = self.users.find_one({'username': username}, projection={'group': 1, 'total_annotation': 1})
+        if not user or user.get('group') is None:
+            return None
+        score = user.get('total_annotation', 0)
+        better = self.users.count_documents({'group': {'$ne': None}, 'total_annotation': {'$gt': score}})
+        return {'username': username, 'score': score, 'rank': better + 1}
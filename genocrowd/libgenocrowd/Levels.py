@@ -0,0 +1,162 @@
+"""Contain the Levels class"""
+
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import UpdateOne
+
+
+class Levels(Params):
+    """Manage the difficulty levels and their gene counters
+
+    Each document of the levels collection is a level: its number (_id), a
+    name, the minimum difficulty of its genes (min, 0 to 10000) and counters
+    of annotation slots (a gene has `redundancy` slots): available (free
+    slots of annotable genes), leased and done, with the number of genes.
+    The counters are incremented by GeneLease when slots are claimed,
+    released or completed, and recounted with one aggregation after bulk
+    changes (difficulty computation, gene removal, new thresholds).
+    """
+
+    COUNTERS = ('genes', 'available', 'leased', 'done')
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.levels = self.app.mongo.db["levels"]
+        self.genes = self.app.mongo.db["genes.files"]
+
+    def ensure_defaults(self):
+        """Create difficulty_levels levels of equal size when there is none
+
+        The levels are upserted, so that concurrent calls create them once.
+        """
+        if self.levels.count_documents({}, limit=1):
+            return
+        number = max(1, self.settings.getint('genocrowd', 'difficulty_levels', fallback=3))
+        result = self.levels.bulk_write([UpdateOne({'_id': level}, {'$setOnInsert': {
+            'name': "Level {}".format(level + 1),
+            'min': level * 10000 // number
+        }}, upsert=True) for level in range(number)], ordered=False)
+        if result.upserted_count:
+            self.recount()
+
+    def get_levels(self):
+        """Get the levels with their counters
+
+        Returns
+        -------
+        list
+            dict
+                _id, name, min, genes, available, leased, done
+        """
+        self.ensure_defaults()
+        levels = list(self.levels.find({}, sort=[('_id', 1)]))
+        for level in levels:
+            for counter in self.COUNTERS:
+                level.setdefault(counter, 0)
+        return levels
+
+    def thresholds(self):
+        """Minimum difficulty of each level, in increasing order"""
+        return [level['min'] for level in self.get_levels()]
+
+    def save_levels(self, levels):
+        """Replace the levels, then move the genes to their new level
+
+        Parameters
+        ----------
+        levels : list
+            dict
+                name and min (minimum difficulty) of each level, the first
+                one starting at 0
+
+        Returns
+        -------
+        list
+            The new levels, with their counters
+
+        Raises
+        ------
+        ValueError
+            When the thresholds are invalid
+        """
+        if not levels:
+            raise ValueError("At least one level is required")
+        thresholds = [int(level['min']) for level in levels]
+        if thresholds[0] != 0:
+            raise ValueError("The first level must start at difficulty 0")
+        if any(low >= high for low, high in zip(thresholds, thresholds[1:])) or thresholds[-1] > 10000:
+            raise ValueError("Minimum difficulties must increase, up to 10000")
+
+        self.levels.bulk_write([UpdateOne({'_id': number}, {'$set': {
+            'name': str(level.get('name') or "Level {}".format(number + 1)),
+            'min': threshold
+        }}, upsert=True) for number, (level, threshold) in enumerate(zip(levels, thresholds))])
+        self.levels.delete_many({'_id': {'$gte': len(levels)}})
+        self.relevel(thresholds)
+        self.recount()
+        return self.get_levels()
+
+    def relevel(self, thresholds):
+        """Set the level of the genes from their difficulty, with one
+        update_many per level
+
+        Returns
+        -------
+        int
+            Number of genes moved to another level
+        """
+        moved = 0
+        for number, threshold in enumerate(thresholds):
+            query = {'difficulty': {'$gte': threshold}, 'level': {'$ne': number}}
+            if number + 1 < len(thresholds):
+                query['difficulty']['$lt'] = thresholds[number + 1]
+            moved += self.genes.update_many(query, {'$set': {'level': number}}).modified_count
+        return moved
+
+    def recount(self):
+        """Recompute the counters of all the levels from the genes
+
+        Returns
+        -------
+        dict
+            Counters by level number
+        """
+        counts = {}
+        for group in self.genes.aggregate([{'$group': {
+            '_id': '$level',
+            'genes': {'$sum': 1},
+            'available': {'$sum': {'$cond': [{'$eq': ['$isAnnotable', True]}, '$available', 0]}},
+            'leased': {'$sum': {'$subtract': [{'$subtract': ['$redundancy', '$available']}, '$done']}},
+            'done': {'$sum': '$done'}
+        }}]):
+            counts[group.pop('_id')] = group
+        requests = []
+        for level in self.levels.find({}, projection={'_id': 1}):
+            counters = counts.get(level['_id'], {})
+            requests.append(UpdateOne({'_id': level['_id']}, {'$set': {counter: counters.get(counter, 0) for counter in self.COUNTERS}}))
+        if requests:
+            self.levels.bulk_write(requests, ordered=False)
+        return counts
+
+    def count(self, level, **counters):
+        """Increment counters of a level
+
+        Parameters
+        ----------
+        level : int
+            The level number
+        **counters
+            Increment of each counter (available, leased, done...)
+        """
+        counters = {counter: value for counter, value in counters.items() if value}
+        if counters:
+            self.levels.update_one({'_id': level}, {'$inc': counters})
@@ -0,0 +1,273 @@
+"""Contain the Listing class"""
+
+import base64
+from datetime import datetime
+
+from bson import ObjectId, json_util
+
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, DESCENDING
+
+
+def to_bool(value):
+    """Parse a boolean query parameter, matching the 0/1 statuses too"""
+    if value.lower() in ('true', '1'):
+        return {'$in': [True, 1]}
+    if value.lower() in ('false', '0'):
+        return {'$in': [False, 0]}
+    raise ValueError("must be true or false")
+
+
+def to_date(value):
+    """Parse a date (YYYY-MM-DD) or a UTC time (YYYY-MM-DDTHH:MM:SS) query parameter"""
+    for date_format in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError("must be YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS")
+
+
+class Listing(Params):
+    """Page through the documents of a collection for the admin tables
+
+    Pages use keyset pagination: the sort keys of the last document of a
+    page are sent back to the client as an opaque cursor, and the next page
+    starts after them with a range query on an index (no skip). Sorts always
+    end with _id, so the keys of a document are unique. The export streams
+    every matching document with a batched cursor. GFF payloads are never
+    loaded.
+
+    Attributes
+    ----------
+    name : str
+        One of the LISTINGS keys
+    """
+
+    # Largest page that can be asked
+    MAX_LIMIT = 1000
+
+    # For each listing: collection, filters (query parameter: field,
+    # parser, operator), sorts (name: fields) and default sort
+    LISTINGS = {
+        'genes': {
+            'collection': 'genes.files',
+            'filters': {
+                'chromosome': ('chromosome', str, '$eq'),
+                'upload': ('upload', str, '$eq'),
+                'dataset': ('dataset', str, '$eq'),
+                'annotable': ('isAnnotable', to_bool, None),
+                'validated': ('isValidated', to_bool, None),
+                'priority': ('priority', int, '$eq'),
+                'minDifficulty': ('difficulty', int, '$gte'),
+                'maxDifficulty': ('difficulty', int, '$lte')
+            },
+            'sorts': {
+                'position': ['chromosome', 'start', '_id'],
+                'id': ['_id'],
+                'difficulty': ['difficulty', '_id'],
+                'priority': ['priority', '_id']
+            },
+            'default_sort': 'position'
+        },
+        'answers': {
+            'collection': 'answers.files',
+            'filters': {
+                'gene': ('gene', str, '$eq'),
+                'annotator': ('username', str, '$eq'),
+                'validated': ('isValidated', to_bool, None),
+                'since': ('uploadDate', to_date, '$gte'),
+                'until': ('uploadDate', to_date, '$lt')
+            },
+            'sorts': {
+                'date': ['uploadDate', '_id'],
+                'id': ['_id'],
+                'gene': ['gene', '_id'],
+                'annotator': ['username', '_id']
+            },
+            'default_sort': 'date'
+        },
+        'batches': {
+            'collection': 'batches',
+            'filters': {
+                'dataset': ('dataset', str, '$eq')
+            },
+            'sorts': {
+                'date': ['created', '_id']
+            },
+            'default_sort': 'date'
+        }
+    }
+
+    def __init__(self, app, session, name):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        name : str
+            One of the LISTINGS keys
+        """
+        Params.__init__(self, app, session)
+        self.name = name
+        self.listing = self.LISTINGS[name]
+        self.collection = self.app.mongo.db[self.listing['collection']]
+        self.page_size = self.settings.getint('genocrowd', 'listing_page_size', fallback=100)
+
+    def ensure_indexes(self):
+        """Create an index for each sort (except _id)"""
+        for sort, fields in self.listing['sorts'].items():
+            if fields != ['_id']:
+                self.collection.create_index([(field, ASCENDING) for field in fields], name='listing_{}'.format(sort))
+
+    def parse(self, args):
+        """Read the filters and the sort of a request
+
+        Parameters
+        ----------
+        args : dict
+            Query string: filters, sort (one of the listing sorts,
+            default_sort by default) and order (asc or desc)
+
+        Returns
+        -------
+        tuple
+            MongoDB query and sort
+
+        Raises
+        ------
+        ValueError
+            When a parameter is invalid
+        """
+        query = {}
+        for parameter, (field, parser, operator) in self.listing['filters'].items():
+            if args.get(parameter) in (None, ''):
+                continue
+            try:
+                value = parser(args[parameter])
+            except ValueError as e:
+                raise ValueError("Invalid {}: {}".format(parameter, e))
+            if operator is None:
+                query[field] = value
+            else:
+                query.setdefault(field, {})[operator] = value
+
+        sort_name = args.get('sort', self.listing['default_sort'])
+        if sort_name not in self.listing['sorts']:
+            raise ValueError("Invalid sort: {} (one of {})".format(sort_name, ", ".join(self.listing['sorts'])))
+        order = args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError("Invalid order: {} (asc or desc)".format(order))
+        direction = ASCENDING if order == 'asc' else DESCENDING
+        return query, [(field, direction) for field in self.listing['sorts'][sort_name]]
+
+    @staticmethod
+    def encode_cursor(document, sort):
+        """Make the cursor of the page following a document"""
+        keys = [document.get(field) for field, direction in sort]
+        return base64.urlsafe_b64encode(json_util.dumps(keys).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor, sort):
+        """Read a cursor made by encode_cursor"""
+        try:
+            keys = json_util.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        except Exception:
+            raise ValueError("Invalid cursor")
+        if not isinstance(keys, list) or len(keys) != len(sort):
+            raise ValueError("Invalid cursor")
+        return keys
+
+    @staticmethod
+    def after(keys, sort):
+        """Query of the documents after the keys, in the sort order
+
+        (a, b) > (x, y) is a > x or (a == x and b > y)
+        """
+        clauses = []
+        for index, (field, direction) in enumerate(sort):
+            clause = {sort[previous][0]: keys[previous] for previous in range(index)}
+            clause[field] = {'$gt' if direction == ASCENDING else '$lt': keys[index]}
+            clauses.append(clause)
+        return {'$or': clauses}
+
+    @staticmethod
+    def serialize(document):
+        """Make a document JSON serializable"""
+        if isinstance(document.get('_id'), ObjectId):
+            document['_id'] = str(document['_id'])
+        return document
+
+    def page(self, args):
+        """Get a page of documents
+
+        Parameters
+        ----------
+        args : dict
+            Query string: filters, sort, order, limit (page size) and cursor
+            (next of the previous page)
+
+        Returns
+        -------
+        dict
+            documents, and next: cursor of the following page, None on the
+            last page
+
+        Raises
+        ------
+        ValueError
+            When a parameter is invalid
+        """
+        query, sort = self.parse(args)
+        try:
+            limit = min(max(int(args.get('limit', self.page_size)), 1), self.MAX_LIMIT)
+        except ValueError:
+            raise ValueError("Invalid limit: must be an integer")
+        if args.get('cursor'):
+            query = {'$and': [query, self.after(self.decode_cursor(args['cursor'], sort), sort)]}
+
+        # One more document tells whether there is a next page
+        documents = list(self.collection.find(query, projection=GffStorage.EXCLUDE, sort=sort, limit=limit + 1))
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = self.encode_cursor(documents[-1], sort)
+        return {
+            'documents': [self.serialize(document) for document in documents],
+            'next': next_cursor
+        }
+
+    def export(self, args, batch_size=1000, payload=False):
+        """Iterate over all the documents matching the filters
+
+        Parameters
+        ----------
+        args : dict
+            Query string: filters, sort and order
+        batch_size : int, optional
+            Number of documents fetched per round trip
+        payload : bool, optional
+            Only read the fields needed by GffStorage.read, instead of the
+            fields of the listing
+
+        Returns
+        -------
+        generator
+            Documents, in the sort order
+
+        Raises
+        ------
+        ValueError
+            When a parameter is invalid (raised by this call, not when
+            iterating)
+        """
+        query, sort = self.parse(args)
+        if payload:
+            return self.collection.find(query, projection=GffStorage.PAYLOAD, sort=sort, batch_size=batch_size)
+        cursor = self.collection.find(query, projection=GffStorage.EXCLUDE, sort=sort, batch_size=batch_size)
+        return (self.serialize(document) for document in cursor)
@@ -8,7 +8,7 @@ from flask_pymongo import BSONObjectIdConverter
 from genocrowd.libapollo.ApolloUsers import ApolloUsers
 from genocrowd.libgenocrowd.Params import Params
 
-from pymongo import ReturnDocument
+from pymongo import ASCENDING, ReturnDocument, UpdateMany, UpdateOne
 
 from validate_email import validate_email
 
@@ -16,7 +16,29 @@ from werkzeug.routing import BaseConverter
 
 
 class LocalAuth(Params):
-    """Manage user authentication"""
+    """Manage user authentication
+
+    User documents are always read with the projection of their use case
+    (PROJECTIONS): the password hash is only loaded to check a password, and
+    the annotations in progress are never loaded here.
+
+    The session user of each request comes from the user cache of the app
+    (see SessionStore): changes of the rights of a user (set_admin,
+    set_blocked, delete_user) invalidate its cached copy.
+
+    Passwords are hashed and checked in the bcrypt pool of the app (see
+    PasswordHasher), with the bcrypt_rounds cost factor: the hash of a user
+    is recomputed at login when this factor changed.
+    """
+
+    # Fields of the user documents loaded for each use case
+    PROJECTIONS = {
+        'admin': {'username': 1, 'email': 1, 'grade': 1, 'group': 1, 'isAdmin': 1, 'isExternal': 1, 'blocked': 1, 'created': 1, 'role': 1, 'level': 1, 'total_annotation': 1},
+        'session': {'username': 1, 'email': 1, 'grade': 1, 'group': 1, 'isAdmin': 1, 'isExternal': 1, 'blocked': 1, 'created': 1, 'role': 1, 'level': 1},
+        'login': {'username': 1, 'email': 1, 'grade': 1, 'group': 1, 'isAdmin': 1, 'isExternal': 1, 'blocked': 1, 'created': 1, 'role': 1, 'level': 1, 'password': 1},
+        'leaderboard': {'_id': 0, 'username': 1, 'total_annotation': 1},
+        'exists': {'_id': 1}
+    }
 
     def __init__(self, app, session):
         """init
@@ -31,6 +53,22 @@ class LocalAuth(Params):
         Params.__init__(self, app, session)
         self.users = self.app.mongo.db["users"]
         self.groups = self.app.mongo.db["groups"]
+        self.sessions = self.app.mongo.db["sessions"]
+
+    @staticmethod
+    def cache_key(user_id):
+        """Key of a user in the user cache of the app"""
+        return ('user', str(user_id))
+
+    def invalidate_user(self, user_id):
+        """Forget the cached copy of a user in this process, the other
+        processes reload it when it expires (user_cache_ttl)"""
+        self.app.user_cache.invalidate(self.cache_key(user_id))
+
+    def ensure_indexes(self):
+        """Create the login indexes (username and email)"""
+        self.users.create_index([('username', ASCENDING)])
+        self.users.create_index([('email', ASCENDING)])
 
     def check_inputs(self, inputs):
         """Check user inputs
@@ -91,7 +129,7 @@ class LocalAuth(Params):
         bool
             True if the user exist
         """
-        response = self.users.find_one({'username': username})
+        response = self.users.find_one({'username': username}, projection=self.PROJECTIONS['exists'])
         if response:
             return True
         else:
@@ -111,7 +149,7 @@ class LocalAuth(Params):
         bool
             True if the email exist
         """
-        response = self.users.find_one({'email': email})
+        response = self.users.find_one({'email': email}, projection=self.PROJECTIONS['exists'])
         if response:
             return True
         else:
@@ -127,28 +165,51 @@ class LocalAuth(Params):
         """
         return self.users.count_documents({})
 
-    def add_user_to_database(self, username, email, password, grade, role="user"):
+    @staticmethod
+    def new_user(username, email, password_hash, grade, role="user"):
+        """Document of a new user
 
-        self.app.logger.info("Creating user %s" % username)
-        password = self.app.bcrypt.generate_password_hash(password).decode('utf-8')
-        created = datetime.utcnow()
-        grade = grade.upper()
-        user_id = self.users.insert({
+        Parameters
+        ----------
+        username : str
+            Username
+        email : str
+            Email
+        password_hash : str
+            bcrypt hash of the password
+        grade : str
+            Grade of the student
+        role : str, optional
+            'admin' or 'user'
+
+        Returns
+        -------
+        dict
+            The user document, without _id
+        """
+        return {
             'username': username,
             'email': email,
-            'password': password,
-            'created': created,
+            'password': password_hash,
+            'created': datetime.utcnow(),
             'isAdmin': role == 'admin',
             'isExternal': False,
             'blocked': False,
             'current_annotation': None,
-            'grade': grade,
+            'next_annotation': None,
+            'grade': grade.upper(),
             'group': None,
             'total_annotation': 0,
             'level': 0
-        })
+        }
+
+    def add_user_to_database(self, username, email, password, grade, role="user"):
+
+        self.app.logger.info("Creating user %s" % username)
+        password = self.app.password_hasher.hash(password)
+        user_id = self.users.insert_one(self.new_user(username, email, password, grade, role)).inserted_id
 
-        new_user = self.users.find_one({'_id': user_id})
+        new_user = self.users.find_one({'_id': user_id}, projection=self.PROJECTIONS['session'])
 
         apolloinstance = ApolloUsers()
         apolloinstance.add_user(username, email, password, role)
@@ -160,6 +221,10 @@ class LocalAuth(Params):
         check if the password is the good password
             associated with the email or the username
 
+        The user is found with one query on both fields (a username takes
+        precedence over an email), and the password is checked in the bcrypt
+        pool of the app.
+
         Parameters
         ----------
         login: username or email
@@ -168,32 +233,30 @@ class LocalAuth(Params):
         -------
         dict
             user info if authentication success
+
+        Raises
+        ------
+        PasswordHasherBusy
+            If the bcrypt pool is full
         """
         login = data['login']
         password = data['password']
         user = {}
         error_message = []
-        if self.is_username_in_db(login):
-            response = self.users.find_one({'username': login})
-
-            if self.app.bcrypt.check_password_hash(response['password'], password):
+        candidates = list(self.users.find({'$or': [{'username': login}, {'email': login}]}, projection=self.PROJECTIONS['login'], limit=2))
+        candidates.sort(key=lambda candidate: candidate.get('username') != login)
+        if candidates:
+            response = candidates[0]
+            password_hash = response.pop('password')
+            if self.app.password_hasher.check(password_hash, password):
                 error = False
+                if self.app.password_hasher.needs_rehash(password_hash):
+                    self.users.update_one({'_id': response['_id']}, {'$set': {'password': self.app.password_hasher.hash(password)}})
                 response['_id'] = str(response['_id'])
                 user = response
             else:
                 error = True
                 error_message.append("Invalid password")
-
-        elif self.is_email_in_db(login):
-            response = self.users.find_one({'email': login})
-            if self.app.bcrypt.check_password_hash(response['password'], password):
-                error = False
-                response['_id'] = str(response['_id'])
-
-                user = response
-            else:
-                error = True
-                error_message.append("Invalid password")
         else:
             error = True
             error_message.append("Incorrect login identifier")
@@ -230,7 +293,7 @@ class LocalAuth(Params):
                 '$set': {
                     'username': username,
                     'email': email
-                }}, return_document=ReturnDocument.AFTER)
+                }}, projection=self.PROJECTIONS['session'], return_document=ReturnDocument.AFTER)
         assert updated_user['username'] == username
         return {
             'error': error,
@@ -269,14 +332,13 @@ class LocalAuth(Params):
                 authentication = self.authenticate_user(credentials)
                 if not authentication['error']:
                     # Update the password
-                    password = self.app.bcrypt.generate_password_hash(
-                        inputs['newPassword']).decode('utf-8')
+                    password = self.app.password_hasher.hash(inputs['newPassword'])
                     bson = BSONObjectIdConverter(BaseConverter)
                     updated_user = self.users.find_one_and_update({
                         '_id': bson.to_python(user['_id'])}, {
                             '$set': {
                                 'password': password
-                            }}, return_document=ReturnDocument.AFTER)
+                            }}, projection=self.PROJECTIONS['session'], return_document=ReturnDocument.AFTER)
                 else:
                     error = True
                     error_message = 'Incorrect old password'
@@ -292,19 +354,36 @@ class LocalAuth(Params):
             'user': updated_user}
 
     def get_all_users(self):
-        """Get all user info
+        """Get all user info, for the admin listing
 
         Returns
         -------
-        list
-            All user info
+        generator
+            All user info (ADMIN projection)
         """
-        userCursor = list(self.users.find({}))
-        userList = []
-        for document in userCursor:
-            document['_id'] = str(document['_id'])
-            userList.append(document)
-        return userList
+        return self.find_users('admin')
+
+    def find_users(self, use, query=None, batch_size=1000):
+        """Iterate over users, read by batches
+
+        Parameters
+        ----------
+        use : str
+            Use case, one of the PROJECTIONS keys
+        query : dict, optional
+            Filter
+        batch_size : int, optional
+            Number of users fetched per round trip
+
+        Yields
+        ------
+        dict
+            User, with its _id as a string
+        """
+        for user in self.users.find(query or {}, projection=self.PROJECTIONS[use], batch_size=batch_size):
+            if '_id' in user:
+                user['_id'] = str(user['_id'])
+            yield user
 
     def set_admin(self, new_status, username):
         """Set a new admin status to a user
@@ -316,11 +395,13 @@ class LocalAuth(Params):
         username : string
             The concerned username
         """
-        self.users.find_one_and_update({
+        user = self.users.find_one_and_update({
             'username': username}, {
                 '$set': {
                     'isAdmin': new_status
-                }})
+                }}, projection=self.PROJECTIONS['exists'])
+        if user:
+            self.invalidate_user(user['_id'])
 
     def set_blocked(self, new_status, username):
         """Set a new blocked status to a user
@@ -332,15 +413,38 @@ class LocalAuth(Params):
         username : string
             The concerned username
         """
-        self.users.find_one_and_update({
+        user = self.users.find_one_and_update({
             'username': username}, {
                 '$set': {
                     'blocked': new_status
-                }})
+                }}, projection=self.PROJECTIONS['exists'])
+        if user:
+            self.invalidate_user(user['_id'])
+
+    def delete_user(self, user_id):
+        """Delete a user, close all its sessions, and delete its Apollo user
+        and organism
+
+        Parameters
+        ----------
+        user_id : str
+            The user id
+        """
+        bson = BSONObjectIdConverter(BaseConverter)
+        user = self.users.find_one_and_delete({'_id': bson.to_python(user_id)}, projection={'email': 1})
+        self.sessions.delete_many({'user': str(user_id)})
+        self.invalidate_user(user_id)
+        if user and user.get('email'):
+            ApolloUsers().delete_user(user['email'])
 
     def set_group(self, data):
         """Assign a group to each student
 
+        The students of each grade are shuffled and spread over the groups
+        in turn. The assignment is computed in memory, then written with one
+        bulk_write on users and one on groups, which only keep the ids of
+        their students.
+
         Parameters
         ----------
         groupsamount : str
@@ -350,44 +454,56 @@ class LocalAuth(Params):
         ------
         dict
             error, error message and the list of grades
+
+        Raises
+        ------
+        ValueError
+            When there is no group
         """
         error = False
         error_message = []
-        gradeList = self.users.distinct("grade")
-        gradeList.remove('ADMIN')
+        gradeList = [grade for grade in self.users.distinct("grade") if grade != 'ADMIN']
         max_group = int(data["groupsAmount"])
-        groupNumber = 1
-        bson = BSONObjectIdConverter(BaseConverter)
-
-        for element in gradeList:
-            userCursor = list(self.users.find({'grade': element}))
-            userList = []
+        if max_group < 1:
+            raise ValueError("At least one group is required")
 
-            for document in userCursor:
-                document['_id'] = str(document['_id'])
-                userList.append(document)
+        assignment = self.assign_groups(gradeList, max_group)
 
-            random.shuffle(userList)
-            for user in userList:
-                if groupNumber > max_group:
-                    groupNumber = 1
-                    self.users.find_one_and_update({
-                        '_id': bson.to_python(user['_id'])}, {
-                            '$set': {'group': groupNumber}}, return_document=ReturnDocument.AFTER)
-                    self.groups.update({
-                        'number': groupNumber}, {
-                            '$push': {'student': user}})
-                else:
-                    self.users.find_one_and_update({
-                        '_id': bson.to_python(user['_id'])}, {
-                            '$set': {'group': groupNumber}}, return_document=ReturnDocument.AFTER)
-                    self.groups.update({
-                        'number': groupNumber}, {
-                            '$push': {'student': user}})
-                groupNumber += 1
+        user_requests = [UpdateMany({'_id': {'$in': ids}}, {'$set': {'group': number}}) for number, ids in assignment.items() if ids]
+        if user_requests:
+            self.users.bulk_write(user_requests, ordered=False)
+        group_requests = [UpdateOne({'number': number}, {'$set': {'student': [str(user_id) for user_id in ids]}}) for number, ids in assignment.items()]
+        group_requests.append(UpdateMany({'number': {'$gt': max_group}}, {'$set': {'student': []}}))
+        self.groups.bulk_write(group_requests, ordered=False)
+        self.app.leaderboard_cache.invalidate()
 
         return {
             'error': error,
             'errorMessage': error_message,
             'gradeList': gradeList
         }
+
+    def assign_groups(self, grades, max_group):
+        """Spread the students of each grade over the groups
+
+        Parameters
+        ----------
+        grades : list
+            Grades of the students
+        max_group : int
+            Number of groups
+
+        Returns
+        -------
+        dict
+            Ids of the students of each group number
+        """
+        assignment = {number: [] for number in range(1, max_group + 1)}
+        groupNumber = 1
+        for grade in grades:
+            ids = [user['_id'] for user in self.users.find({'grade': grade}, projection={'_id': 1})]
+            random.shuffle(ids)
+            for user_id in ids:
+                assignment[groupNumber].append(user_id)
+                groupNumber = groupNumber % max_group + 1
+        return assignment
@@ -0,0 +1,129 @@
+"""Contain the Metrics class"""
+
+import bisect
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Metrics(object):
+    """In-process latency histograms
+
+    Each metric is a histogram of durations with fixed buckets (in seconds),
+    plus its count, sum and max. Metrics are kept per process: with several
+    workers, each one reports its own numbers.
+
+    Attributes
+    ----------
+    buckets : tuple
+        Upper bounds of the histogram buckets, in seconds
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, buckets=None):
+        """init
+
+        Parameters
+        ----------
+        buckets : tuple, optional
+            Upper bounds of the histogram buckets, in seconds
+        """
+        self.buckets = tuple(buckets or self.BUCKETS)
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        """Record a duration
+
+        Parameters
+        ----------
+        name : str
+            Metric name
+        seconds : float
+            Duration
+        """
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = {
+                    'counts': [0] * (len(self.buckets) + 1),
+                    'count': 0,
+                    'sum': 0.0,
+                    'max': 0.0
+                }
+            histogram['counts'][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            histogram['max'] = max(histogram['max'], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        """Record the duration of a block of code
+
+        Parameters
+        ----------
+        name : str
+            Metric name
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start)
+
+    def quantile(self, name, q):
+        """Estimate a quantile from the histogram (upper bound of its bucket)
+
+        Parameters
+        ----------
+        name : str
+            Metric name
+        q : float
+            Quantile, between 0 and 1
+
+        Returns
+        -------
+        float
+            Quantile estimation, in seconds, None if nothing was recorded
+        """
+        histogram = self.histograms.get(name)
+        if not histogram or not histogram['count']:
+            return None
+        rank = q * histogram['count']
+        seen = 0
+        for index, count in enumerate(histogram['counts']):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else histogram['max']
+        return histogram['max']
+
+    def summary(self):
+        """Get all the metrics
+
+        Returns
+        -------
+        dict
+            For each metric: count, mean, p50, p95, max (seconds) and the
+            histogram as {bucket upper bound: count}
+        """
+        with self.lock:
+            names = sorted(self.histograms)
+        summary = {}
+        for name in names:
+            histogram = self.histograms[name]
+            bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+            summary[name] = {
+                'count': histogram['count'],
+                'mean': histogram['sum'] / histogram['count'],
+                'p50': self.quantile(name, 0.5),
+                'p95': self.quantile(name, 0.95),
+                'max': histogram['max'],
+                'histogram': dict(zip(bounds, histogram['counts']))
+            }
+        return summary
+
+    def reset(self):
+        """Forget all the recorded durations"""
+        with self.lock:
+            self.histograms = {}
@@ -0,0 +1,137 @@
+"""Contain the PasswordHasher class"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when all the hashing workers and queue slots are taken"""
+
+
+class PasswordHasher(object):
+    """App-scoped pool hashing and checking the passwords
+
+    bcrypt is slow on purpose, and runs without the GIL: the hashes are
+    computed by a fixed number of threads, so that a login storm uses at most
+    workers cores instead of one per request thread. At most queue_size more
+    hashes wait for a worker, the next ones fail at once (PasswordHasherBusy)
+    instead of piling up until the requests time out.
+
+    Attributes
+    ----------
+    bcrypt : Bcrypt
+        Flask-Bcrypt extension of the app
+    rounds : int
+        bcrypt cost factor of the new hashes (log2 of the iterations)
+    workers : int
+        Number of hashing threads
+    executor : ThreadPoolExecutor
+        Hashing threads, None to hash in the calling thread
+    slots : BoundedSemaphore
+        Running and waiting hashes
+    """
+
+    def __init__(self, bcrypt, rounds=12, workers=2, queue_size=64):
+        """init
+
+        Parameters
+        ----------
+        bcrypt : Bcrypt
+            Flask-Bcrypt extension of the app
+        rounds : int, optional
+            bcrypt cost factor of the new hashes
+        workers : int, optional
+            Number of hashing threads (0 hashes in the calling thread)
+        queue_size : int, optional
+            Number of hashes waiting for a worker before new ones are refused
+        """
+        self.bcrypt = bcrypt
+        self.rounds = rounds
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt') if workers > 0 else None
+        self.slots = threading.BoundedSemaphore(workers + queue_size) if workers > 0 else None
+
+    def run(self, function, *args):
+        """Run a hashing function in the pool and wait for its result"""
+        if self.executor is None:
+            return function(*args)
+        if not self.slots.acquire(blocking=False):
+            raise PasswordHasherBusy("Too many logins at the same time, please retry in a few seconds")
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            self.slots.release()
+
+    def hash(self, password):
+        """Hash a password with the configured cost factor
+
+        Parameters
+        ----------
+        password : str
+            The password
+
+        Returns
+        -------
+        str
+            The bcrypt hash
+        """
+        return self.run(self.bcrypt.generate_password_hash, password, self.rounds).decode('utf-8')
+
+    def hash_many(self, passwords):
+        """Hash passwords on all the workers (bulk imports)
+
+        The passwords are hashed by chunks of workers, each hash taking a
+        slot of the pool: the import waits for free slots instead of being
+        refused, and never takes more than workers of them, so that the
+        logins made meanwhile are queued as usual.
+
+        Parameters
+        ----------
+        passwords : list
+            The passwords
+
+        Returns
+        -------
+        list
+            The bcrypt hashes, in the same order
+        """
+        if self.executor is None:
+            return [self.hash(password) for password in passwords]
+        hashes = []
+        for start in range(0, len(passwords), self.workers):
+            chunk = passwords[start:start + self.workers]
+            acquired = 0
+            try:
+                for password in chunk:
+                    self.slots.acquire()
+                    acquired += 1
+                futures = [self.executor.submit(self.bcrypt.generate_password_hash, password, self.rounds) for password in chunk]
+                hashes.extend(future.result().decode('utf-8') for future in futures)
+            finally:
+                for slot in range(acquired):
+                    self.slots.release()
+        return hashes
+
+    def check(self, password_hash, password):
+        """Check a password against its hash
+
+        Parameters
+        ----------
+        password_hash : str
+            The stored bcrypt hash
+        password : str
+            The given password
+
+        Returns
+        -------
+        bool
+            True if the password matches
+        """
+        return self.run(self.bcrypt.check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """True if a hash was computed with another cost factor"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
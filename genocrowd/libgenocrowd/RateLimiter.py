@@ -0,0 +1,93 @@
+"""Contain the RateLimiter class"""
+
+import time
+from datetime import datetime
+
+from genocrowd.libgenocrowd.Params import Params
+
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class RateLimiter(Params):
+    """Limit the login attempts per IP address and per account
+
+    Attempts are counted in fixed windows of login_rate_window seconds,
+    shared by all the processes: each counter is a document of the
+    rate_limits collection ({_id: "<kind>:<value>:<window>", count,
+    expires}) incremented with one upsert, and removed by a TTL index when
+    its window ends. An IP address makes at most login_rate_ip attempts per
+    window (a whole classroom may share one address), an account at most
+    login_rate_account.
+    """
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.counters = self.app.mongo.db["rate_limits"]
+        self.window = max(1, self.settings.getint('genocrowd', 'login_rate_window', fallback=60))
+        self.limits = {
+            'ip': self.settings.getint('genocrowd', 'login_rate_ip', fallback=300),
+            'account': self.settings.getint('genocrowd', 'login_rate_account', fallback=10)
+        }
+
+    def ensure_indexes(self):
+        """Create the expiry (TTL) index"""
+        self.counters.create_index([('expires', ASCENDING)], expireAfterSeconds=0)
+
+    def hit(self, kind, value):
+        """Count an attempt
+
+        Parameters
+        ----------
+        kind : str
+            Kind of limit, one of the limits keys
+        value : str
+            Limited value (address, login)
+
+        Returns
+        -------
+        float
+            Seconds before the end of the window if the limit is exceeded,
+            else 0
+        """
+        now = time.time()
+        window = int(now // self.window)
+        end = (window + 1) * self.window
+        key = "{}:{}:{}".format(kind, value[:256], window)
+        update = {'$inc': {'count': 1}, '$setOnInsert': {'expires': datetime.utcfromtimestamp(end)}}
+        try:
+            counter = self.counters.find_one_and_update({'_id': key}, update, upsert=True, return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError:
+            # Another process inserted the counter at the same time
+            counter = self.counters.find_one_and_update({'_id': key}, update, upsert=True, return_document=ReturnDocument.AFTER)
+        if counter['count'] > self.limits[kind]:
+            return end - now
+        return 0
+
+    def check_login(self, address, login):
+        """Count a login attempt
+
+        Parameters
+        ----------
+        address : str
+            IP address of the client
+        login : str
+            Username or email
+
+        Returns
+        -------
+        int
+            Seconds to wait before the next attempt if a limit is exceeded,
+            else 0
+        """
+        retry_after = max(self.hit('ip', str(address)), self.hit('account', str(login).lower()))
+        return int(retry_after) + 1 if retry_after else 0
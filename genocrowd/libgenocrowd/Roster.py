@@ -0,0 +1,217 @@
+"""Contain the Roster class"""
+
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from bson.objectid import ObjectId
+
+from genocrowd.libapollo.ApolloUsers import ApolloUsers
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.Params import Params
+
+from validate_email import validate_email
+
+
+class Roster(Params):
+    """Import the students of a class at once
+
+    A roster is a CSV file whose header names the columns (username, email,
+    password, grade, and optionally role), or a JSON list of objects with
+    the same keys. Each row is checked, the passwords of the valid rows are
+    hashed on all the workers of the bcrypt pool, and the users are inserted
+    with one insert_many. Their Apollo user and organism are created later
+    by a provision_users job, apollo_provision_workers at a time: the
+    status of each user (pending, done or failed, with the error) is kept in
+    its apollo field, so that resuming the job only retries the users that
+    are not done.
+    """
+
+    FIELDS = ('username', 'email', 'password', 'grade')
+    ROLES = ('user', 'admin')
+
+    def __init__(self, app, session):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        session :
+            Genocrowd session, contains the user
+        """
+        Params.__init__(self, app, session)
+        self.users = self.app.mongo.db["users"]
+
+    @staticmethod
+    def parse(content):
+        """Read the rows of a roster
+
+        Parameters
+        ----------
+        content : str
+            CSV or JSON roster
+
+        Returns
+        -------
+        list
+            dict, one per row
+
+        Raises
+        ------
+        ValueError
+            If the roster can't be read
+        """
+        content = content.lstrip('\ufeff')
+        if content.lstrip()[:1] in ('[', '{'):
+            rows = json.loads(content)
+            if isinstance(rows, dict):
+                rows = rows.get('users')
+            if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                raise ValueError("A JSON roster is a list of users")
+            return rows
+        reader = csv.DictReader(io.StringIO(content))
+        missing = [field for field in Roster.FIELDS if field not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError("Missing columns in the roster: {}".format(", ".join(missing)))
+        return [{key: (value or '').strip() for key, value in row.items() if key} for row in reader]
+
+    def check_rows(self, rows):
+        """Check the rows of a roster
+
+        Parameters
+        ----------
+        rows : list
+            dict, one per row
+
+        Returns
+        -------
+        list
+            Status of each row: row (number, from 1), username, email,
+            status ('valid' or 'rejected') and errors
+        """
+        statuses = []
+        for number, row in enumerate(rows, 1):
+            errors = ["Missing {}".format(field) for field in self.FIELDS if not str(row.get(field) or '')]
+            if row.get('email') and not validate_email(str(row['email'])):
+                errors.append('Not a valid email')
+            if (row.get('role') or 'user') not in self.ROLES:
+                errors.append('Unknown role')
+            statuses.append({'row': number, 'username': row.get('username'), 'email': row.get('email'), 'errors': errors})
+
+        # Duplicates in the roster and in the database (one query)
+        usernames = [status['username'] for status in statuses if status['username']]
+        emails = [status['email'] for status in statuses if status['email']]
+        registered = {'username': set(), 'email': set()}
+        for user in self.users.find({'$or': [{'username': {'$in': usernames}}, {'email': {'$in': emails}}]}, projection={'username': 1, 'email': 1}):
+            registered['username'].add(user.get('username'))
+            registered['email'].add(user.get('email'))
+        seen = {'username': set(), 'email': set()}
+        for status in statuses:
+            for field, name in (('username', 'Username'), ('email', 'Email')):
+                value = status[field]
+                if not value:
+                    continue
+                if value in registered[field]:
+                    status['errors'].append('{} already registered'.format(name))
+                elif value in seen[field]:
+                    status['errors'].append('{} repeated in the roster'.format(name))
+                seen[field].add(value)
+            status['status'] = 'rejected' if status['errors'] else 'valid'
+        return statuses
+
+    def import_users(self, rows):
+        """Create the users of the valid rows of a roster
+
+        Parameters
+        ----------
+        rows : list
+            dict, one per row
+
+        Returns
+        -------
+        list
+            Status of each row: row, username, email, status ('created' or
+            'rejected'), errors, and _id of the created users
+        """
+        statuses = self.check_rows(rows)
+        valid = [(row, status) for row, status in zip(rows, statuses) if status['status'] == 'valid']
+        if not valid:
+            return statuses
+
+        hashes = self.app.password_hasher.hash_many([str(row['password']) for row, status in valid])
+        documents = []
+        for (row, status), password_hash in zip(valid, hashes):
+            document = LocalAuth.new_user(str(row['username']), str(row['email']), password_hash, str(row['grade']), row.get('role') or 'user')
+            document['apollo'] = {'status': 'pending'}
+            documents.append(document)
+        user_ids = self.users.insert_many(documents).inserted_ids
+        for (row, status), user_id in zip(valid, user_ids):
+            status['status'] = 'created'
+            status['_id'] = str(user_id)
+        self.log.info("Imported {} users from a roster".format(len(user_ids)))
+        return statuses
+
+    def provision_one(self, app, user):
+        """Create the Apollo user and organism of a user, and save its status
+
+        Parameters
+        ----------
+        app : Flask
+            flask app (not the current_app proxy, this runs in a thread)
+        user : dict
+            The user (username, email, password, isAdmin)
+
+        Returns
+        -------
+        dict
+            username, status ('done' or 'failed') and error
+        """
+        apollo = {'status': 'done'}
+        with app.app_context():
+            try:
+                ApolloUsers().add_user(user['username'], user['email'], user['password'], 'admin' if user.get('isAdmin') else 'user')
+            except Exception as e:
+                self.log.warning("Apollo provisioning of {} failed: {}".format(user['username'], e))
+                apollo = {'status': 'failed', 'error': str(e)}
+        self.users.update_one({'_id': user['_id']}, {'$set': {'apollo': apollo}})
+        return dict(apollo, username=user['username'])
+
+    def provision(self, user_ids, callback=None):
+        """Create the Apollo users and organisms of imported users, except
+        those already done, apollo_provision_workers at a time
+
+        Parameters
+        ----------
+        user_ids : list
+            Ids of the users
+        callback : function, optional
+            Called with the status of each user when it is provisioned
+
+        Returns
+        -------
+        list
+            Status of each provisioned user: username, status ('done' or
+            'failed') and error
+        """
+        workers = max(1, self.settings.getint('genocrowd', 'apollo_provision_workers', fallback=4))
+        users = list(self.users.find({
+            '_id': {'$in': [ObjectId(user_id) for user_id in user_ids]},
+            'apollo.status': {'$ne': 'done'}
+        }, projection={'username': 1, 'email': 1, 'password': 1, 'isAdmin': 1}))
+        app = self.app._get_current_object() if hasattr(self.app, '_get_current_object') else self.app
+        statuses = []
+        if users:
+            # Two listings instead of two lookups per user
+            try:
+                self.app.apollo_directory.refresh()
+            except Exception as e:
+                self.log.warning("Could not list the Apollo users and organisms: {}".format(e))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for status in executor.map(partial(self.provision_one, app), users):
+                statuses.append(status)
+                if callback:
+                    callback(status)
+        return statuses
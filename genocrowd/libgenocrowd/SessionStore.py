@@ -0,0 +1,126 @@
+"""Contain the SessionStore class"""
+
+import secrets
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from flask.sessions import SecureCookieSessionInterface
+
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+
+from pymongo import ASCENDING
+
+
+class SessionStore(SecureCookieSessionInterface):
+    """Keep the Flask sessions in MongoDB, with only their id in the cookie
+
+    The signed session cookie only holds a random session id. The sessions
+    collection maps it to the user id and to the other session values, and
+    expires after session_lifetime seconds (TTL index, extended while the
+    session is used). The session is read at each request, so that a logout
+    ends it in every process. session['user'] is rebuilt from the users
+    collection (session projection), through the per-process user cache of
+    the app (user_cache_ttl seconds): login_required and
+    admin_required see changes of the blocked and admin flags immediately
+    in the process that made them (LocalAuth invalidates the user), and in
+    the other workers after at most this delay.
+
+    A new session id is drawn when the user of a session changes (login,
+    logout), and the sessions of deleted users are anonymous.
+
+    Attributes
+    ----------
+    lifetime : int
+        Lifetime of an unused session, in seconds
+    cache : TTLCache
+        Users of the current process (app.user_cache)
+    """
+
+    def __init__(self, app):
+        """init
+
+        Parameters
+        ----------
+        app : Flask
+            flask app
+        """
+        self.app = app
+        self.sessions = app.mongo.db["sessions"]
+        self.users = app.mongo.db["users"]
+        self.lifetime = app.iniconfig.getint('genocrowd', 'session_lifetime', fallback=1209600)
+        self.cache = app.user_cache
+
+    def ensure_indexes(self):
+        """Create the expiry (TTL) and user indexes"""
+        self.sessions.create_index([('expires', ASCENDING)], expireAfterSeconds=0)
+        self.sessions.create_index([('user', ASCENDING)])
+
+    def load_record(self, sid):
+        """Get a stored session, None if it does not exist or expired (one
+        _id lookup, never cached)"""
+        return self.sessions.find_one({'_id': sid, 'expires': {'$gt': datetime.utcnow()}})
+
+    def load_user(self, user_id):
+        """Get a user (session projection), None if it does not exist"""
+        def load():
+            user = self.users.find_one({'_id': ObjectId(user_id)}, projection=LocalAuth.PROJECTIONS['session'])
+            if user:
+                user['_id'] = str(user['_id'])
+            return user
+        user = self.cache.get(LocalAuth.cache_key(user_id), load)
+        return dict(user) if user else None
+
+    def invalidate_user(self, user_id):
+        """Forget the cached copy of a user in this process"""
+        self.cache.invalidate(LocalAuth.cache_key(user_id))
+
+    def open_session(self, app, request):
+        """Load the session of the id in the cookie"""
+        cookie = super().open_session(app, request)
+        if cookie is None:
+            return None
+        sid = cookie.get('sid')
+        record = self.load_record(sid) if sid else None
+        if not record:
+            return self.session_class()
+
+        data = dict(record.get('data', {}))
+        user = self.load_user(record['user']) if record.get('user') else None
+        if user:
+            data['user'] = user
+        session = self.session_class(data)
+        session.sid = sid
+        session.user_id = record.get('user') if user else None
+        session.expires = record['expires']
+        return session
+
+    def save_session(self, app, session, response):
+        """Store a modified session, and set the cookie to its id"""
+        sid = getattr(session, 'sid', None)
+        if session.modified:
+            user = session.get('user')
+            user_id = str(user['_id']) if user else None
+            if sid and (not session or user_id != getattr(session, 'user_id', None)):
+                self.sessions.delete_one({'_id': sid})
+                sid = None
+            if session:
+                sid = sid or secrets.token_urlsafe(24)
+                self.sessions.replace_one({'_id': sid}, {
+                    'user': user_id,
+                    'data': {key: value for key, value in session.items() if key != 'user'},
+                    'expires': datetime.utcnow() + timedelta(seconds=self.lifetime)
+                }, upsert=True)
+                if user_id:
+                    self.invalidate_user(user_id)
+        elif sid and session.expires - datetime.utcnow() < timedelta(seconds=self.lifetime / 2):
+            # Extend a session used after half of its lifetime
+            self.sessions.update_one({'_id': sid}, {'$set': {'expires': datetime.utcnow() + timedelta(seconds=self.lifetime)}})
+
+        cookie = self.session_class({'sid': sid} if sid and session else None)
+        if session.permanent:
+            # Sets _permanent and marks the cookie as modified
+            cookie.permanent = True
+        cookie.accessed = session.accessed
+        cookie.modified = session.modified
+        super().save_session(app, cookie, response)
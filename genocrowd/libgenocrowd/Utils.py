@@ -40,6 +40,37 @@ class Utils():
                 sleep_time = sleep_time * 2
                 continue  # redo
 
+    @staticmethod
+    def wait_until(check, timeout, first_delay=0.05, max_delay=1):
+        """Call a function until it returns a true value, with an exponential
+        backoff between each try
+
+        Parameters
+        ----------
+        check : function
+            Function to call, without argument
+        timeout : float
+            Maximum time to wait, in seconds
+        first_delay : float, optional
+            Sleep time after the first try, doubled after each try
+        max_delay : float, optional
+            Maximum sleep time between two tries
+
+        Returns
+        -------
+        tuple
+            Last value returned by check, and the time waited in seconds
+        """
+        start = time.monotonic()
+        delay = first_delay
+        while True:
+            result = check()
+            elapsed = time.monotonic() - start
+            if result or elapsed >= timeout:
+                return result, elapsed
+            time.sleep(min(delay, max_delay, timeout - elapsed))
+            delay = delay * 2
+
     @staticmethod
     def is_valid_url(url):
         """Test if a string an url
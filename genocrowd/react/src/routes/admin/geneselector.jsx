@@ -11,7 +11,8 @@ export default class GeneBoard extends Component {
   constructor(props) {
     super(props);
     this.utils = new Utils();
-    this.state = { isLoading: true, error: false, errorMessage: "", genes: [] };
+    this.state = { isLoading: true, error: false, errorMessage: "", genes: [], next: null };
+    this.loadGenes = this.loadGenes.bind(this);
     this.handleChangeAnnotable = this.handleChangeAnnotable.bind(this);
     this.handleRemoveGene = this.handleRemoveGene.bind(this);
     this.handleRemoveAllGenes = this.handleRemoveAllGenes.bind(this);
@@ -105,48 +106,55 @@ export default class GeneBoard extends Component {
 
   handleRemoveAllGenes(){
     let requestUrl = "api/data/removeallgenes";
+    let data = { all: true };
 
+    axios
+      .post(requestUrl, data, {
+        baseURL: this.props.config.proxyPath,
+        cancelToken: new axios.CancelToken((c) => {
+          this.cancelRequest = c;
+        }),
+      })
+      .then((response) => {
+        console.log(requestUrl, response.data);
+      })
+  }
+
+  loadGenes(cursor) {
+    let requestUrl = "/api/data/getgenes";
     axios
       .get(requestUrl, {
         baseURL: this.props.config.proxyPath,
+        params: cursor ? { cursor: cursor } : {},
         cancelToken: new axios.CancelToken((c) => {
           this.cancelRequest = c;
         }),
       })
       .then((response) => {
         console.log(requestUrl, response.data);
+        this.setState({
+          isLoading: false,
+          error: response.data.error,
+          errorMessage: response.data.errorMessage,
+          genes: this.state.genes.concat(response.data.genes),
+          next: response.data.next,
+        });
       })
+      .catch((error) => {
+        console.log(error, error.response.data.errorMessage);
+        this.setState({
+          error: true,
+          errorMessage: error.response.data.errorMessage,
+          status: error.response.status,
+          success: false,
+        });
+      });
   }
 
   componentDidMount() {
     if (!this.props.waitForStart) {
-      let requestUrl = "/api/data/getgenes";
       console.log("mounting");
-      axios
-        .get(requestUrl, {
-          baseURL: this.props.config.proxyPath,
-          cancelToken: new axios.CancelToken((c) => {
-            this.cancelRequest = c;
-          }),
-        })
-        .then((response) => {
-          console.log(requestUrl, response.data);
-          this.setState({
-            isLoading: false,
-            error: response.data.error,
-            errorMessage: response.data.errorMessage,
-            genes: response.data.genes,
-          });
-        })
-        .catch((error) => {
-          console.log(error, error.response.data.errorMessage);
-          this.setState({
-            error: true,
-            errorMessage: error.response.data.errorMessage,
-            status: error.response.status,
-            success: !response.data.error,
-          });
-        });
+      this.loadGenes(null);
     }
   }
 
@@ -260,6 +268,11 @@ export default class GeneBoard extends Component {
               autoSelectText: true,
             })}
           />
+          {this.state.next ? (
+            <Button color="secondary" onClick={() => this.loadGenes(this.state.next)}>
+              Load more
+            </Button>
+          ) : null}
         </div>
       </div>
     );
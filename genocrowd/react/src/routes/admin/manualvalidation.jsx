@@ -18,7 +18,9 @@ export default class Validation extends Component {
 			finished: false,
 			gene: "",
 			answers: [],
+			next: null,
 	})
+		this.loadAnswers = this.loadAnswers.bind(this)
 		this.setvalidated = this.setvalidated.bind(this)
 		this.handleChangeValidated = this.handleChangeValidated.bind(this)
 	}
@@ -157,10 +159,15 @@ export default class Validation extends Component {
 				})
 			})
 		
+		this.loadAnswers(null)
+	}
+
+	loadAnswers (cursor) {
 		let requestUrl='api/data/getallanswers'
 		axios
 			.get(requestUrl, {
 				baseURL: this.props.config.proxyPath,
+				params: cursor ? { cursor: cursor } : {},
 				cancelToken: new axios.CancelToken((c) => {
 					this.cancelRequest = c;
 				}),
@@ -170,10 +177,10 @@ export default class Validation extends Component {
 				this.setState({
 					error: response.data.error,
 					errorMessage: response.data.errorMessage,
-					answers: response.data.answer
+					answers: this.state.answers.concat(response.data.answer),
+					next: response.data.next
 				})
 			})
-
 	}
 
 
@@ -262,6 +269,11 @@ export default class Validation extends Component {
 							})}
 						/>
 					</Row>
+					{this.state.next ? (
+						<Row>
+							<Button color="secondary" onClick={() => this.loadAnswers(this.state.next)}>Load more</Button>
+						</Row>
+					) : null}
 				</div>
 		)
 		}
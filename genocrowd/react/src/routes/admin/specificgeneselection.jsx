@@ -14,6 +14,8 @@ export default class SpecificGeneSelection extends Component {
       errorMessage: "",
       selectedFile: null,
       priority:0,
+      dataset: "",
+      retire: false,
     };
     this.handleSubmit = this.handleSubmit.bind(this);
     this.onChangeHandler = this.onChangeHandler.bind(this);
@@ -26,6 +28,8 @@ export default class SpecificGeneSelection extends Component {
     const data = new FormData();
     data.append("file", this.state.selectedFile);
     data.append("priority", this.state.priority);
+    data.append("dataset", this.state.dataset);
+    data.append("retire", this.state.retire);
 
     axios
       .post(requestUrl, data, {
@@ -84,6 +88,21 @@ export default class SpecificGeneSelection extends Component {
             id="priority"
             onChange = {(e)=> this.handleChange(e)}
           />
+          <Label for="dataset">Dataset (file name by default), genes already imported in this dataset are only updated if they changed</Label>
+          <Input
+            type="text"
+            name="dataset"
+            id="dataset"
+            onChange = {(e)=> this.handleChange(e)}
+          />
+          <Label check>
+            <Input
+              type="checkbox"
+              name="retire"
+              onChange={(e) => this.setState({ retire: e.target.checked })}
+            />
+            Retire the genes of the dataset missing from the file
+          </Label>
           <br></br>
           Import the GFF file associated to the gene you wish to annotate:
           <Button
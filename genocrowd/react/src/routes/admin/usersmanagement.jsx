@@ -131,61 +131,107 @@ export default class Users extends Component {
   componentDidMount() {
     console.log("mount")
     if (!this.props.waitForStart) {
-      let requestUrl = '/api/admin/getusers';
-      let requestUrl_getgroups = '/api/admin/getgroups';
+      this.loadUsersAndGroups()
+    };
+  }
+
+  loadUsersAndGroups() {
+    let requestUrl = '/api/admin/getusers';
+    let requestUrl_getgroups = '/api/admin/getgroups';
+
+    axios
+      .get(requestUrl, {
+        baseURL: this.props.config.proxyPath,
+        cancelToken: new axios.CancelToken((c) => {
+          this.cancelRequest = c;
+        }),
+      })
+      .then((response) => {
+        console.log(requestUrl, response.data);
+        this.setState({
+          isLoading: false,
+          error: response.data.error,
+          errorMessage: response.data.errorMessage,
+          users: response.data.users,
+        });
+      })
+      .catch((error) => {
+        console.log(error, error.response.data.errorMessage);
+        this.setState({
+          error: true,
+          errorMessage: error.response.data.errorMessage,
+          status: error.response.status,
+          success: false,
+        });
+      });
+    axios
+      .get(requestUrl_getgroups, {
+        baseURL: this.props.config.proxyPath,
+        cancelToken: new axios.CancelToken((c) => {
+          this.cancelRequest = c;
+        }),
+      })
+      .then((response_getgroups) => {
+        console.log(requestUrl_getgroups, response_getgroups.data);
+        this.setState({
+          isLoading: false,
+          error: response_getgroups.data.error,
+          errorMessage: response_getgroups.data.errorMessage,
+          groups: response_getgroups.data.groups,
+        });
+      });
+  }
+
+  componentWillUnmount() {
+    clearTimeout(this.jobTimeout);
+    if (!this.props.waitForStart) {
+      this.cancelRequest();
+    }
+  }
 
+  waitForJob(job) {
+    // The groups are assigned by a background job: poll it until it is done,
+    // then reload the users and groups
+    if (job.status == "success") {
+      this.setState({
+        gradeList: job.result.gradeList
+      })
+      this.loadUsersAndGroups()
+      return
+    }
+    if (job.status == "failure") {
+      this.setState({
+        error: true,
+        errorMessage: job.errors.join(", ")
+      })
+      return
+    }
+    let requestUrl = '/api/jobs/' + job._id
+    this.jobTimeout = setTimeout(() => {
       axios
         .get(requestUrl, {
           baseURL: this.props.config.proxyPath,
           cancelToken: new axios.CancelToken((c) => {
-            this.cancelRequest = c;
-          }),
+            this.cancelRequest = c
+          })
         })
-        .then((response) => {
-          console.log(requestUrl, response.data);
-          this.setState({
-            isLoading: false,
-            error: response.data.error,
-            errorMessage: response.data.errorMessage,
-            users: response.data.users,
-          });
+        .then(response => {
+          this.waitForJob(response.data.job)
         })
-        .catch((error) => {
-          console.log(error, error.response.data.errorMessage);
+        .catch(error => {
           this.setState({
             error: true,
             errorMessage: error.response.data.errorMessage,
             status: error.response.status,
-            success: !response.data.error,
-          });
-        });
-      axios
-        .get(requestUrl_getgroups, {
-          baseURL: this.props.config.proxyPath,
-          cancelToken: new axios.CancelToken((c) => {
-            this.cancelRequest = c;
-          }),
+            success: false
+          })
         })
-        .then((response_getgroups) => {
-          console.log(requestUrl_getgroups, response_getgroups.data);
-          this.setState({
-            isLoading: false,
-            error: response_getgroups.data.error,
-            errorMessage: response_getgroups.data.errorMessage,
-            groups: response_getgroups.data.groups,
-          });
-        });
-    };
-  }
-
-  componentWillUnmount() {
-    if (!this.props.waitForStart) {
-      this.cancelRequest();
-    }
+    }, 1000)
   }
 
   handleSubmit() {
     let requestUrl = 'api/data/setgroupsamount'
+    let requestUrl2 = '/api/admin/setgroup'
     let data = {
     	newNumber: this.state.newNumber,
       groupsAmount: this.state.newNumber
@@ -205,38 +251,28 @@ export default class Users extends Component {
           errorMessage: response.data.errorMessage,
           groupsAmount: response.data.groupsAmount
         })
-      })
-      .catch(error => {
-        this.setState({
-          error: true,
-          errorMessage: error.response.data.errorMessage,
-          status : errorMessage,
-          success: !response.data.error
-        })
-      })
-
-    let requestUrl2 = '/api/admin/setgroup'
-    axios
-      .post(requestUrl2, data, {
-        baseURL: this.props.config.proxyPath,
-        cancelToken: new axios.CancelToken((c) => {
-          this.cancelRequest = c
+        // Students are assigned once the groups exist
+        return axios.post(requestUrl2, data, {
+          baseURL: this.props.config.proxyPath,
+          cancelToken: new axios.CancelToken((c) => {
+            this.cancelRequest = c
+          })
         })
       })
       .then(response2 => {
-        console.log(requestUrl2, response2.data.gradeList)
+        console.log(requestUrl2, response2.data)
         this.setState({
           error: response2.data.error,
-          errorMessage: response2.data.errorMessage,
-          gradeList: response2.data.gradeList
+          errorMessage: response2.data.errorMessage
         })
+        this.waitForJob(response2.data.job)
       })
       .catch(error => {
         this.setState({
           error: true,
-          errorMessage: error.response2.data.errorMessage,
-          status: errorMessage,
-          success: !response2.data.error
+          errorMessage: error.response.data.errorMessage,
+          status: error.response.status,
+          success: false
         })
       })
   }
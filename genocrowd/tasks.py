@@ -0,0 +1,27 @@
+"""Celery tasks
+
+The worker is started with `celery -A genocrowd.tasks.celery worker`. The
+config file is read from the GENOCROWD_CONFIG environment variable
+(default: config/genocrowd.ini).
+"""
+
+import os
+
+from genocrowd.app import create_app, create_celery
+from genocrowd.libgenocrowd.JobManager import JobManager
+
+
+app = create_app(config=os.environ.get('GENOCROWD_CONFIG', 'config/genocrowd.ini'))
+celery = create_celery(app)
+
+
+@celery.task(name='run_job')
+def run_job(job_id):
+    """Run a background job
+
+    Parameters
+    ----------
+    job_id : str
+        Id of the job, in the jobs collection
+    """
+    JobManager(app, None).run(job_id)
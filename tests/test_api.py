@@ -60,7 +60,6 @@ class TestApi(GenocrowdTestCase):
         expected_config_jdoe["user"] = {
             '_id': response.json['config']['user']['_id'],
             'username': "jdoe",
-            "password": response.json['config']['user']['password'],
             'email': "jdoe@genocrowd.org",
             'isAdmin': True,
             'blocked': False,
@@ -102,7 +101,6 @@ class TestApi(GenocrowdTestCase):
         expected_config_jsmith["user"] = {
             '_id': response.json['config']['user']['_id'],
             'username': "jsmith",
-            "password": response.json['config']['user']['password'],
             'email': "jsmith@genocrowd.org",
             'isAdmin': False,
             'blocked': False,
@@ -202,6 +202,7 @@ class TestApiAuth(GenocrowdTestCase):
         assert response.status_code == 200
         assert response.json["error"] is False
         assert response.json["user"]["username"] == ok_inputs_username["login"]
+        assert "password" not in response.json["user"]
 
         response = client.client.post('/api/auth/login', json=ok_inputs_email)
 
@@ -323,7 +324,7 @@ class TestApiAuth(GenocrowdTestCase):
         assert response.status_code == 200
         assert response.json["error"] is True
         assert response.json["user"]["username"] == "jdoe"
-        assert response.json["user"]["password"] != empty_data["newPassword"]
+        assert "password" not in response.json["user"]
 
     def test_update_password_bad(self, client):
         """test /api/auth/password"""
@@ -340,7 +341,7 @@ class TestApiAuth(GenocrowdTestCase):
         assert response.status_code == 200
         assert response.json["error"] is True
         assert response.json["user"]["username"] == "jdoe"
-        assert response.json["user"]["password"] != unidentical_passwords_data['newPassword']
+        assert "password" not in response.json["user"]
 
     def test_logout(self, client):
         """test /api/auth/logout route"""
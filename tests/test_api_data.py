@@ -1,3 +1,7 @@
+import io
+
+from genocrowd.libgenocrowd.Leaderboard import Leaderboard
+
 from . import GenocrowdTestCase
 
 
@@ -34,5 +38,156 @@ class TestApiData(GenocrowdTestCase):
         assert response.json["error"] is False and response2.json["error"] is False and response3.json["error"] is False
         """Test user in the correct group
             test if jsmith group is group 1 and
-            test if jsmith is the first student in group 1 list"""
-        assert response2.json["users"][1]["group"] == 1 and response2.json["users"][1]["_id"] == response3.json["groups"][0]["student"][0]["_id"]
+            test if jsmith is the first student in group 1 list (groups store user ids)"""
+        assert response2.json["users"][1]["group"] == 1 and response2.json["users"][1]["_id"] == response3.json["groups"][0]["student"][0]
+        """Password hashes and annotations are not listed"""
+        assert all("password" not in user and "current_annotation" not in user for user in response2.json["users"])
+
+        """The regrouping job returns the grades, invalid amounts are refused"""
+        assert response.json["job"]["result"]["gradeList"]
+        for invalid in ({"groupsAmount": 0}, {"groupsAmount": -1}, {"groupsAmount": "two"}, {}):
+            response = client.client.post('/api/admin/setgroup', json=invalid)
+            assert response.status_code == 400 and response.json["error"] is True
+
+    def test_top_annotation(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        client.client.post('api/data/setgroupsamount', json={"newNumber": 2})
+        client.app.mongo.db.users.update_one({"username": "jsmith"}, {"$set": {"group": 1, "total_annotation": 5}})
+        client.app.leaderboard_cache.invalidate()
+        client.log_user("jsmith")
+
+        response = client.client.get('/api/data/gettopannotation?top=5')
+        assert response.status_code == 200
+        assert response.json["top_users"] == [{"username": "jsmith", "score": 5}]
+        assert response.json["top_groups"][0] == {"name": "", "number": 1, "score": 5}
+        assert response.json["me"] == {"username": "jsmith", "score": 5, "rank": 1}
+
+        """Saving an answer updates the cached leaderboard"""
+        Leaderboard(client.app, None).record_answer("jsmith")
+        response = client.client.get('/api/data/gettopannotation')
+        assert response.json["top_users"][0]["score"] == 6
+
+        response = client.client.get('/api/data/gettopannotation?top=abc')
+        assert response.status_code == 400
+
+    def test_upload_genes(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        client.app.mongo.db["genes.files"].drop()
+        client.app.mongo.db["genes.chunks"].drop()
+        client.app.mongo.db["difficulty"].drop()
+
+        with open("test-data/merlin.gff", "rb") as gff:
+            response = client.client.post('/api/data/uploadgenes', data={"file": (gff, "merlin.gff"), "priority": "2"})
+        assert response.status_code == 200
+        assert response.json["error"] is False
+        job = response.json["job"]
+        assert job["status"] == "success"
+        assert job["progress"] == {"parsed": 6, "stored": 6, "added": 6, "changed": 0, "unchanged": 0, "errors": 0}
+
+        gene = client.app.mongo.db["genes.files"].find_one({"_id": "Merlin_5"})
+        assert gene["start"] == 3065 and gene["end"] == 4796 and gene["priority"] == 2
+
+        """Test job status"""
+        response = client.client.get('/api/jobs/{}'.format(job["_id"]))
+        assert response.status_code == 200
+        assert response.json["job"]["result"] == {"parsed": 6, "stored": 6, "added": 6, "changed": 0, "unchanged": 0, "retired": 0, "levels": [2, 2, 2]}
+
+        """Test re-upload of the same genes: nothing is written"""
+        with open("test-data/merlin.gff", "rb") as gff:
+            response = client.client.post('/api/data/uploadgenes', data={"file": (gff, "merlin.gff"), "priority": "2"})
+        assert response.json["job"]["progress"]["stored"] == 0
+        assert response.json["job"]["progress"]["unchanged"] == 6
+        assert response.json["job"]["progress"]["errors"] == 0
+
+    def test_upload_new_release(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        genes = client.app.mongo.db["genes.files"]
+        genes.drop()
+        client.app.mongo.db["genes.chunks"].drop()
+        client.app.mongo.db["batches"].drop()
+
+        with open("test-data/merlin.gff", "rb") as gff:
+            release = gff.read()
+        client.client.post('/api/data/uploadgenes', data={"file": (io.BytesIO(release), "merlin.gff"), "dataset": "merlin"})
+        genes.update_one({"_id": "Merlin_2"}, {"$set": {"done": 1, "annotators": ["jsmith"]}})
+
+        """Merlin_2 moves, Merlin_42 is removed"""
+        lines = [line for line in release.decode().splitlines(True) if "Merlin_42" not in line]
+        release = "".join(lines).replace("\t752\t1039\t", "\t762\t1039\t").encode()
+        response = client.client.post('/api/data/uploadgenes', data={"file": (io.BytesIO(release), "merlin-v2.gff"), "dataset": "merlin", "retire": "true"})
+        result = response.json["job"]["result"]
+        assert (result["added"], result["changed"], result["unchanged"], result["retired"]) == (0, 1, 4, 1)
+
+        gene = genes.find_one({"_id": "Merlin_2"})
+        assert gene["start"] == 761 and gene["upload"] == response.json["job"]["_id"]
+        assert gene["done"] == 1 and gene["annotators"] == ["jsmith"]
+        assert genes.find_one({"_id": "Merlin_42"})["isAnnotable"] is False
+
+        response = client.client.get('/api/data/getbatches?dataset=merlin')
+        assert [batch["filename"] for batch in response.json["batches"]] == ["merlin-v2.gff", "merlin.gff"]
+        assert response.json["batches"][0]["counts"]["changed"] == 1
+
+    def test_remove_genes(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        genes = client.app.mongo.db["genes.files"]
+        genes.drop()
+        genes.insert_many([{"_id": "gene-%d" % number, "chromosome": "chr%d" % (number % 2), "priority": number % 3, "upload": "u%d" % (number // 5)} for number in range(10)])
+
+        response = client.client.post('/api/data/removeallgenes', json={"chromosome": "chr0", "priority": 0})
+        assert response.status_code == 200
+        assert response.json["count"] == 2 and response.json["result"]["removed"] == 2
+        assert response.json["job"] is None
+
+        """Large removals run in a job"""
+        client.app.iniconfig.set('genocrowd', 'remove_genes_sync_max', '1')
+        try:
+            response = client.client.post('/api/data/removeallgenes?upload=u1')
+        finally:
+            client.app.iniconfig.set('genocrowd', 'remove_genes_sync_max', '10000')
+        assert response.json["count"] == 4
+        assert response.json["job"]["status"] == "success" and response.json["job"]["result"]["removed"] == 4
+        assert genes.count_documents({}) == 4
+
+        response = client.client.post('/api/data/removeallgenes?priority=high')
+        assert response.status_code == 400
+
+        """Unknown or empty filters, and no filter, remove nothing"""
+        for query in ({"chromsome": "chr0"}, {"chromosome": ""}, {"filters": {"chromosome": "chr0"}}, {}):
+            response = client.client.post('/api/data/removeallgenes', json=query)
+            assert response.status_code == 400
+        assert client.client.post('/api/data/removeallgenes', query_string={"chromosome": " "}).status_code == 400
+        client.client.get('/api/data/removeallgenes?upload=u0')
+        assert genes.count_documents({}) == 4
+
+        """Leases and annotations of the removed genes are removed"""
+        db = client.app.mongo.db
+        db["leases"].drop()
+        db["leases"].insert_one({"gene": "gene-1", "username": "jsmith"})
+        db["users"].update_one({"username": "jsmith"}, {"$set": {"current_annotation": {"_id": "gene-1"}, "next_annotation": {"_id": "gene-3"}}})
+        db["users"].update_one({"username": "jdoe"}, {"$set": {"current_annotation": {"_id": "other"}}})
+        response = client.client.post('/api/data/removeallgenes', json={"all": True})
+        assert response.json["result"]["removed"] == 4 and response.json["result"]["leases"] == 1
+        assert genes.count_documents({}) == 0
+        jsmith = db["users"].find_one({"username": "jsmith"})
+        assert jsmith["current_annotation"] is None and jsmith["next_annotation"] is None
+
+    def test_remove_genes_leases(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["leases"].drop()
+        db["genes.files"].insert_many([{"_id": "gene-%d" % number, "chromosome": "chr%d" % (number % 2)} for number in range(4)])
+        db["leases"].insert_many([{"gene": "gene-0", "username": "jsmith"}, {"gene": "gene-1", "username": "jdoe"}])
+        db["users"].update_one({"username": "jsmith"}, {"$set": {"current_annotation": {"_id": "gene-0"}}})
+        db["users"].update_one({"username": "jdoe"}, {"$set": {"current_annotation": {"_id": "gene-1"}}})
+
+        response = client.client.post('/api/data/removeallgenes', json={"chromosome": "chr0"})
+        assert response.json["result"]["leases"] == 1
+        assert [lease["gene"] for lease in db["leases"].find()] == ["gene-1"]
+        assert db["users"].find_one({"username": "jsmith"})["current_annotation"] is None
+        assert db["users"].find_one({"username": "jdoe"})["current_annotation"] == {"_id": "gene-1"}
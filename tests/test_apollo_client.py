@@ -0,0 +1,120 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from genocrowd.libapollo.ApolloClient import ApolloClient
+from genocrowd.libgenocrowd.Metrics import Metrics
+
+import pytest
+
+from . import GenocrowdTestCase
+
+
+class StubServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling each (keep-alive) connection in a thread"""
+
+    daemon_threads = True
+
+
+class StubApollo(BaseHTTPRequestHandler):
+    """Minimal Apollo server answering organism/findAllOrganisms, and
+    annotationEditor/getFeatures (without gene1 for the first `loading`
+    calls)"""
+
+    protocol_version = "HTTP/1.1"
+    connections = set()
+    requests = []
+    loading = 0
+
+    def do_POST(self):
+        StubApollo.connections.add(self.client_address)
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StubApollo.requests.append((self.path, data))
+        if self.path == "/organism/findAllOrganisms":
+            body = json.dumps([{"id": 1, "commonName": "puceron_jdoe@genocrowd.org"}]).encode()
+            self.send_response(200)
+        elif self.path == "/annotationEditor/getFeatures":
+            features = [{"name": "other", "uniquename": "0001"}]
+            if StubApollo.loading <= 0:
+                features.append({"name": "gene1", "uniquename": "0002"})
+            StubApollo.loading -= 1
+            body = json.dumps({"features": features}).encode()
+            self.send_response(200)
+        else:
+            body = b"not found"
+            self.send_response(404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_apollo():
+    StubApollo.connections = set()
+    StubApollo.requests = []
+    StubApollo.loading = 0
+    server = StubServer(("127.0.0.1", 0), StubApollo)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+class TestApolloClient(GenocrowdTestCase):
+    """Test the pooled Apollo client against a stub server"""
+
+    def test_keep_alive(self, stub_apollo):
+        metrics = Metrics()
+        apollo = ApolloClient(stub_apollo, "admin@annotons", "secret", max_connections=2, timeout=5, timings=metrics)
+
+        for i in range(5):
+            orgs = apollo.organisms.get_organisms()
+        assert orgs == [{"id": 1, "commonName": "puceron_jdoe@genocrowd.org"}]
+
+        """Credentials are sent, one connection is reused"""
+        assert StubApollo.requests[0][1]["username"] == "admin@annotons"
+        assert len(StubApollo.connections) == 1
+
+        """Latencies are recorded"""
+        summary = metrics.summary()
+        assert summary["apollo/organism/findAllOrganisms"]["count"] == 5
+
+    def test_error(self, stub_apollo):
+        apollo = ApolloClient(stub_apollo, "admin@annotons", "secret")
+
+        with pytest.raises(Exception, match="Unexpected response from apollo 404"):
+            apollo.organisms.delete_features("puceron_jdoe@genocrowd.org")
+
+    def test_wait_for_features(self, stub_apollo):
+        metrics = Metrics()
+        apollo = ApolloClient(stub_apollo, "admin@annotons", "secret", ready_timeout=5, timings=metrics)
+
+        """Returns as soon as the gene is visible, other features do not count"""
+        StubApollo.loading = 2
+        ready, waited = apollo.wait_for_features("puceron_jdoe@genocrowd.org", "chr1", ["gene1"])
+        assert ready
+        assert waited < 1
+        assert metrics.summary()["apollo/annotationEditor/getFeatures"]["count"] == 3
+        assert metrics.summary()["apollo/wait_for_features"]["count"] == 1
+
+        """Gives up after the deadline"""
+        StubApollo.loading = 1000
+        apollo.ready_timeout = 0.2
+        ready, waited = apollo.wait_for_features("puceron_jdoe@genocrowd.org", "chr1", ["gene1"])
+        assert not ready
+        assert 0.2 <= waited < 1
+
+    def test_feature_names(self):
+        gff = "".join([
+            "##gff-version 3\n",
+            "chr1\t.\tgene\t1\t1000\t.\t+\t.\tID=g1;Name=Merlin\n",
+            "chr1\t.\tmRNA\t1\t1000\t.\t+\t.\tID=m1;Parent=g1;Name=Merlin-RA\n",
+            "chr1\t.\tgene\t2000\t3000\t.\t+\t.\tID=g2\n",
+        ])
+        assert ApolloClient.feature_names(gff) == {"g1", "Merlin", "g2"}
@@ -0,0 +1,134 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler
+
+from genocrowd.libapollo.ApolloClient import ApolloClient
+from genocrowd.libapollo.ApolloDirectory import ApolloDirectory
+from genocrowd.libapollo.ApolloUsers import ApolloUsers
+
+import pytest
+
+from . import GenocrowdTestCase
+from .test_apollo_client import StubServer
+
+
+class StubDirectory(BaseHTTPRequestHandler):
+    """Minimal Apollo server keeping users and organisms"""
+
+    protocol_version = "HTTP/1.1"
+    users = {}
+    organisms = {}
+    requests = []
+
+    def answer(self, data):
+        if self.path == "/user/loadUsers":
+            if 'userId' in data:
+                return [StubDirectory.users[data['userId']]] if data['userId'] in StubDirectory.users else []
+            return list(StubDirectory.users.values())
+        if self.path in ("/user/createUser", "/user/updateUser"):
+            StubDirectory.users[data['email']] = {'username': data['email'], 'firstName': data['firstName']}
+            return StubDirectory.users[data['email']]
+        if self.path == "/organism/findAllOrganisms":
+            if 'organism' in data:
+                return [StubDirectory.organisms[data['organism']]] if data['organism'] in StubDirectory.organisms else []
+            return list(StubDirectory.organisms.values())
+        if self.path == "/organism/addOrganism":
+            StubDirectory.organisms[data['commonName']] = {'id': len(StubDirectory.organisms) + 1, 'commonName': data['commonName']}
+            return StubDirectory.organisms[data['commonName']]
+        if self.path == "/user/updateOrganismPermission":
+            return {}
+        if self.path == "/user/deleteUser":
+            StubDirectory.users.pop(data['userToDelete'], None)
+            return {}
+        if self.path == "/organism/deleteOrganism":
+            StubDirectory.organisms = {name: organism for name, organism in StubDirectory.organisms.items() if organism['id'] != data['id']}
+            return {}
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        StubDirectory.requests.append((self.path, data))
+        body = json.dumps(self.answer(data)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_directory():
+    StubDirectory.users = {"student%d@genocrowd.org" % number: {'username': "student%d@genocrowd.org" % number} for number in range(50)}
+    StubDirectory.organisms = {}
+    StubDirectory.requests = []
+    server = StubServer(("127.0.0.1", 0), StubDirectory)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://127.0.0.1:{}".format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+def paths():
+    """Paths of the requests made since the last call, with whether they
+    list all the users or organisms"""
+    requests = [(path, path in ("/user/loadUsers", "/organism/findAllOrganisms") and not ('userId' in data or 'organism' in data))
+                for path, data in StubDirectory.requests]
+    StubDirectory.requests = []
+    return requests
+
+
+class TestApolloDirectory(GenocrowdTestCase):
+    """Test the Apollo directory against a stub server"""
+
+    def test_lookups(self, stub_directory):
+        directory = ApolloDirectory(ApolloClient(stub_directory, "admin@annotons", "secret"))
+
+        """Missing entries are fetched alone, then cached"""
+        assert directory.user("student1@genocrowd.org") == {'username': "student1@genocrowd.org"}
+        assert directory.user("student1@genocrowd.org") == {'username': "student1@genocrowd.org"}
+        assert directory.user("unknown@genocrowd.org") is None
+        assert directory.organism("puceron_student1@genocrowd.org") is None
+        assert paths() == [("/user/loadUsers", False), ("/user/loadUsers", False), ("/organism/findAllOrganisms", False)]
+
+        """After a refresh, absent names are known without a request"""
+        directory.refresh()
+        assert paths() == [("/user/loadUsers", True), ("/organism/findAllOrganisms", True)]
+        assert directory.user("student42@genocrowd.org")
+        assert directory.user("unknown@genocrowd.org") is None
+        assert paths() == []
+
+        """Forgotten entries are fetched again"""
+        directory.forget_user("student42@genocrowd.org")
+        assert directory.user("student42@genocrowd.org")
+        assert directory.user("unknown@genocrowd.org") is None
+        assert paths() == [("/user/loadUsers", False), ("/user/loadUsers", False)]
+
+        """Expired entries are fetched again"""
+        directory.ttl = 0
+        directory.add_user("new@genocrowd.org")
+        assert directory.user("new@genocrowd.org") is None
+        assert paths() == [("/user/loadUsers", False)]
+
+    def test_add_user(self, client, stub_directory):
+        client.app.apollo = ApolloClient(stub_directory, "admin@annotons", "secret", ready_timeout=5)
+        client.app.apollo_directory = ApolloDirectory(client.app.apollo)
+
+        """Creating a user never lists all the users or organisms"""
+        ApolloUsers().add_user("newbie", "newbie@genocrowd.org", "hash")
+        assert paths() == [("/user/loadUsers", False), ("/user/createUser", False), ("/organism/findAllOrganisms", False),
+                           ("/organism/addOrganism", False), ("/organism/findAllOrganisms", False), ("/user/updateOrganismPermission", False)]
+        assert "puceron_newbie@genocrowd.org" in StubDirectory.organisms
+
+        """Adding it again only updates it"""
+        ApolloUsers().add_user("newbie", "newbie@genocrowd.org", "hash")
+        assert paths() == [("/user/updateUser", False)]
+
+        """Deleting it forgets it, so that it is created again"""
+        assert ApolloUsers().delete_user("newbie@genocrowd.org")
+        assert paths() == [("/organism/deleteOrganism", False), ("/user/deleteUser", False)]
+        assert "newbie@genocrowd.org" not in StubDirectory.users and not StubDirectory.organisms
+        ApolloUsers().add_user("newbie", "newbie@genocrowd.org", "hash")
+        assert ("/user/createUser", False) in paths()
@@ -0,0 +1,60 @@
+import threading
+import time
+
+from genocrowd.libgenocrowd.Cache import TTLCache
+
+from . import GenocrowdTestCase
+
+
+class TestCache(GenocrowdTestCase):
+    """Test the in-process TTL cache"""
+
+    def test_ttl(self):
+        cache = TTLCache(0.1)
+        calls = []
+        assert cache.get("key", lambda: calls.append(1) or len(calls)) == 1
+        assert cache.get("key", lambda: calls.append(1) or len(calls)) == 1
+        time.sleep(0.15)
+        assert cache.get("key", lambda: calls.append(1) or len(calls)) == 2
+
+        """Invalidated values are computed again"""
+        cache.invalidate("key")
+        assert cache.get("key", lambda: calls.append(1) or len(calls)) == 3
+        cache.invalidate()
+        assert cache.get("key", lambda: calls.append(1) or len(calls)) == 4
+
+    def test_single_flight(self):
+        cache = TTLCache(60)
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get("key", load))) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert results == ["value"] * 10
+        assert len(calls) == 1
+
+    def test_invalidate_while_loading(self):
+        cache = TTLCache(60)
+        started = threading.Event()
+
+        def load():
+            started.set()
+            time.sleep(0.1)
+            return "old"
+
+        thread = threading.Thread(target=cache.get, args=("key", load))
+        thread.start()
+        started.wait()
+        cache.invalidate("key")
+        thread.join()
+
+        """The value computed before the invalidation is not kept"""
+        assert cache.get("key", lambda: "new") == "new"
@@ -0,0 +1,99 @@
+from genocrowd.libgenocrowd.Difficulty import Difficulty, gene_features
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+import numpy
+
+from . import GenocrowdTestCase
+
+
+class TestDifficulty(GenocrowdTestCase):
+    """Test the gene difficulty engine"""
+
+    def test_gene_features(self):
+        gff = "".join([
+            "##gff-version 3\n",
+            "chr1\t.\tgene\t1\t1000\t.\t+\t.\tID=g1\n",
+            "chr1\t.\tmRNA\t1\t1000\t.\t+\t.\tID=m1;Parent=g1\n",
+            "chr1\t.\texon\t1\t100\t.\t+\t.\tParent=m1\n",
+            "chr1\t.\texon\t201\t300\t.\t+\t.\tParent=m1\n",
+            "chr1\t.\texon\t601\t1000\t.\t+\t.\tParent=m1\n",
+            "chr1\t.\tmRNA\t1\t1000\t.\t+\t.\tID=m2;Parent=g1\n",
+            "chr1\t.\texon\t1\t1000\t.\t+\t.\tParent=m2\n",
+        ])
+        assert gene_features(gff) == {'length': 1000, 'isoforms': 2, 'exons': 3, 'intron_mean': 200, 'intron_max': 300}
+
+    def test_overlaps(self):
+        columns = {
+            'chromosome': numpy.array([0, 0, 0, 1]),
+            'start': numpy.array([0, 50, 200, 60]),
+            'end': numpy.array([100, 150, 300, 70])
+        }
+        assert Difficulty.overlaps(columns).tolist() == [1, 1, 0, 0]
+
+    def test_neighbour_overlaps(self, client):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.files"].insert_many([
+            {'_id': "a", 'chromosome': "chr1", 'start': 0, 'end': 100},
+            {'_id': "b", 'chromosome': "chr1", 'start': 50, 'end': 150},
+            {'_id': "c", 'chromosome': "chr1", 'start': 60, 'end': 70},
+            {'_id': "d", 'chromosome': "chr2", 'start': 60, 'end': 70},
+            {'_id': "e", 'chromosome': "chr2"}
+        ])
+        engine = Difficulty(client.app, None)
+        assert engine.neighbour_overlaps(["c", "a", "d", "e"]).tolist() == [2, 2, 0, 0]
+        db["genes.files"].drop()
+
+    def test_compute(self, client):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        with open("test-data/merlin.gff", "rb") as gff:
+            GeneImporter(client.app, None).import_gff(gff)
+        with open("test-data/merlin.gff") as gff:
+            features = {gene['_id']: gene_features(gene['gff']) for gene in GffStream(gff)}
+
+        engine = Difficulty(client.app, None)
+        engine.thresholds = [0, 5000]
+        engine.weights = {'length': 1}
+        result = engine.compute()
+        assert result['genes'] == 6 and result['levels'] == [3, 3]
+
+        """Longer genes are harder"""
+        genes = list(db["genes.files"].find({}, projection={'difficulty': 1, 'level': 1, 'features': 1}, sort=[('difficulty', 1)]))
+        assert all(gene['features'] == features[gene['_id']] for gene in genes)
+        lengths = [gene['features']['length'] for gene in genes]
+        assert lengths == sorted(lengths)
+        assert [gene['level'] for gene in genes] == [0, 0, 0, 1, 1, 1]
+
+        """Nothing changes when computed again"""
+        assert engine.compute()['updated'] == 0
+
+    def test_score_genes(self, client):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        db["difficulty"].drop()
+        with open("test-data/merlin.gff", "rb") as gff:
+            GeneImporter(client.app, None).import_gff(gff)
+        engine = Difficulty(client.app, None)
+        engine.thresholds = [0, 5000]
+        engine.weights = {'length': 1}
+
+        """Without a model, all the genes are scored"""
+        assert engine.score_genes({'upload': "u1"})['genes'] == 6
+        difficulties = {gene['_id']: gene['difficulty'] for gene in db["genes.files"].find({}, projection={'difficulty': 1})}
+
+        """The genes of an upload are scored alone against the model"""
+        GeneImporter(client.app, None).import_gff([
+            "##gff-version 3\n",
+            "chr9\t.\tgene\t1\t90000\t.\t+\t.\tID=long\n",
+            "chr9\t.\tgene\t100\t200\t.\t+\t.\tID=short\n",
+        ], upload="u1")
+        result = engine.score_genes({'upload': "u1"})
+        assert result['genes'] == 2 and result['levels'] == [4, 4]
+        genes = {gene['_id']: gene for gene in db["genes.files"].find({}, projection={'difficulty': 1, 'level': 1})}
+        assert (genes['long']['difficulty'], genes['long']['level']) == (10000, 1)
+        assert (genes['short']['difficulty'], genes['short']['level']) == (0, 0)
+        assert all(genes[gene_id]['difficulty'] == difficulty for gene_id, difficulty in difficulties.items())
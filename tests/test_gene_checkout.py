@@ -0,0 +1,57 @@
+from genocrowd.libgenocrowd.GeneCheckout import GeneCheckout
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GeneLease import GeneLease
+
+from . import GenocrowdTestCase
+
+
+class TestGeneCheckout(GenocrowdTestCase):
+    """Test the prefetch of the next gene"""
+
+    def prepare(self, client):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        db["leases"].drop()
+        with open("test-data/merlin.gff", "rb") as gff:
+            GeneImporter(client.app, None).import_gff(gff)
+        GeneLease(client.app, None).ensure_indexes()
+        client.create_two_users()
+        db["users"].update_many({}, {"$set": {"level": 0, "current_annotation": None, "next_annotation": None}})
+        return {"username": "jdoe", "email": "jdoe@genocrowd.org"}
+
+    def test_prefetch_reserve(self, client):
+        user = self.prepare(client)
+        checkout = GeneCheckout(client.app, None)
+        checkout.mode = "reserve"
+
+        gene = checkout.prefetch(user)
+        next_annotation = client.app.mongo.db["users"].find_one({"username": "jdoe"})["next_annotation"]
+        assert next_annotation["_id"] == gene["_id"]
+        assert next_annotation["state"] == "reserved"
+        assert next_annotation["gff"].startswith("##gff-version 3")
+
+        """Only one gene is prefetched, and its lease is taken"""
+        assert checkout.prefetch(user) is None
+        assert client.app.mongo.db["leases"].count_documents({"username": "jdoe"}) == 1
+
+        """Releasing the lease forgets the prefetched gene"""
+        GeneLease(client.app, None).release(gene["_id"], "jdoe")
+        assert client.app.mongo.db["users"].find_one({"username": "jdoe"})["next_annotation"] is None
+
+    def test_checkout_prefetched(self, client):
+        user = self.prepare(client)
+        checkout = GeneCheckout(client.app, None)
+        checkout.mode = "reserve"
+        gene = checkout.prefetch(user)
+        client.app.mongo.db["users"].update_one({"username": "jdoe"}, {"$set": {"next_annotation.state": "loaded"}})
+
+        """A loaded gene is given without calling Apollo"""
+        client.app.metrics.reset()
+        current, waited = checkout.checkout(user)
+        assert current["_id"] == gene["_id"]
+        assert waited == 0
+        user_doc = client.app.mongo.db["users"].find_one({"username": "jdoe"})
+        assert user_doc["current_annotation"]["_id"] == gene["_id"]
+        assert user_doc["next_annotation"] is None
+        assert client.app.metrics.summary()["checkout/prefetch"]["count"] == 1
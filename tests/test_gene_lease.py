@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GeneLease import GeneLease
+
+from . import GenocrowdTestCase
+
+
+class TestGeneLease(GenocrowdTestCase):
+    """Test the distribution of genes with leases"""
+
+    def import_genes(self, client):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        db["leases"].drop()
+        importer = GeneImporter(client.app, None)
+        importer.redundancy = 2
+        with open("test-data/merlin.gff", "rb") as gff:
+            importer.import_gff(gff)
+        GeneLease(client.app, None).ensure_indexes()
+
+    def test_claim_redundancy(self, client):
+        self.import_genes(client)
+        lease = GeneLease(client.app, None)
+
+        claimed = [lease.claim(user, 0) for user in ("jdoe", "jsmith", "jwick") for i in range(6)]
+        genes = [gene["_id"] for gene in claimed if gene]
+
+        """Each gene is given to 2 different users, then none is left"""
+        assert len(genes) == 12
+        assert all(genes.count(gene_id) == 2 for gene_id in set(genes))
+        assert claimed[-1] is None
+        assert client.app.mongo.db["leases"].count_documents({}) == 12
+
+    def test_reap(self, client):
+        self.import_genes(client)
+        lease = GeneLease(client.app, None)
+        gene = lease.claim("jdoe", 0)
+        lease.complete(lease.claim("jsmith", 0)["_id"], "jsmith")
+
+        client.app.mongo.db["leases"].update_many({}, {"$set": {"expires": datetime.utcnow() - timedelta(seconds=1)}})
+        assert lease.reap() == 1
+        gene = client.app.mongo.db["genes.files"].find_one({"_id": gene["_id"]})
+        assert "jdoe" not in gene["annotators"]
+        assert gene["available"] == 2 - gene["done"]
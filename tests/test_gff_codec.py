@@ -0,0 +1,39 @@
+from genocrowd.libgenocrowd.GffCodec import CODECS, GffCodec
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+import pytest
+
+from . import GenocrowdTestCase
+
+
+class TestGffCodec(GenocrowdTestCase):
+    """Test the compression codecs of GFF payloads"""
+
+    def get_payloads(self):
+        with open("test-data/merlin.gff", "rb") as gff:
+            return [gene["gff"].encode() for gene in GffStream(gff)]
+
+    @pytest.mark.parametrize("name", [name for name, codec in CODECS.items() if codec.available()])
+    def test_round_trip(self, name):
+        payloads = self.get_payloads()
+        codec = GffCodec.get(name)
+        if codec.uses_dictionary:
+            codec.dictionary = codec.train(payloads, 4096)
+            assert 0 < len(codec.dictionary) <= 4096
+
+        for payload in payloads:
+            assert codec.decompress(codec.compress(payload)) == payload
+
+    def test_dictionary(self):
+        payloads = self.get_payloads()
+        codec = GffCodec.get("zlib-dict")
+        codec.dictionary = codec.train(payloads[:3], 4096)
+
+        """The repeated attributes are in the dictionary, and shrink the genes"""
+        assert b"seqid=Merlin;" in codec.dictionary
+        plain = GffCodec.get("zlib")
+        assert sum(len(codec.compress(payload)) for payload in payloads[3:]) < sum(len(plain.compress(payload)) for payload in payloads[3:])
+
+    def test_unknown(self):
+        with pytest.raises(Exception, match="Unknown GFF codec: lzma"):
+            GffCodec.get("lzma")
@@ -0,0 +1,100 @@
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.GffStream import GffStream
+
+import gridfs
+
+from . import GenocrowdTestCase
+
+
+class TestGffStorage(GenocrowdTestCase):
+    """Test the inline and GridFS storage of GFF payloads"""
+
+    def get_storage(self, client):
+        db = client.app.mongo.db
+        db["test_gff.files"].drop()
+        db["test_gff.chunks"].drop()
+        db["gff_dictionaries"].drop()
+        GffStorage.current_dictionaries.clear()
+        storage = GffStorage(client.app, None, "test_gff")
+        storage.ensure_indexes()
+        return storage
+
+    def test_delete_many(self, client):
+        storage = self.get_storage(client)
+        storage.inline_max_size = 100
+        for number in range(6):
+            size = 10 if number % 2 else 1000
+            storage.put({'_id': "gene-%d" % number, 'chromosome': "chr%d" % (number % 3)}, "x" * size)
+
+        """Only the chunks of the removed documents are deleted"""
+        assert storage.delete_many({'chromosome': "chr0"}) == (2, 1)
+        assert storage.files.count_documents({}) == 4
+        assert storage.chunks.count_documents({}) == 2
+        assert storage.delete_many({}) == (4, 2)
+
+    def test_put_get(self, client):
+        storage = self.get_storage(client)
+        storage.inline_max_size = 1000
+        storage.compression = "zlib"
+        small = "##gff-version 3\n" + "chr1\t.\tgene\t1\t100\t.\t+\t.\tID=small\n"
+        large = "##gff-version 3\n" + "chr1\t.\texon\t1\t100\t.\t+\t.\tParent=large\n" * 100
+
+        storage.put({'_id': "small"}, small)
+        storage.put({'_id': "large"}, large)
+        assert storage.get("small") == small
+        assert storage.get("large") == large
+        assert storage.get("missing") is None
+
+        """Small payloads are inline and compressed, large ones in chunks"""
+        document = storage.files.find_one({'_id': "small"})
+        assert document['storage'] == 'inline' and document['compression'] == 'zlib'
+        assert storage.files.find_one({'_id': "large"})['storage'] == 'gridfs'
+        assert storage.chunks.count_documents({}) == 1
+
+        storage.delete("large")
+        assert storage.get("large") is None
+        assert storage.chunks.count_documents({}) == 0
+
+    def test_migrate(self, client):
+        storage = self.get_storage(client)
+        fs = gridfs.GridFS(client.app.mongo.db, collection="test_gff")
+        gffs = {"gene{}".format(i): "##gff-version 3\nchr1\t.\tgene\t{}\t100\t.\t+\t.\tID=gene{}\n".format(i, i) for i in range(5)}
+        for _id, gff in gffs.items():
+            fs.put(gff.encode(), _id=_id, chromosome="chr1")
+
+        """Files written with GridFS are read, then moved inline"""
+        assert storage.get("gene1") == gffs["gene1"]
+        assert storage.migrate(batch_size=2) == 5
+        assert storage.chunks.count_documents({}) == 0
+        assert all(storage.get(_id) == gff for _id, gff in gffs.items())
+        assert storage.files.find_one({'_id': "gene1"})['chromosome'] == "chr1"
+        assert storage.migrate() == 0
+
+        """And back to GridFS"""
+        storage.backend = 'gridfs'
+        assert storage.migrate() == 5
+        assert fs.get("gene3").read().decode() == gffs["gene3"]
+
+    def test_dictionary(self, client):
+        storage = self.get_storage(client)
+        storage.compression = "zlib-dict"
+        with open("test-data/merlin.gff", "rb") as gff:
+            genes = {gene["_id"]: gene["gff"] for gene in GffStream(gff)}
+
+        """Without dictionary, zlib is used"""
+        assert storage.needs_dictionary()
+        storage.put({'_id': "Merlin_1"}, genes["Merlin_1"])
+        assert storage.files.find_one({'_id': "Merlin_1"})['compression'] == 'zlib'
+
+        dictionary_id = storage.train_dictionary([gff.encode() for gff in genes.values()])
+        assert not storage.needs_dictionary()
+        storage.put({'_id': "Merlin_2"}, genes["Merlin_2"])
+        document = storage.files.find_one({'_id': "Merlin_2"})
+        assert document['compression'] == 'zlib-dict' and document['dictionary'] == dictionary_id
+
+        """Both are decoded, and the first one is recompressed by the migration"""
+        assert storage.get("Merlin_1") == genes["Merlin_1"]
+        assert storage.get("Merlin_2") == genes["Merlin_2"]
+        assert storage.migrate() == 1
+        assert storage.files.find_one({'_id': "Merlin_1"})['dictionary'] == dictionary_id
+        assert storage.get("Merlin_1") == genes["Merlin_1"]
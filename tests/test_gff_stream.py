@@ -0,0 +1,80 @@
+import billiard
+
+from genocrowd.libgenocrowd.GffStream import GffStream, gene_features
+
+from . import GenocrowdTestCase
+
+
+def parse_in_daemon(path, expected):
+    """Parse a file with workers from a daemonic process (like a child of
+    the Celery prefork pool), exit with an error if the genes differ"""
+    assert billiard.current_process().daemon
+    assert list(GffStream.parallel_genes(path, 2, range_size=500)) == expected
+
+
+class TestGffStream(GenocrowdTestCase):
+    """Test the line-oriented GFF3 reader"""
+
+    def test_merlin(self):
+        with open("test-data/merlin.gff") as handle:
+            stream = GffStream(handle)
+            genes = list(stream)
+
+        assert stream.errors == []
+        assert [gene['_id'] for gene in genes] == ['Merlin_1', 'Merlin_2', 'Merlin_3', 'Merlin_4', 'Merlin_5', 'Merlin_42']
+
+        gene = genes[4]
+        assert gene['chromosome'] == 'Merlin'
+        assert gene['start'] == 3065 and gene['end'] == 4796
+        assert gene['strand'] == -1
+        assert gene['nb_features'] == 1
+        assert gene['gff'].startswith("##gff-version 3\n")
+        assert len(gene['gff'].splitlines()) == 7
+        assert gene['features'] == gene_features(gene['gff']) and gene['features']['length'] == 4796 - 3065
+
+    def test_errors(self):
+        lines = [
+            b"##gff-version 3\n",
+            b"chr1\t.\tgene\t1\t100\t.\t+\t.\tID=g1\n",
+            b"chr1\t.\tmRNA\t1\t100\t.\t+\t.\tID=m1;Parent=g1\n",
+            b"###\n",
+            b"chr1\t.\texon\t1\t100\t.\t+\t.\tParent=m1\n",
+            b"chr1\t.\tgene\t200\t300\t.\t.\t.\tID=g1\n",
+            b"chr1\t.\tgene\t400\t500\t.\t.\t.\tName=noid\n",
+            b"not a gff line\n",
+        ]
+        stream = GffStream(lines)
+        genes = list(stream)
+
+        assert [gene['_id'] for gene in genes] == ['g1']
+        assert genes[0]['strand'] == 1
+        assert len(stream.errors) == 4
+
+    def test_parallel(self, tmp_path):
+        path = str(tmp_path / "genes.gff")
+        with open(path, "w") as handle:
+            handle.write("##gff-version 3\n")
+            for number in range(40):
+                handle.write("chr{0}\t.\tgene\t{1}\t{2}\t.\t+\t.\tID=g{1}\n".format(number // 10, number * 100 + 1, number * 100 + 90))
+                handle.write("chr{0}\t.\tmRNA\t{1}\t{2}\t.\t+\t.\tID=m{1};Parent=g{1}\n".format(number // 10, number * 100 + 1, number * 100 + 90))
+                handle.write("chr{0}\t.\texon\t{1}\t{2}\t.\t+\t.\tParent=m{1}\n".format(number // 10, number * 100 + 1, number * 100 + 90))
+
+        """Ranges start on genes"""
+        ranges = GffStream.split(path, 500)
+        assert len(ranges) > 4
+        with open(path, "rb") as handle:
+            for start, end in ranges[1:]:
+                handle.seek(start)
+                assert b"\tgene\t" in handle.readline()
+
+        with open(path) as handle:
+            expected = list(GffStream(handle))
+        errors = []
+        genes = list(GffStream.parallel_genes(path, 2, range_size=500, errors=errors))
+        assert genes == expected and errors == []
+
+        """Workers can be started from a daemonic process"""
+        daemon = billiard.Process(target=parse_in_daemon, args=(path, expected), daemon=True)
+        daemon.start()
+        daemon.join(60)
+        assert daemon.exitcode == 0
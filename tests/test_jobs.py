@@ -0,0 +1,57 @@
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from genocrowd.libgenocrowd.Difficulty import Difficulty
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.JobManager import JobManager
+
+from . import GenocrowdTestCase
+
+
+class TestJobs(GenocrowdTestCase):
+    """Test the background jobs"""
+
+    def test_resume(self, client):
+        jobs = JobManager(client.app, None)
+
+        def job(status, age=0):
+            created = jobs.create('compute_difficulty')
+            jobs.jobs.update_one({'_id': created['_id']}, {'$set': {'status': status, 'updated': datetime.utcnow() - timedelta(seconds=age)}})
+            return created['_id']
+
+        """Only failed jobs and lost queued or running jobs are resumed"""
+        for status, age in (('queued', 0), ('queued', jobs.stale_after - 60), ('running', 0), ('running', jobs.stale_after - 60), ('success', 0)):
+            assert jobs.resume(job(status, age)) is None
+        assert jobs.resume("unknown") is None
+        for status, age in (('failure', 0), ('queued', jobs.stale_after + 60), ('running', jobs.stale_after + 60)):
+            assert jobs.resume(job(status, age))['status'] == 'success'
+        jobs.jobs.drop()
+
+    def test_resume_upload_scoring(self, client, tmp_path, monkeypatch):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        jobs = JobManager(client.app, None)
+        path = str(tmp_path / "merlin.gff")
+        shutil.copy("test-data/merlin.gff", path)
+        job = jobs.create('upload_genes', {'path': path, 'priority': 0, 'dataset': "merlin"})
+
+        """A failed scoring keeps the upload, the resumed job only scores"""
+        def fail(self, query, batch_size=1000):
+            raise Exception("Scoring failed")
+        monkeypatch.setattr(Difficulty, 'score_genes', fail)
+        jobs.run(job['_id'])
+        assert jobs.get(job['_id'])['status'] == 'failure'
+        assert os.path.exists(path)
+
+        monkeypatch.undo()
+
+        def import_path(self, *args, **kwargs):
+            raise Exception("Imported again")
+        monkeypatch.setattr(GeneImporter, 'import_path', import_path)
+        resumed = jobs.resume(job['_id'])
+        assert resumed['status'] == 'success'
+        assert resumed['result']['parsed'] == 6 and resumed['result']['added'] == 6
+        assert not os.path.exists(path)
+        jobs.jobs.drop()
@@ -0,0 +1,98 @@
+from genocrowd.libgenocrowd.Data import Data
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GeneLease import GeneLease
+from genocrowd.libgenocrowd.Levels import Levels
+
+from . import GenocrowdTestCase
+
+
+class TestLevels(GenocrowdTestCase):
+    """Test the difficulty levels and their counters"""
+
+    def import_genes(self, client):
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        db["leases"].drop()
+        db["levels"].drop()
+        importer = GeneImporter(client.app, None)
+        importer.redundancy = 2
+        with open("test-data/merlin.gff", "rb") as gff:
+            importer.import_gff(gff)
+        GeneLease(client.app, None).ensure_indexes()
+        """Difficulties 0, 2000... 10000"""
+        for number, gene in enumerate(db["genes.files"].find({}, sort=[('_id', 1)])):
+            db["genes.files"].update_one({'_id': gene['_id']}, {'$set': {'difficulty': number * 2000}})
+        levels = Levels(client.app, None)
+        levels.save_levels([{'name': "Easy", 'min': 0}, {'name': "Hard", 'min': 5000}])
+        return levels
+
+    def counters(self, levels):
+        return [(level['available'], level['leased'], level['done']) for level in levels.get_levels()]
+
+    def test_counters(self, client):
+        levels = self.import_genes(client)
+        assert self.counters(levels) == [(6, 0, 0), (6, 0, 0)]
+
+        lease = GeneLease(client.app, None)
+        first = lease.claim("jdoe", 0)
+        second = lease.claim("jsmith", 0)
+        lease.complete(second["_id"], "jsmith")
+        lease.release(first["_id"], "jdoe")
+        lease.claim("jdoe", 1)
+        Data(client.app, None).set_annotable(first["_id"], False)
+        slots = client.app.mongo.db["genes.files"].find_one({'_id': first["_id"]})['available']
+        assert self.counters(levels) == [(5 - slots, 0, 1), (5, 1, 0)]
+
+        """The incremental counters match a full recount"""
+        expected = self.counters(levels)
+        levels.recount()
+        assert self.counters(levels) == expected
+        client.app.mongo.db["levels"].drop()
+
+    def test_save_levels(self, client):
+        levels = self.import_genes(client)
+        genes = client.app.mongo.db["genes.files"]
+        assert [level['genes'] for level in levels.get_levels()] == [3, 3]
+
+        levels.save_levels([{'name': "Easy", 'min': 0}, {'name': "Medium", 'min': 3000}, {'name': "Hard", 'min': 9000}])
+        assert [level['genes'] for level in levels.get_levels()] == [2, 3, 1]
+        assert genes.find_one({'difficulty': 10000})['level'] == 2
+
+        for invalid in ([], [{'min': 100}], [{'min': 0}, {'min': 0}], [{'min': 0}, {'min': 20000}]):
+            try:
+                levels.save_levels(invalid)
+                assert False
+            except ValueError:
+                pass
+        assert len(levels.get_levels()) == 3
+        client.app.mongo.db["levels"].drop()
+
+    def test_concurrent_defaults(self, client, monkeypatch):
+        client.app.mongo.db["levels"].drop()
+        client.app.mongo.db["levels"].insert_one({'_id': 0, 'name': "Easy", 'min': 0})
+        levels = Levels(client.app, None)
+
+        """Levels created by another request after the count are kept"""
+        monkeypatch.setattr(levels.levels, 'count_documents', lambda *args, **kwargs: 0)
+        levels.ensure_defaults()
+        monkeypatch.undo()
+        assert [(level['_id'], level['name'], level['min']) for level in levels.get_levels()] == [(0, "Easy", 0), (1, "Level 2", 3333), (2, "Level 3", 6666)]
+        client.app.mongo.db["levels"].drop()
+
+    def test_routes(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        self.import_genes(client)
+
+        response = client.client.get('/api/admin/getlevel')
+        assert response.status_code == 200
+        assert [(level['name'], level['genes']) for level in response.json['levels']] == [("Easy", 3), ("Hard", 3)]
+
+        response = client.client.post('/api/admin/savelevel', json={'levels': [{'name': "All", 'min': 0}]})
+        assert response.status_code == 200
+        assert [(level['name'], level['genes'], level['available']) for level in response.json['levels']] == [("All", 6, 12)]
+
+        response = client.client.post('/api/admin/savelevel', json={'levels': [{'name': "All", 'min': 10}]})
+        assert response.status_code == 400 and response.json['error']
+        client.app.mongo.db["levels"].drop()
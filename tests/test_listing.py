@@ -0,0 +1,105 @@
+import json
+from datetime import datetime
+
+from genocrowd.libgenocrowd.GffStorage import GffStorage
+from genocrowd.libgenocrowd.Listing import Listing
+
+from . import GenocrowdTestCase
+
+
+class TestListing(GenocrowdTestCase):
+    """Test the paginated admin listings"""
+
+    def fill_genes(self, client):
+        genes = client.app.mongo.db["genes.files"]
+        genes.drop()
+        genes.insert_many([{
+            "_id": "gene-%02d" % number,
+            "chromosome": "chr%d" % (number % 2),
+            "start": 1000 - number * 10,
+            "end": 2000,
+            "isAnnotable": number % 3 != 0,
+            "isValidated": False,
+            "difficulty": number % 5,
+            "priority": 0,
+            "gff": b"payload"
+        } for number in range(25)])
+        Listing(client.app, None, "genes").ensure_indexes()
+
+    def test_pages(self, client):
+        self.fill_genes(client)
+        listing = Listing(client.app, None, "genes")
+
+        for args in ({}, {"sort": "difficulty", "order": "desc"}, {"sort": "id", "annotable": "true"}):
+            """Pages cover every gene once, in the order of a full sort"""
+            query, sort = listing.parse(args)
+            expected = [gene["_id"] for gene in client.app.mongo.db["genes.files"].find(query, sort=sort)]
+            ids = []
+            page = {"next": None}
+            while True:
+                page = listing.page(dict(args, limit=4, cursor=page["next"] or ""))
+                assert all("gff" not in gene for gene in page["documents"])
+                ids += [gene["_id"] for gene in page["documents"]]
+                if not page["next"]:
+                    break
+            assert ids == expected
+
+    def test_filters(self, client):
+        self.fill_genes(client)
+        listing = Listing(client.app, None, "genes")
+        page = listing.page({"chromosome": "chr1", "minDifficulty": "2", "maxDifficulty": "3", "annotable": "false"})
+        assert [gene["_id"] for gene in page["documents"]] == ["gene-03"]
+
+    def test_route(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        self.fill_genes(client)
+
+        response = client.client.get("/api/data/getgenes?limit=10")
+        assert response.status_code == 200
+        assert len(response.json["genes"]) == 10 and response.json["next"]
+
+        response = client.client.get("/api/data/getgenes?limit=10&cursor=" + response.json["next"])
+        assert len(response.json["genes"]) == 10
+
+        response = client.client.get("/api/data/getgenes?format=ndjson&validated=false")
+        assert response.mimetype == "application/x-ndjson"
+        assert len([json.loads(line) for line in response.get_data(as_text=True).splitlines()]) == 25
+
+        response = client.client.get("/api/data/getgenes?sort=name")
+        assert response.status_code == 400
+        assert response.json["error"] is True
+
+    def test_answers(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        client.app.mongo.db["answers.files"].drop()
+        storage = GffStorage(client.app, None, "answers")
+        for number in range(6):
+            storage.put({
+                "_id": "gene-%d_%s" % (number // 2, ("jdoe", "jsmith")[number % 2]),
+                "uploadDate": datetime(2020, 1, 1 + number),
+                "gene": "gene-%d" % (number // 2),
+                "username": ("jdoe", "jsmith")[number % 2],
+                "isValidated": number == 0
+            }, "##gff-version 3\nchr1\tApollo\tgene\t1\t10\t.\t+\t.\tID=gene-%d\n" % number)
+
+        response = client.client.get("/api/data/getallanswers?annotator=jsmith&since=2020-01-03&limit=1")
+        assert response.status_code == 200
+        assert [answer["_id"] for answer in response.json["answer"]] == ["gene-1_jsmith"]
+        response = client.client.get("/api/data/getallanswers?annotator=jsmith&since=2020-01-03&cursor=" + response.json["next"])
+        assert [answer["_id"] for answer in response.json["answer"]] == ["gene-2_jsmith"]
+        assert response.json["next"] is None
+
+        response = client.client.get("/api/data/getallanswers?format=gff&validated=false&sort=id")
+        gff = response.get_data(as_text=True)
+        assert gff.count("##gff-version 3") == 1
+        assert gff.count("\tgene\t") == 5 and "ID=gene-0\n" not in gff
+
+        response = client.client.get("/api/data/getallanswers?since=yesterday")
+        assert response.status_code == 400
+
+        """Only admins can list answers"""
+        client.log_user("jsmith")
+        response = client.client.get("/api/data/getallanswers")
+        assert response.json == {"error": True, "errorMessage": "Admin required"}
@@ -0,0 +1,123 @@
+import threading
+
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+from genocrowd.libgenocrowd.PasswordHasher import PasswordHasher
+
+from . import GenocrowdTestCase
+
+
+class CountingCollection(object):
+    """Collection counting the queries"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.queries = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+
+        def counted(*args, **kwargs):
+            self.queries += 1
+            return method(*args, **kwargs)
+        return counted
+
+
+class TestLogin(GenocrowdTestCase):
+    """Test the login pipeline"""
+
+    def test_single_query(self, client):
+        client.create_two_users()
+        local_auth = LocalAuth(client.app, None)
+        users = local_auth.users = CountingCollection(local_auth.users)
+
+        for login in ("jdoe", "jdoe@genocrowd.org"):
+            result = local_auth.authenticate_user({"login": login, "password": "iamjohndoe"})
+            assert result["user"]["username"] == "jdoe" and "password" not in result["user"]
+        assert local_auth.authenticate_user({"login": "unknown", "password": "iamjohndoe"})["errorMessage"] == ["Incorrect login identifier"]
+        assert users.queries == 3
+
+        """A username takes precedence over the email of another user"""
+        client.app.mongo.db["users"].update_one({'username': "jsmith"}, {'$set': {'username': "jdoe@genocrowd.org"}})
+        result = local_auth.authenticate_user({"login": "jdoe@genocrowd.org", "password": "iamjanesmith"})
+        assert result["user"]["email"] == "jsmith@genocrowd.org"
+
+    def test_rehash(self, client):
+        client.create_two_users()
+        users = client.app.mongo.db["users"]
+        hasher = client.app.password_hasher
+        assert not hasher.needs_rehash(users.find_one({'username': "jdoe"})["password"])
+
+        """The hash is updated at login when the cost factor changes"""
+        hasher.rounds += 1
+        try:
+            response = client.client.post('/api/auth/login', json={"login": "jdoe", "password": "iamjohndoe"})
+            assert response.json["error"] is False
+            password_hash = users.find_one({'username': "jdoe"})["password"]
+            assert password_hash.split('$')[2] == "%02d" % hasher.rounds
+            assert hasher.check(password_hash, "iamjohndoe")
+        finally:
+            hasher.rounds -= 1
+
+    def test_busy_pool(self, client):
+        client.create_two_users()
+        hasher = client.app.password_hasher
+        client.app.password_hasher = PasswordHasher(client.app.bcrypt, hasher.rounds, workers=1, queue_size=0)
+        event = threading.Event()
+        running = threading.Thread(target=client.app.password_hasher.run, args=(event.wait, 10))
+        running.start()
+        try:
+            while client.app.password_hasher.slots._value:
+                event.wait(0.01)
+            response = client.client.post('/api/auth/login', json={"login": "jdoe", "password": "iamjohndoe"})
+            assert response.status_code == 503 and response.json["user"] == {}
+        finally:
+            event.set()
+            running.join()
+        response = client.client.post('/api/auth/login', json={"login": "jdoe", "password": "iamjohndoe"})
+        assert response.status_code == 200 and response.json["error"] is False
+        client.app.password_hasher = hasher
+
+    def test_hash_many_slots(self, client):
+        hasher = PasswordHasher(client.app.bcrypt, 4, workers=2, queue_size=0)
+        event = threading.Event()
+        running = threading.Thread(target=hasher.run, args=(event.wait, 10))
+        running.start()
+        while hasher.slots._value == 2:
+            event.wait(0.01)
+
+        """Bulk hashes wait for free slots instead of being refused"""
+        hashes = []
+        bulk = threading.Thread(target=lambda: hashes.extend(hasher.hash_many(["a", "b", "c"])))
+        bulk.start()
+        bulk.join(0.2)
+        assert bulk.is_alive() and not hashes
+        event.set()
+        running.join()
+        bulk.join()
+        assert [hasher.check(password_hash, password) for password_hash, password in zip(hashes, "abc")] == [True, True, True]
+        assert hasher.slots._value == 2
+
+    def test_rate_limits(self, client):
+        client.create_two_users()
+        client.app.mongo.db["rate_limits"].drop()
+        settings = client.app.iniconfig
+        settings.set('genocrowd', 'login_rate_account', "3")
+        settings.set('genocrowd', 'login_rate_ip', "4")
+        try:
+            """Per account"""
+            for number in range(3):
+                response = client.client.post('/api/auth/login', json={"login": "jdoe", "password": "wrong"})
+                assert response.json["errorMessage"] == ["Invalid password"]
+            response = client.client.post('/api/auth/login', json={"login": "jdoe", "password": "iamjohndoe"})
+            assert response.status_code == 429
+            assert 0 < int(response.headers["Retry-After"]) <= 61
+
+            """Per IP address"""
+            assert client.client.post('/api/auth/login', json={"login": "jsmith", "password": "iamjanesmith"}).status_code == 429
+            other = client.app.test_client()
+            response = other.post('/api/auth/login', json={"login": "jsmith", "password": "iamjanesmith"}, environ_base={'REMOTE_ADDR': "10.0.0.2"})
+            assert response.status_code == 200 and response.json["error"] is False
+        finally:
+            settings.set('genocrowd', 'login_rate_account', "10000")
+            settings.set('genocrowd', 'login_rate_ip', "10000")
+            client.app.mongo.db["rate_limits"].drop()
@@ -0,0 +1,71 @@
+import random
+
+from genocrowd.libgenocrowd.GeneImporter import GeneImporter
+from genocrowd.libgenocrowd.GeneRegions import overlapping_bins, parse_region, region_bin
+
+from . import GenocrowdTestCase
+
+
+class TestGeneRegions(GenocrowdTestCase):
+    """Test the region queries on genes"""
+
+    def test_bins(self):
+        assert [region_bin(0, 1), region_bin(0, 1 << 17), region_bin(0, (1 << 17) + 1), region_bin(0, 1 << 29)] == [585, 585, 73, 0]
+        assert region_bin(0, (1 << 29) + 1) == 4681
+
+        """Every interval overlapping a region is in one of its bins"""
+        generator = random.Random(42)
+        for scale in (10**6, 10**8, 1 << 30):
+            intervals = []
+            for number in range(500):
+                start = generator.randrange(scale)
+                intervals.append((start, start + generator.choice([1, 100, 10**4, 10**6, 10**7])))
+            for number in range(100):
+                start = generator.randrange(scale)
+                end = start + generator.choice([1, 1000, 10**5, 10**7])
+                bins = set(overlapping_bins(start, end))
+                assert all(region_bin(*interval) in bins for interval in intervals if interval[0] < end and interval[1] > start)
+
+    def test_parse_region(self):
+        assert parse_region("NC_042493.1:8.3M-8.4M") == ("NC_042493.1", 8299999, 8400000)
+        assert parse_region("chr1:1,000-2,000") == ("chr1", 999, 2000)
+        assert parse_region("chr1:10k") == ("chr1", 9999, 10000)
+        assert parse_region("chr1") == ("chr1", 0, None)
+        for region in ("chr1:200-100", ":1-2"):
+            try:
+                parse_region(region)
+                assert False
+            except ValueError:
+                pass
+
+    def test_routes(self, client):
+        client.create_two_users()
+        client.log_user("jdoe")
+        db = client.app.mongo.db
+        db["genes.files"].drop()
+        db["genes.chunks"].drop()
+        with open("test-data/merlin.gff", "rb") as gff:
+            GeneImporter(client.app, None).import_gff(gff)
+
+        response = client.client.get('/api/data/getregion', query_string={'region': "Merlin:1-1000"})
+        assert response.status_code == 200
+        assert [gene["_id"] for gene in response.json["genes"]] == ["Merlin_1", "Merlin_2"]
+        assert not response.json["truncated"]
+
+        response = client.client.get('/api/data/getregion', query_string={'region': "Merlin", 'limit': 4})
+        assert len(response.json["genes"]) == 4 and response.json["truncated"]
+
+        response = client.client.get('/api/data/getregion', query_string={'region': "Merlin:5k-1k"})
+        assert response.status_code == 400
+
+        response = client.client.get('/api/data/getoverlaps', query_string={'gene': "Merlin_4"})
+        assert response.status_code == 200
+        assert [gene["_id"] for gene in response.json["overlaps"]] == ["Merlin_3", "Merlin_5"]
+
+        response = client.client.get('/api/data/getoverlaps', query_string={'gene': "unknown"})
+        assert response.status_code == 404
+
+        """Genes stored without a position overlap nothing"""
+        db["genes.files"].insert_one({'_id': "nowhere", 'chromosome': "Merlin"})
+        response = client.client.get('/api/data/getoverlaps', query_string={'gene': "nowhere"})
+        assert response.status_code == 200 and response.json["overlaps"] == []
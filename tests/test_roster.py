@@ -0,0 +1,89 @@
+import io
+import threading
+
+from genocrowd.libapollo.ApolloDirectory import ApolloDirectory
+from genocrowd.libapollo.ApolloUsers import ApolloUsers
+from genocrowd.libgenocrowd.Roster import Roster
+
+from . import GenocrowdTestCase
+
+
+ROSTER = """username,email,password,grade
+alice,alice@genocrowd.org,alicepass,l3
+bob,bob@genocrowd.org,bobpass,L3
+carol,not an email,carolpass,L3
+jsmith,jsmith2@genocrowd.org,jsmithpass,L3
+alice,alice2@genocrowd.org,alicepass,L3
+dave,dave@genocrowd.org,,L3
+"""
+
+
+class TestRoster(GenocrowdTestCase):
+    """Test the class roster imports"""
+
+    def test_parse(self):
+        rows = Roster.parse("\ufeff" + ROSTER)
+        assert len(rows) == 6 and rows[0] == {'username': "alice", 'email': "alice@genocrowd.org", 'password': "alicepass", 'grade': "l3"}
+        assert Roster.parse('{"users": [{"username": "alice"}]}') == [{'username': "alice"}]
+        for roster in ("username,email\nalice,alice@genocrowd.org", '{"username": "alice"}'):
+            try:
+                Roster.parse(roster)
+                assert False
+            except ValueError:
+                pass
+
+    def test_import(self, client, monkeypatch):
+        client.create_two_users()
+        client.log_user("jdoe")
+        users = client.app.mongo.db["users"]
+        provisioned = []
+        lock = threading.Lock()
+
+        def add_user(self, username, email, password, role="user"):
+            with lock:
+                provisioned.append(username)
+            if username == "bob" and provisioned.count("bob") == 1:
+                raise Exception("Apollo is down")
+        monkeypatch.setattr(ApolloUsers, 'add_user', add_user)
+        monkeypatch.setattr(ApolloDirectory, 'refresh', lambda self: None)
+
+        response = client.client.post('/api/admin/importusers', data={'file': (io.BytesIO(ROSTER.encode()), "roster.csv")})
+        assert response.status_code == 200
+        rows = response.json["rows"]
+        job_id = response.json["job"]["_id"]
+        assert [row["status"] for row in rows] == ["created", "created", "rejected", "rejected", "rejected", "rejected"]
+        assert [row["errors"] for row in rows[2:]] == [["Not a valid email"], ["Username already registered"], ["Username repeated in the roster"], ["Missing password"]]
+
+        """The users can log in"""
+        alice = users.find_one({'username': "alice"})
+        assert alice["grade"] == "L3" and not alice["isAdmin"]
+        response = client.app.test_client().post('/api/auth/login', json={"login": "alice@genocrowd.org", "password": "alicepass"})
+        assert response.json["error"] is False
+
+        """Apollo failures are reported per user, and retried on resume"""
+        job = client.client.get('/api/jobs/{}'.format(job_id)).json["job"]
+        assert job["status"] == "failure"
+        assert job["progress"] == {'done': 1, 'failed': 1}
+        assert job["errors"][0] == "bob: Apollo is down"
+        assert users.find_one({'username': "bob"})["apollo"] == {'status': "failed", 'error': "Apollo is down"}
+
+        job = client.client.post('/api/jobs/{}/resume'.format(job_id)).json["job"]
+        assert job["status"] == "success"
+        assert job["result"]["rows"] == [{'username': "bob", 'status': "done"}]
+        assert sorted(provisioned) == ["alice", "bob", "bob"]
+        assert users.count_documents({'apollo.status': "done"}) == 2
+
+    def test_json_roster(self, client, monkeypatch):
+        client.create_two_users()
+        client.log_user("jdoe")
+        monkeypatch.setattr(ApolloUsers, 'add_user', lambda self, *args, **kwargs: None)
+        monkeypatch.setattr(ApolloDirectory, 'refresh', lambda self: None)
+        roster = {"users": [{"username": "erin", "email": "erin@genocrowd.org", "password": "erinpass", "grade": "M1", "role": "admin"},
+                            {"username": "frank", "email": "frank@genocrowd.org", "password": "frankpass", "grade": "M1", "role": "root"}]}
+        response = client.client.post('/api/admin/importusers', json=roster)
+        assert [row["status"] for row in response.json["rows"]] == ["created", "rejected"]
+        assert response.json["job"]["status"] == "success"
+        assert client.app.mongo.db["users"].find_one({'username': "erin"})["isAdmin"]
+
+        response = client.client.post('/api/admin/importusers', json={"users": "erin"})
+        assert response.status_code == 400
@@ -0,0 +1,168 @@
+import threading
+
+from genocrowd.libgenocrowd.LocalAuth import LocalAuth
+
+from . import GenocrowdTestCase
+
+
+class CountingUsers(object):
+    """Users collection counting the reads, the first one returning after
+    an event"""
+
+    def __init__(self, users, event=None):
+        self.users = users
+        self.event = event
+        self.reads = 0
+
+    def find_one(self, *args, **kwargs):
+        user = self.users.find_one(*args, **kwargs)
+        self.reads += 1
+        if self.event and self.reads == 1:
+            self.event.wait(10)
+        return user
+
+
+class TestSessionStore(GenocrowdTestCase):
+    """Test the server-side sessions"""
+
+    def session_cookie(self, client):
+        cookies = [cookie for cookie in client.client.cookie_jar if cookie.name == client.app.session_cookie_name]
+        return cookies[0].value if cookies else None
+
+    def login(self, client, username, password):
+        """Log a user in, return a function making a new client of the
+        session"""
+        client.client.post('/api/auth/login', json={"login": username, "password": password})
+        cookie = self.session_cookie(client)
+
+        def new_client():
+            session_client = client.app.test_client()
+            session_client.set_cookie('localhost', client.app.session_cookie_name, cookie)
+            return session_client
+        return new_client
+
+    def test_login_logout(self, client):
+        client.create_two_users()
+        sessions = client.app.mongo.db["sessions"]
+        sessions.drop()
+
+        response = client.client.post('/api/auth/login', json={"login": "jdoe", "password": "iamjohndoe"})
+        assert response.json["error"] is False
+        cookie = self.session_cookie(client)
+
+        """The cookie only holds the session id"""
+        assert len(cookie) < 100 and "jdoe" not in cookie
+        assert sessions.count_documents({}) == 1
+        assert sessions.find_one()["user"] == response.json["user"]["_id"]
+
+        response = client.client.post('/api/auth/check')
+        assert response.status_code == 200
+        assert response.json["username"] == "jdoe" and "password" not in response.json
+
+        """A new session is created at each login"""
+        client.client.post('/api/auth/login', json={"login": "jsmith", "password": "iamjanesmith"})
+        assert self.session_cookie(client) != cookie
+        assert sessions.count_documents({}) == 1
+
+        client.client.get('/api/auth/logout')
+        assert sessions.count_documents({}) == 0
+        assert client.client.post('/api/auth/check').status_code == 401
+
+    def test_logout_elsewhere(self, client):
+        client.create_two_users()
+        new_client = self.login(client, "jsmith", "iamjanesmith")
+        assert new_client().post('/api/auth/check').status_code == 200
+
+        """A session closed by another process ends at the next request"""
+        client.app.mongo.db["sessions"].delete_many({})
+        assert new_client().post('/api/auth/check').status_code == 401
+
+    def test_user_changes(self, client):
+        client.create_two_users()
+        client.client.post('/api/auth/login', json={"login": "jsmith", "password": "iamjanesmith"})
+        store = client.app.session_interface
+        user = client.app.mongo.db["users"].find_one_and_update({'username': "jsmith"}, {'$set': {'blocked': True}})
+
+        """Changes are seen when the cached user expires"""
+        store.invalidate_user(user["_id"])
+        response = client.client.post('/api/auth/check')
+        assert response.json == {"error": True, "errorMessage": "Blocked account"}
+
+        """Sessions of deleted users are anonymous"""
+        client.app.mongo.db["users"].delete_one({'_id': user["_id"]})
+        store.invalidate_user(user["_id"])
+        assert client.client.post('/api/auth/check').status_code == 401
+
+    def test_rights_changes(self, client):
+        client.create_two_users()
+        new_client = self.login(client, "jsmith", "iamjanesmith")
+        assert new_client().post('/api/auth/check').status_code == 200
+        assert new_client().get('/api/admin/getusers').json["errorMessage"] == "Admin required"
+
+        """Changes made through LocalAuth are seen at the next request"""
+        local_auth = LocalAuth(client.app, None)
+        local_auth.set_admin(True, "jsmith")
+        assert new_client().get('/api/admin/getusers').status_code == 200
+        local_auth.set_blocked(True, "jsmith")
+        assert new_client().post('/api/auth/check').json["errorMessage"] == "Blocked account"
+        local_auth.set_blocked(False, "jsmith")
+
+        """Deleting the account closes its sessions"""
+        sessions = client.app.mongo.db["sessions"]
+        user_id = new_client().post('/api/auth/check').json["_id"]
+        assert sessions.count_documents({'user': user_id}) == 1
+        assert new_client().get('/api/auth/delete').status_code == 200
+        assert sessions.count_documents({'user': user_id}) == 0
+        assert new_client().post('/api/auth/check').status_code == 401
+
+    def test_concurrent_requests(self, client):
+        client.create_two_users()
+        new_client = self.login(client, "jsmith", "iamjanesmith")
+        store = client.app.session_interface
+        users = store.users
+        counting = store.users = CountingUsers(users)
+        user_id = client.app.mongo.db["users"].find_one({'username': "jsmith"})["_id"]
+        store.invalidate_user(user_id)
+
+        """Concurrent requests of a user load it once per TTL window"""
+        statuses = []
+        barrier = threading.Barrier(16)
+
+        def requests():
+            session_client = new_client()
+            barrier.wait()
+            for number in range(5):
+                statuses.append(session_client.post('/api/auth/check').status_code)
+
+        threads = [threading.Thread(target=requests) for number in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        store.users = users
+        assert statuses == [200] * 80
+        assert counting.reads == 1
+
+    def test_invalidation_during_load(self, client):
+        client.create_two_users()
+        new_client = self.login(client, "jsmith", "iamjanesmith")
+        store = client.app.session_interface
+        users = store.users
+        event = threading.Event()
+        store.users = CountingUsers(users, event)
+        user_id = client.app.mongo.db["users"].find_one({'username': "jsmith"})["_id"]
+        store.invalidate_user(user_id)
+
+        """A user blocked while it is being loaded is not cached unblocked"""
+        statuses = []
+        loading = threading.Thread(target=lambda: statuses.append(new_client().post('/api/auth/check').json))
+        loading.start()
+        while not store.users.reads:
+            event.wait(0.01)
+        LocalAuth(client.app, None).set_blocked(True, "jsmith")
+        event.set()
+        loading.join()
+        store.users = users
+
+        assert "username" in statuses[0]
+        assert new_client().post('/api/auth/check').json["errorMessage"] == "Blocked account"